@@ -0,0 +1,79 @@
+"""Event loop lag while filtering in coroutine.
+
+Ticker coroutine sleeps 1ms in a loop and records how late it wakes up.
+Compares inline `dq.filter` with `dq.afilter`.
+
+Usage: python benchmarks/bench_aio.py [records] [batch size]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import dictquery as dq
+
+QUERY = '(status == "error" OR status == "warning") AND latency >= 250 AND NOT internal'
+TICK = 0.001
+
+
+async def ticker(lags):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run(records, consume):
+    lags = []
+    task = asyncio.ensure_future(ticker(lags))
+    await asyncio.sleep(TICK * 5)
+    start = time.perf_counter()
+    matched = await consume(records)
+    elapsed = time.perf_counter() - start
+    # ticker records lag of the tick which was blocked by the last batch
+    await asyncio.sleep(TICK * 5)
+    task.cancel()
+    lags.sort()
+    return elapsed, matched, lags
+
+
+async def inline(records):
+    return sum(1 for _ in dq.filter(records, QUERY))
+
+
+def make_afilter(**options):
+    async def consume(records):
+        matched = 0
+        async for _ in dq.afilter(records, QUERY, **options):
+            matched += 1
+        return matched
+    return consume
+
+
+def main(argv):
+    record_count = int(argv[1]) if len(argv) > 1 else 500000
+    batch_size = int(argv[2]) if len(argv) > 2 else 500
+    rnd = random.Random(42)
+    records = [{
+        'status': rnd.choice(['ok', 'ok', 'ok', 'error', 'warning']),
+        'latency': rnd.randrange(1000),
+        'internal': rnd.random() < 0.1,
+    } for _ in range(record_count)]
+    print('records: {}, batch size: {}'.format(record_count, batch_size))
+    consumers = [
+        ('inline filter', inline),
+        ('afilter', make_afilter(batch_size=batch_size)),
+        ('afilter+executor', make_afilter(batch_size=batch_size * 10, use_executor=True)),
+    ]
+    for name, consume in consumers:
+        loop = asyncio.new_event_loop()
+        elapsed, matched, lags = loop.run_until_complete(run(records, consume))
+        loop.close()
+        p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+        max_lag = lags[-1] if lags else 0.0
+        print('  {:<17} {:7.3f}s  ticks={:<6} p99 lag {:8.2f}ms  max lag {:8.2f}ms  matched={}'.format(
+            name, elapsed, len(lags), p99 * 1000, max_lag * 1000, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
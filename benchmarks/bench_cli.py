@@ -0,0 +1,82 @@
+"""Throughput of JSON Lines filtering in MB/s.
+
+Compares naive `json.loads` + `dq.match` loop with `dictquery` command line
+filter (`dictquery.cli.main`).
+
+Usage: python benchmarks/bench_cli.py [records] [workers]
+"""
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import dictquery as dq
+from dictquery.cli import main as cli_main
+
+QUERY = 'status == "failed" AND `user.age` >= 18'
+
+
+def make_file(path, count):
+    rnd = random.Random(42)
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                'id': i,
+                'status': rnd.choice(['ok', 'ok', 'ok', 'failed']),
+                'user': {'name': 'user{}'.format(i), 'age': rnd.randrange(80)},
+                'tags': [rnd.choice(['a', 'b', 'c']) for _ in range(5)],
+                'payload': {'text': 'x' * rnd.randrange(100, 400), 'values': list(range(20))},
+            }))
+            f.write('\n')
+
+
+def naive(path, output):
+    matched = 0
+    with open(path) as f:
+        for line in f:
+            if dq.match(json.loads(line), QUERY):
+                output.write(line)
+                matched += 1
+    return matched
+
+
+def run_cli(argv):
+    output = io.BytesIO()
+    cli_main(argv, stdout=output)
+    if '--count' in argv:
+        return int(output.getvalue())
+    return output.getvalue().count(b'\n')
+
+
+def measure(name, size, func):
+    start = time.perf_counter()
+    matched = func()
+    elapsed = time.perf_counter() - start
+    print('  {:<24} {:7.3f}s  {:7.1f} MB/s  matched={}'.format(
+        name, elapsed, size / elapsed / 1e6, matched))
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    workers = int(argv[2]) if len(argv) > 2 else 2
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'data.jsonl')
+    make_file(path, count)
+    size = os.path.getsize(path)
+    print('records: {}, size: {:.1f} MB'.format(count, size / 1e6))
+    try:
+        measure('json.loads + dq.match', size, lambda: naive(path, io.StringIO()))
+        measure('dictquery', size, lambda: run_cli([QUERY, path]))
+        measure('dictquery --count', size, lambda: run_cli(['--count', QUERY, path]))
+        measure('dictquery --workers {}'.format(workers), size, lambda: run_cli(
+            ['--workers', str(workers), '--chunksize', '5000', QUERY, path]))
+    finally:
+        os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,73 @@
+"""Lookups in reference data: `dq.filter` scan vs indexed `Collection`.
+
+Usage: python benchmarks/bench_collection.py [records]
+"""
+import random
+import sys
+import time
+
+import dictquery as dq
+
+COUNTRIES = ['country{}'.format(i) for i in range(200)]
+QUERIES = [
+    'sku == "sku123456"',
+    'country IN ["country1", "country2"] AND price < 10',
+    'price >= 999 AND name LIKE "*7"',
+    '`stock.warehouse` == 17 AND NOT discontinued',
+    'country == "country5" OR sku == "sku42"',
+    # about 30% of rows match every clause
+    'tier == "gold" AND price < 300',
+    'tier == "gold" OR (region == "eu" AND NOT price >= 700)',
+]
+
+
+def make_records(count):
+    rnd = random.Random(1)
+    return [{
+        'sku': 'sku{}'.format(i),
+        'name': 'item {}'.format(rnd.randrange(count)),
+        'country': rnd.choice(COUNTRIES),
+        'price': rnd.randrange(100000) / 100.0,
+        'stock': {'warehouse': rnd.randrange(1000), 'count': rnd.randrange(50)},
+        'discontinued': rnd.random() < 0.05,
+        'tier': rnd.choice(['gold', 'silver', 'bronze']),
+        'region': rnd.choice(['eu', 'us', 'asia']),
+    } for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    records = make_records(count)
+
+    start = time.perf_counter()
+    collection = dq.Collection(records)
+    collection.create_index('sku')
+    collection.create_index('country')
+    collection.create_index('price', 'sorted')
+    collection.create_index('stock.warehouse')
+    collection.create_index('tier')
+    collection.create_index('region')
+    # sorted indexes sort added values on first lookup
+    collection.count('price < 0')
+    print('indexed {} records: {:.2f}s'.format(count, time.perf_counter() - start))
+
+    for query in QUERIES:
+        compiled = dq.compile(query)
+        start = time.perf_counter()
+        expected = [r for r in records if compiled.match(r)]
+        scan = time.perf_counter() - start
+
+        # the first lookup builds bitmaps of large index buckets
+        collection.count(compiled)
+        start = time.perf_counter()
+        result = collection.filter(compiled)
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        collection.count(compiled)
+        counted = time.perf_counter() - start
+        assert result == expected
+        print('{:60} scan {:6.0f} ms, filter {:6.2f} ms ({:.0f}x), count {:6.2f} ms, {} rows'.format(
+            query, scan * 1e3, indexed * 1e3, scan / indexed, counted * 1e3, len(result)))
+
+if __name__ == '__main__':
+    main()
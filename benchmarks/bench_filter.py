@@ -0,0 +1,53 @@
+"""Compares `dictquery.filter` backends.
+
+Usage: python benchmarks/bench_filter.py [records]
+"""
+import random
+import sys
+import time
+
+import dictquery as dq
+
+
+QUERIES = [
+    'age >= 18',
+    "age >= 18 AND eyeColor IN ['blue', 'green'] AND isActive",
+    "`name.first` == 'Ann' OR (age < 30 AND NOT isActive)",
+    # shared keys and key prefixes are resolved once per record
+    "age > 18 AND age < 65 AND (age != 30 OR `name.first` == 'Bob') AND `name.last` != 'X'",
+]
+
+
+def make_records(count, seed=42):
+    rnd = random.Random(seed)
+    colors = ['blue', 'green', 'brown', 'black']
+    names = ['Ann', 'Bob', 'Eve', 'Jim']
+    return [{
+        'age': rnd.randint(1, 90),
+        'isActive': rnd.random() < 0.5,
+        'eyeColor': rnd.choice(colors),
+        'name': {'first': rnd.choice(names), 'last': rnd.choice(names)},
+    } for _ in range(count)]
+
+
+def bench(records, query, backend):
+    start = time.perf_counter()
+    matched = sum(1 for _ in dq.filter(records, query, backend=backend))
+    return time.perf_counter() - start, matched
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1000000
+    records = make_records(count)
+    print('records: {}'.format(count))
+    for query in QUERIES:
+        print(query)
+        base, _ = bench(records, query, 'visitor')
+        for backend in sorted(dq.compiler.BACKENDS):
+            elapsed, matched = bench(records, query, backend)
+            print('  {:<10} {:8.3f}s  {:6.2f}x  matched={}'.format(
+                backend, elapsed, base / elapsed, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,50 @@
+"""IN against large literal array (allow-list).
+
+Compares list scan of not prepared ast with hashed `LiteralArray` lookup.
+
+Usage: python benchmarks/bench_in.py [items] [records]
+"""
+import random
+import sys
+import time
+
+from dictquery.compiler import CompiledQuery
+from dictquery.parsers import DataQueryParser
+from dictquery.visitors import DataQueryVisitor
+
+
+def main(argv):
+    item_count = int(argv[1]) if len(argv) > 1 else 10000
+    record_count = int(argv[2]) if len(argv) > 2 else 2000
+    rnd = random.Random(42)
+    query = 'id IN [{}] OR name IN [{}]'.format(
+        ', '.join(str(rnd.randrange(10 * item_count)) for _ in range(item_count)),
+        ', '.join('"user{}"'.format(rnd.randrange(10 * item_count)) for _ in range(item_count)))
+    start = time.perf_counter()
+    ast = DataQueryParser().parse(query)
+    print('items: {}, records: {}, parse {:.3f}s'.format(
+        item_count, record_count, time.perf_counter() - start))
+    records = [{'id': rnd.randrange(10 * item_count),
+                'name': 'user{}'.format(rnd.randrange(10 * item_count))}
+               for _ in range(record_count)]
+
+    evaluators = [
+        ('list scan', lambda: DataQueryVisitor(ast).evaluate),
+        ('visitor', lambda: CompiledQuery(ast, backend='visitor').evaluate),
+        ('closure', lambda: CompiledQuery(ast, backend='closure').evaluate),
+        ('codegen', lambda: CompiledQuery(ast, backend='codegen').evaluate),
+    ]
+    base = None
+    for name, factory in evaluators:
+        start = time.perf_counter()
+        func = factory()
+        compiled = time.perf_counter()
+        matched = sum(1 for record in records if func(record))
+        elapsed = time.perf_counter() - compiled
+        base = base or elapsed
+        print('  {:<10} compile {:7.3f}s  evaluate {:7.3f}s  {:8.1f}x  matched={}'.format(
+            name, compiled - start, elapsed, base / elapsed, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
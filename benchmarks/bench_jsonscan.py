@@ -0,0 +1,69 @@
+"""Decoding JSON Lines with large unrelated values: `json.loads` vs `PartialDecoder`.
+
+Records are 20-50 KB, `payload` holds most of the text. Measured with
+predicate keys before and after the payload.
+
+Usage: python benchmarks/bench_jsonscan.py [records]
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import dictquery as dq
+from dictquery.jsonscan import PartialDecoder
+
+QUERY = 'status == "failed" AND `user.age` >= 18'
+
+
+def make_lines(count, payload_first):
+    rnd = random.Random(42)
+    lines = []
+    for i in range(count):
+        payload = {
+            'events': [{'id': j, 'kind': rnd.choice(['a', 'b']), 'values': list(range(10)),
+                        'text': 'x' * rnd.randrange(50, 150)} for j in range(rnd.randrange(60, 160))],
+            'blob': 'y' * rnd.randrange(5000, 15000),
+        }
+        record = {'status': rnd.choice(['ok', 'ok', 'ok', 'failed']),
+                  'user': {'name': 'user{}'.format(i), 'age': rnd.randrange(80)}}
+        if payload_first:
+            record = dict([('payload', payload)] + list(record.items()))
+        else:
+            record['payload'] = payload
+        lines.append(json.dumps(record).encode('utf-8'))
+    return lines
+
+
+def bench(lines, loads, compiled):
+    start = time.perf_counter()
+    matched = sum(1 for line in lines if compiled.evaluate(loads(line)))
+    return time.perf_counter() - start, matched
+
+
+def peak(line, loads):
+    tracemalloc.start()
+    loads(line)
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    compiled = dq.compile(QUERY)
+    decoder = PartialDecoder.from_compiled(compiled)
+    for payload_first in (False, True):
+        lines = make_lines(count, payload_first)
+        size = sum(len(line) for line in lines) / 1e6
+        print('payload {}, {} records, {:.1f} KB average'.format(
+            'first' if payload_first else 'last', count, size * 1e3 / count))
+        for name, loads in (('json.loads', json.loads), ('partial', decoder.decode)):
+            elapsed, matched = bench(lines, loads, compiled)
+            print('  {:12} {:8.1f} MB/s {:8.0f} records/s  peak {:7.1f} KB  matched {}'.format(
+                name, size / elapsed, count / elapsed, peak(lines[0], loads) / 1e3, matched))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Alerting rules `message CONTAINS 'keyword'` / `message LIKE '*keyword*'` against one record:
+loop over compiled queries vs `QuerySet` with one keyword automaton per key.
+
+Usage: python benchmarks/bench_keywords.py [queries] [records]
+"""
+import random
+import string
+import sys
+import time
+
+import dictquery as dq
+from dictquery import keywords
+
+
+def word(rnd):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randrange(5, 10)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    record_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rnd = random.Random(1)
+    vocabulary = [word(rnd) for _ in range(count * 2)]
+    queries = [
+        ("message CONTAINS '{}'" if i % 2 else "message LIKE '*{}*'").format(vocabulary[i])
+        for i in range(count)]
+    records = [{'message': ' '.join(rnd.choice(vocabulary) for _ in range(30))}
+               for _ in range(record_count)]
+
+    compiled = [dq.compile(query) for query in queries]
+    loop_records = records[:max(1, record_count // 10)]
+    start = time.perf_counter()
+    expected = [[i for i, c in enumerate(compiled) if c.match(r)] for r in loop_records]
+    loop = (time.perf_counter() - start) / len(loop_records)
+    print('loop:     {:10.3f} ms/record'.format(loop * 1e3))
+
+    for name, module in (('pyahocorasick', keywords.ahocorasick), ('python', None)):
+        if name == 'pyahocorasick' and module is None:
+            continue
+        keywords.ahocorasick = module
+        query_set = dq.compile_many(queries)
+        query_set.match(records[0])
+        start = time.perf_counter()
+        results = [query_set.match(r) for r in records]
+        indexed = (time.perf_counter() - start) / len(records)
+        assert results[:len(loop_records)] == expected
+        print('QuerySet ({}): {:10.3f} ms/record ({:.0f}x)'.format(name, indexed * 1e3, loop / indexed))
+
+
+if __name__ == '__main__':
+    main()
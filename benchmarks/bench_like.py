@@ -0,0 +1,59 @@
+"""LIKE evaluation with many distinct patterns.
+
+Compares per value `fnmatch.fnmatchcase` (not prepared ast) with patterns
+translated to regexps once at compile time.
+
+Usage: python benchmarks/bench_like.py [patterns] [records]
+"""
+import random
+import string
+import sys
+import time
+
+from dictquery.compiler import CompiledQuery
+from dictquery.parsers import DataQueryParser
+from dictquery.visitors import DataQueryVisitor
+
+
+def random_word(rnd, size):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(size))
+
+
+def main(argv):
+    pattern_count = int(argv[1]) if len(argv) > 1 else 5000
+    record_count = int(argv[2]) if len(argv) > 2 else 200
+    rnd = random.Random(42)
+    parser = DataQueryParser()
+    asts = [
+        parser.parse("email LIKE '*{}*@*.com' OR `friends.email` LIKE '{}?*'".format(
+            random_word(rnd, 3), random_word(rnd, 2)))
+        for _ in range(pattern_count)]
+    records = [{
+        'email': '{}@{}.com'.format(random_word(rnd, 12), random_word(rnd, 6)),
+        'friends': [{'email': random_word(rnd, 10)} for _ in range(3)],
+    } for _ in range(record_count)]
+    print('patterns: {}, records: {}'.format(pattern_count, record_count))
+
+    evaluators = [
+        ('fnmatchcase', lambda ast: DataQueryVisitor(ast).evaluate),
+        ('visitor', lambda ast: CompiledQuery(ast, backend='visitor').evaluate),
+        ('closure', lambda ast: CompiledQuery(ast, backend='closure').evaluate),
+        ('codegen', lambda ast: CompiledQuery(ast, backend='codegen').evaluate),
+    ]
+    base = None
+    for name, factory in evaluators:
+        start = time.perf_counter()
+        functions = [factory(ast) for ast in asts]
+        compiled = time.perf_counter()
+        matched = 0
+        for record in records:
+            for func in functions:
+                matched += func(record)
+        elapsed = time.perf_counter() - compiled
+        base = base or elapsed
+        print('  {:<12} compile {:7.3f}s  evaluate {:7.3f}s  {:6.2f}x  matched={}'.format(
+            name, compiled - start, elapsed, base / elapsed, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
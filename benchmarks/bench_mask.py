@@ -0,0 +1,48 @@
+"""Vectorized batch evaluation with numpy.
+
+Compares per record `compiled.match` with `compiled.mask(records)` on flat dicts.
+
+Usage: python benchmarks/bench_mask.py [records]
+"""
+import random
+import sys
+import time
+
+from dictquery.compiler import CompiledQuery
+from dictquery.parsers import DataQueryParser
+
+QUERY = ('(status == "error" OR status == "warning") AND latency >= 250 '
+         'AND region IN ["eu-west", "us-east"] AND NOT internal')
+
+
+def main(argv):
+    record_count = int(argv[1]) if len(argv) > 1 else 1000000
+    rnd = random.Random(42)
+    records = [{
+        'status': rnd.choice(['ok', 'ok', 'ok', 'error', 'warning']),
+        'latency': rnd.randrange(1000),
+        'region': rnd.choice(['eu-west', 'us-east', 'ap-south']),
+        'internal': rnd.random() < 0.1,
+    } for _ in range(record_count)]
+    ast = DataQueryParser().parse(QUERY)
+    print('records: {}'.format(record_count))
+
+    base = None
+    for backend in ('visitor', 'closure', 'codegen'):
+        compiled = CompiledQuery(ast, backend=backend)
+        start = time.perf_counter()
+        matched = sum(1 for record in records if compiled.match(record))
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print('  {:<8} match {:7.3f}s  {:6.2f}x  matched={}'.format(
+            backend, elapsed, base / elapsed, matched))
+    compiled = CompiledQuery(ast)
+    start = time.perf_counter()
+    matched = int(compiled.mask(records).sum())
+    elapsed = time.perf_counter() - start
+    print('  {:<8} mask  {:7.3f}s  {:6.2f}x  matched={}'.format(
+        'numpy', elapsed, base / elapsed, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
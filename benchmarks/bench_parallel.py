@@ -0,0 +1,47 @@
+"""Filtering in worker processes.
+
+Measures throughput of `filter(..., workers=N)` for growing number of workers.
+
+Usage: python benchmarks/bench_parallel.py [records] [max workers] [chunksize]
+"""
+import multiprocessing
+import random
+import sys
+import time
+
+import dictquery as dq
+
+QUERY = ('(status == "error" OR status == "warning") AND latency >= 250 '
+         'AND `user.name` LIKE "a*" AND NOT internal')
+
+
+def main(argv):
+    record_count = int(argv[1]) if len(argv) > 1 else 500000
+    max_workers = int(argv[2]) if len(argv) > 2 else multiprocessing.cpu_count()
+    chunksize = int(argv[3]) if len(argv) > 3 else 2000
+    rnd = random.Random(42)
+    records = [{
+        'status': rnd.choice(['ok', 'ok', 'ok', 'error', 'warning']),
+        'latency': rnd.randrange(1000),
+        'user': {'name': rnd.choice(['alice', 'bob', 'anna'])},
+        'internal': rnd.random() < 0.1,
+    } for _ in range(record_count)]
+    print('records: {}, chunksize: {}, cpus: {}'.format(
+        record_count, chunksize, multiprocessing.cpu_count()))
+
+    start = time.perf_counter()
+    matched = sum(1 for _ in dq.filter(records, QUERY))
+    base = time.perf_counter() - start
+    print('  sequential  {:7.3f}s  matched={}'.format(base, matched))
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        matched = sum(1 for _ in dq.filter(records, QUERY, workers=workers, chunksize=chunksize))
+        elapsed = time.perf_counter() - start
+        print('  workers={:<3} {:7.3f}s  {:5.2f}x  matched={}'.format(
+            workers, elapsed, base / elapsed, matched))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,42 @@
+"""Parsing of queries with huge array literals.
+
+Compares homogeneous arrays (one compact token) with mixed arrays, which are
+tokenized and parsed item by item.
+
+Usage: python benchmarks/bench_parse.py [sizes...]
+"""
+import sys
+import time
+
+from dictquery.compiler import CompiledQuery
+from dictquery.parsers import DataQueryParser
+
+
+def measure(parser, query):
+    start = time.perf_counter()
+    ast = parser.parse(query)
+    parsed = time.perf_counter()
+    CompiledQuery(ast)
+    return parsed - start, time.perf_counter() - parsed
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv[1:]] or [10000, 100000, 1000000]
+    parser = DataQueryParser()
+    for size in sizes:
+        numbers = ', '.join(str(i) for i in range(size))
+        strings = ', '.join('"id{}"'.format(i) for i in range(size))
+        queries = [
+            ('numbers', 'id IN [{}]'.format(numbers)),
+            ('strings', 'name IN [{}]'.format(strings)),
+            ('mixed', 'id IN [NONE, {}]'.format(numbers)),
+        ]
+        print('items: {}'.format(size))
+        for name, query in queries:
+            parse_time, compile_time = measure(parser, query)
+            print('  {:<8} parse {:7.3f}s  compile {:7.3f}s'.format(
+                name, parse_time, compile_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,72 @@
+"""One record against many subscription queries: loop over compiled queries vs `QuerySet`.
+
+Usage: python benchmarks/bench_queryset.py [queries] [records]
+"""
+import random
+import sys
+import time
+
+import dictquery as dq
+
+TOPICS = ['topic{}'.format(i) for i in range(5000)]
+REGIONS = ['eu', 'us', 'asia', 'africa']
+
+
+def make_queries(count):
+    rnd = random.Random(1)
+    queries = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            queries.append('topic == "{}"'.format(rnd.choice(TOPICS)))
+        elif kind == 1:
+            queries.append('topic IN ["{}", "{}"] AND priority >= {}'.format(
+                rnd.choice(TOPICS), rnd.choice(TOPICS), rnd.randrange(5)))
+        elif kind == 2:
+            queries.append('region == "{}" AND `user.id` == {} AND message LIKE "*err*"'.format(
+                rnd.choice(REGIONS), rnd.randrange(10000)))
+        else:
+            queries.append('(topic == "{}" OR `user.id` IN [{}, {}]) AND NOT muted'.format(
+                rnd.choice(TOPICS), rnd.randrange(10000), rnd.randrange(10000)))
+    return queries
+
+
+def make_records(count):
+    rnd = random.Random(2)
+    return [{
+        'topic': rnd.choice(TOPICS),
+        'priority': rnd.randrange(5),
+        'region': rnd.choice(REGIONS),
+        'user': {'id': rnd.randrange(10000)},
+        'message': rnd.choice(['error in db', 'ok', 'warning']),
+        'muted': rnd.random() < 0.1,
+    } for _ in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    record_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    queries = make_queries(count)
+    records = make_records(record_count)
+
+    start = time.perf_counter()
+    query_set = dq.compile_many(queries)
+    print('compile_many {} queries: {:.2f}s'.format(count, time.perf_counter() - start))
+
+    compiled = [query_set[i] for i in range(count)]
+    loop_records = records[:max(1, record_count // 20)]
+    start = time.perf_counter()
+    expected = [[i for i, c in enumerate(compiled) if c.match(r)] for r in loop_records]
+    loop = (time.perf_counter() - start) / len(loop_records)
+
+    start = time.perf_counter()
+    results = [query_set.match(r) for r in records]
+    indexed = (time.perf_counter() - start) / len(records)
+    assert results[:len(loop_records)] == expected
+    print('loop:     {:10.3f} ms/record'.format(loop * 1e3))
+    print('QuerySet: {:10.3f} ms/record ({:.0f}x), {:.1f} matches/record'.format(
+        indexed * 1e3, loop / indexed, sum(map(len, results)) / float(len(results))))
+
+
+if __name__ == '__main__':
+    main()
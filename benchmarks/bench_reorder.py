@@ -0,0 +1,50 @@
+"""Order of AND / OR operands: as written vs `reorder='static'` vs `reorder='adaptive'`.
+
+Usage: python benchmarks/bench_reorder.py [records]
+"""
+import random
+import sys
+import time
+
+import dictquery as dq
+
+QUERIES = [
+    # expensive regexp written first, cheap selective equality second
+    r'message MATCH /.*timeout after \d+ms/ AND level == "error"',
+    # nested array lookup first
+    '`events.tags` CONTAINS "db" AND service == "billing"',
+    # both are equalities, but the first one is True for almost every record
+    'status == "ok" AND region == "af"',
+]
+
+
+def make_records(count):
+    rnd = random.Random(1)
+    return [{
+        'message': 'request {} finished in {}ms'.format(i, rnd.randrange(1000)),
+        'level': rnd.choice(['info'] * 30 + ['error']),
+        'service': rnd.choice(['billing', 'search', 'auth', 'mail', 'feed']),
+        'events': [{'tags': ['http', 'db' if rnd.random() < 0.5 else 'cache']} for _ in range(5)],
+        'status': 'ok' if rnd.random() < 0.95 else 'fail',
+        'region': rnd.choice(['eu', 'us', 'asia', 'af']),
+    } for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    records = make_records(count)
+    for query in QUERIES:
+        print(query)
+        expected = None
+        for reorder in (False, 'static', 'adaptive'):
+            compiled = dq.compile(query, reorder=reorder)
+            start = time.perf_counter()
+            result = [r for r in records if compiled.match(r)]
+            elapsed = time.perf_counter() - start
+            assert expected is None or result == expected
+            expected = result
+            print('    reorder={!r:11} {:8.1f} ms'.format(reorder, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
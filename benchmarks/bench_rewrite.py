@@ -0,0 +1,51 @@
+"""Generated queries as written vs `rewrite=True`.
+
+Usage: python benchmarks/bench_rewrite.py [records]
+"""
+import random
+import sys
+import time
+
+import dictquery as dq
+
+QUERIES = [
+    # rule builder turns a multi-select into a chain of equalities
+    ' OR '.join('country == "{}"'.format(code) for code in ['de', 'fr', 'it', 'es', 'pl', 'nl', 'se', 'fi']),
+    # range slider gives two bounds of one key, the same rule is added twice
+    'age > 10 AND age <= 20 AND score >= 1 AND score < 5 AND age > 10',
+    # excluded values and a contradiction of two rule groups
+    'NOT status == "banned" AND NOT status == "deleted" AND NOT status == "spam" AND age >= 18',
+    '`user.plan` == "free" AND `user.plan` == "pro" AND age > 18',
+]
+
+
+def make_records(count):
+    rnd = random.Random(1)
+    return [{
+        'country': rnd.choice(['de', 'fr', 'us', 'jp', 'br', 'pl', 'fi', 'cn']),
+        'age': rnd.randrange(80),
+        'score': rnd.random() * 10,
+        'status': rnd.choice(['active', 'banned', 'new', 'deleted']),
+        'user': {'plan': rnd.choice(['free', 'pro'])},
+    } for _ in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    records = make_records(count)
+    for query in QUERIES:
+        print(query)
+        for backend in ('closure', 'codegen'):
+            expected = None
+            for rewrite in (False, True):
+                compiled = dq.compile(query, backend=backend, rewrite=rewrite)
+                start = time.perf_counter()
+                result = [r for r in records if compiled.match(r)]
+                elapsed = time.perf_counter() - start
+                assert expected is None or result == expected
+                expected = result
+                print('    {:8} rewrite={!r:6} {:8.1f} ms'.format(backend, rewrite, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
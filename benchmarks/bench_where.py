@@ -0,0 +1,49 @@
+"""Columnar evaluation with numpy.
+
+Compares building row dicts from columns and filtering them with
+`compiled.where(columns)` on dict of numpy arrays.
+
+Usage: python benchmarks/bench_where.py [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from dictquery.compiler import CompiledQuery
+from dictquery.parsers import DataQueryParser
+
+QUERY = ('(status == "error" OR status == "warning") AND latency >= 250 '
+         'AND region IN ["eu-west", "us-east"] AND NOT internal')
+
+
+def main(argv):
+    size = int(argv[1]) if len(argv) > 1 else 1000000
+    rnd = np.random.RandomState(42)
+    columns = {
+        'status': rnd.choice(['ok', 'ok', 'ok', 'error', 'warning'], size),
+        'latency': rnd.randint(0, 1000, size),
+        'region': rnd.choice(['eu-west', 'us-east', 'ap-south'], size),
+        'internal': rnd.random_sample(size) < 0.1,
+    }
+    ast = DataQueryParser().parse(QUERY)
+    print('rows: {}'.format(size))
+
+    for backend in ('closure', 'codegen'):
+        compiled = CompiledQuery(ast, backend=backend)
+        start = time.perf_counter()
+        lists = dict((name, values.tolist()) for name, values in columns.items())
+        rows = [dict(zip(lists, values)) for values in zip(*lists.values())]
+        matched = sum(1 for row in rows if compiled.match(row))
+        elapsed = time.perf_counter() - start
+        print('  {:<8} rows + match {:7.3f}s  matched={}'.format(backend, elapsed, matched))
+        del rows
+    compiled = CompiledQuery(ast)
+    start = time.perf_counter()
+    matched = len(compiled.where(columns))
+    print('  {:<8} where        {:7.3f}s  matched={}'.format(
+        'numpy', time.perf_counter() - start, matched))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,34 +1,72 @@
+import sys
+
 from dictquery.visitors import (
     DataQueryVisitor,
     MongoQueryVisitor,
 )
 from dictquery.parsers import DataQueryParser
+from dictquery.cache import ParseCache
+from dictquery.compiler import ClosureCompiler, CompiledQuery
+from dictquery.queryset import QuerySet, compile_many
+from dictquery.collection import Collection
+
+if sys.version_info >= (3, 6):
+    # async generators syntax
+    from dictquery.aio import afilter, amatch
 
 __version__ = '0.5.0'
+# kept for backward compatibility, queries are parsed by `parse_cache`
 parser = DataQueryParser()
+parse_cache = ParseCache()
+
+
+def parse(query):
+    """Parses query to ast. Results are kept in `parse_cache`"""
+    return parse_cache.parse(query)
+
+
+def set_cache_size(maxsize):
+    """Sets max number of cached queries. `0` disables cache, `None` - unbounded"""
+    parse_cache.maxsize = maxsize
+
+
+def cache_info():
+    """Returns parse cache statistics: hits, misses, evictions, maxsize, currsize"""
+    return parse_cache.info()
+
+
+def clear_cache():
+    """Drops all cached queries and resets cache statistics"""
+    parse_cache.clear()
 
 
 def query_to_mongo(query, case_sensitive=True):
     """Converts DictQuery query to mongo query"""
-    ast = parser.parse(query)
+    ast = parse(query)
     mq = MongoQueryVisitor(ast, case_sensitive)
     return mq.evaluate()
 
 
 def compile(query, use_nested_keys=True,
             key_separator='.', case_sensitive=True,
-            raise_keyerror=False):
-    """Builder parses query and returns configured reusable DataQueryVisitor object."""
-    ast = parser.parse(query)
-    return DataQueryVisitor(
+            raise_keyerror=False, backend='closure', reorder=False, rewrite=False):
+    """Builder parses query and returns configured reusable CompiledQuery object.
+
+    `backend` selects evaluator: 'closure' (default) compiles query to nested
+    python closures once, 'visitor' walks ast with `DataQueryVisitor` on every call.
+    `reorder` ('static' or 'adaptive') changes order of `AND` / `OR` operands,
+    `rewrite` removes redundant conditions, see `CompiledQuery`.
+    """
+    ast = parse(query)
+    return CompiledQuery(
         ast, use_nested_keys=use_nested_keys,
         key_separator=key_separator, case_sensitive=case_sensitive,
-        raise_keyerror=raise_keyerror)
+        raise_keyerror=raise_keyerror, backend=backend, reorder=reorder, rewrite=rewrite)
 
 
 def match(data, query):
     """Checks if `data` object satisfies `query`"""
-    ast = parser.parse(query)
+    ast = parse(query)
 
     dq = DataQueryVisitor(ast)
     return dq.evaluate(data)
@@ -36,14 +74,28 @@ def match(data, query):
 
 def filter(data, query, use_nested_keys=True,
            key_separator='.', case_sensitive=True,
-           raise_keyerror=False):
-    """Filters iterable. Checks if each item satisfies `query`"""
-    ast = parser.parse(query)
-    dq = DataQueryVisitor(
-        ast, use_nested_keys=use_nested_keys,
+           raise_keyerror=False, backend='closure',
+           workers=None, chunksize=1000, reorder=False, rewrite=False):
+    """Filters iterable. Checks if each item satisfies `query`.
+
+    `workers` processes evaluate items in chunks of `chunksize`, order is kept
+    """
+    compiled = compile(
+        query, use_nested_keys=use_nested_keys,
         key_separator=key_separator, case_sensitive=case_sensitive,
-        raise_keyerror=raise_keyerror)
-    for item in data:
-        if not dq.evaluate(item):
-            continue
+        raise_keyerror=raise_keyerror, backend=backend, reorder=reorder, rewrite=rewrite)
+    for item in compiled.filter(data, workers=workers, chunksize=chunksize):
         yield item
+
+
+def where(columns, query, case_sensitive=True,
+          raise_keyerror=False, backend='closure'):
+    """Returns numpy array of indices of rows of columnar data which satisfy `query`.
+
+    `columns` is dict of equal length lists or numpy arrays or numpy structured array,
+    dotted key is a column name
+    """
+    compiled = compile(
+        query, case_sensitive=case_sensitive,
+        raise_keyerror=raise_keyerror, backend=backend)
+    return compiled.where(columns)
@@ -0,0 +1,5 @@
+import sys
+
+from dictquery.cli import main
+
+sys.exit(main())
@@ -0,0 +1,75 @@
+"""asyncio helpers: filtering of async iterables without blocking event loop"""
+import asyncio
+
+from dictquery.compiler import compile_query
+
+
+def _running_loop():
+    # `get_event_loop` in coroutine is deprecated since python 3.7
+    if hasattr(asyncio, 'get_running_loop'):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+
+def _filter_batch(compiled, batch):
+    evaluate = compiled.evaluate
+    return [item for item in batch if evaluate(item)]
+
+
+async def _iterate(data):
+    if hasattr(data, '__aiter__'):
+        async for item in data:
+            yield item
+    else:
+        for item in data:
+            yield item
+
+
+async def afilter(data, query, use_nested_keys=True,
+                  key_separator='.', case_sensitive=True,
+                  raise_keyerror=False, backend='closure',
+                  batch_size=500, use_executor=False, executor=None):
+    """Async generator of items of async or plain iterable `data` which satisfy `query`.
+
+    Items are evaluated in batches of `batch_size`, control is given back to event
+    loop after every batch. Batches are evaluated in `executor` if it's given or in
+    default executor of loop if `use_executor` is True, evaluation in thread still
+    holds GIL, so small inline batches usually give lower loop lag.
+    `query` may be `CompiledQuery`
+    """
+    compiled = compile_query(
+        query, use_nested_keys=use_nested_keys, key_separator=key_separator,
+        case_sensitive=case_sensitive, raise_keyerror=raise_keyerror, backend=backend)
+    loop = _running_loop()
+    in_executor = use_executor or executor is not None
+    batch = []
+    async for item in _iterate(data):
+        batch.append(item)
+        if len(batch) < batch_size:
+            continue
+        for matched in await _afilter_batch(loop, compiled, batch, in_executor, executor):
+            yield matched
+        batch = []
+    if batch:
+        for matched in await _afilter_batch(loop, compiled, batch, in_executor, executor):
+            yield matched
+
+
+async def _afilter_batch(loop, compiled, batch, in_executor, executor):
+    if in_executor:
+        return await loop.run_in_executor(executor, _filter_batch, compiled, batch)
+    result = _filter_batch(compiled, batch)
+    await asyncio.sleep(0)
+    return result
+
+
+async def amatch(data, query, use_nested_keys=True,
+                 key_separator='.', case_sensitive=True,
+                 raise_keyerror=False, backend='closure', executor=None):
+    """Checks if `data` satisfies `query` in `executor` (default executor of loop
+    if None), so evaluation of huge document doesn't block event loop"""
+    compiled = compile_query(
+        query, use_nested_keys=use_nested_keys, key_separator=key_separator,
+        case_sensitive=case_sensitive, raise_keyerror=raise_keyerror, backend=backend)
+    loop = _running_loop()
+    return await loop.run_in_executor(executor, compiled.evaluate, data)
@@ -0,0 +1,421 @@
+"""Static analysis of prepared queries"""
+from collections import namedtuple
+import operator
+import re
+
+from dictquery.datavalue import HASHABLE_TYPES, LiteralArray, basestring
+from dictquery.parsers import (
+    KeyExpression, ArrayExpression, CompactArrayExpression, BinaryExpression,
+    KeyConditionsExpression, UnaryExpression, LTExpression, LTEExpression,
+    GTExpression, GTEExpression, OrExpression, UNPREPARED)
+
+
+def _all(left, right):
+    """Paths of both operands, required if required by any of them"""
+    result = dict(left)
+    for path, required in right.items():
+        result[path] = required or result.get(path, False)
+    return result
+
+
+def _any(left, right):
+    """Paths of both operands, required only if required by both of them"""
+    result = {}
+    for path in list(left) + [path for path in right if path not in left]:
+        result[path] = left.get(path, False) and right.get(path, False)
+    return result
+
+
+class KeyPathsVisitor:
+    """Returns dict of nested keys tuples read by prepared `ast`.
+
+    Path maps to True if it's read by every evaluation branch of query, e.g. by
+    both operands of `OR`, and to False if it's read only in some branches.
+    Short circuit of `AND` / `OR` isn't taken into account, the second operand
+    of `AND` is read when the first one is True, so its keys are required.
+    """
+    def paths(self, ast):
+        if ast is None:
+            return {}
+        return ast.accept(self)
+
+    def _binary(self, expr):
+        return _all(expr.left.accept(self), expr.right.accept(self))
+
+    def _literal(self, expr):
+        return {}
+
+    visit_lt = visit_lte = visit_gt = visit_gte = _binary
+    visit_equal = visit_notequal = visit_contains = visit_in = _binary
+    visit_match = visit_like = visit_and = _binary
+    visit_number = visit_boolean = visit_string = visit_none = _literal
+    visit_regexp = visit_now = _literal
+
+    def visit_key(self, expr):
+        return {expr.keys: True}
+
+    def visit_array(self, expr):
+        result = {}
+        if isinstance(expr, CompactArrayExpression):
+            # items are literals
+            return result
+        for item in expr.value:
+            result = _all(result, item.accept(self))
+        return result
+
+    def visit_or(self, expr):
+        return _any(expr.left.accept(self), expr.right.accept(self))
+
+    def visit_not(self, expr):
+        return expr.value.accept(self)
+
+
+def key_paths(ast):
+    """Returns dict of nested keys tuples read by prepared `ast`, see `KeyPathsVisitor`"""
+    return KeyPathsVisitor().paths(ast)
+
+
+def iter_keys(expr):
+    """Yields every `KeyExpression` of `expr`, the same key may be yielded many times.
+    `KeyConditionsExpression` reads its key once"""
+    if isinstance(expr, KeyExpression):
+        yield expr
+    elif isinstance(expr, KeyConditionsExpression):
+        yield expr.key
+    elif isinstance(expr, BinaryExpression):
+        for key in iter_keys(expr.left):
+            yield key
+        for key in iter_keys(expr.right):
+            yield key
+    elif isinstance(expr, UnaryExpression):
+        for key in iter_keys(expr.value):
+            yield key
+    elif isinstance(expr, ArrayExpression) and not isinstance(expr, CompactArrayExpression):
+        for item in expr.value:
+            for key in iter_keys(item):
+                yield key
+
+
+def shared_prefixes(paths):
+    """Returns set of prefixes (paths included) of nested keys tuples which are
+    prefixes of more than one item of `paths`. Prefixes of shared prefix are shared"""
+    counts = {}
+    for path in paths:
+        for size in range(1, len(path) + 1):
+            counts[path[:size]] = counts.get(path[:size], 0) + 1
+    return set(prefix for prefix, number in counts.items() if number > 1)
+
+
+Predicate = namedtuple('Predicate', ['keys', 'op', 'value'])
+
+# OR of conditions is product of their clauses, larger results are dropped
+MAX_CLAUSES = 64
+
+_RANGE_OPS = {
+    LTExpression: operator.lt,
+    LTEExpression: operator.le,
+    GTExpression: operator.gt,
+    GTEExpression: operator.ge,
+}
+# reflected operations for `literal op key` comparisons, `literal < key` is `key > literal`
+REFLECTED_OPS = {
+    operator.lt: operator.gt,
+    operator.le: operator.ge,
+    operator.gt: operator.lt,
+    operator.ge: operator.le,
+    operator.eq: operator.eq,
+    operator.ne: operator.ne,
+}
+RANGE_TYPES = (float, int, bool, basestring)
+
+# glob wildcards, text between them is literal
+_like_wildcards = re.compile(r'[*?]')
+_regexp_special = frozenset('.^$*+?{}[]\\|()')
+# quantifiers which allow zero repetitions of previous char
+_regexp_optional = frozenset('*?{')
+
+
+def contains_text(value, text):
+    """Operation of `Predicate`: string `value` has substring `text`.
+    Necessary condition of `LIKE` and `MATCH` on literal parts of pattern"""
+    return isinstance(value, basestring) and text in value
+
+
+def like_fragments(pattern):
+    """Returns literal parts of glob `pattern`, every match contains all of them"""
+    if '[' in pattern:
+        # not closed `[` is a literal, text after the first set isn't used
+        pattern = pattern[:pattern.index('[')]
+    return [part for part in _like_wildcards.split(pattern) if part]
+
+
+def regexp_prefix(pattern):
+    """Returns literal text which starts every match of `pattern` at start of string"""
+    if '|' in pattern:
+        return ''
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+    prefix = []
+    for char in pattern:
+        if char in _regexp_special:
+            if char in _regexp_optional and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+def literal_value(expr):
+    """Returns prepared value of literal `expr` or UNPREPARED for keys and `NOW`"""
+    if isinstance(expr, KeyExpression):
+        return UNPREPARED
+    return getattr(expr, 'prepared', UNPREPARED)
+
+
+def _or_clauses(left, right, max_size=None):
+    """Returns clauses of OR of two conditions or None if product is too large.
+    Clauses of more than `max_size` items are dropped"""
+    if not left or not right or len(left) * len(right) > MAX_CLAUSES:
+        return None
+    result = []
+    for left_clause in left:
+        for right_clause in right:
+            clause = left_clause | right_clause
+            if max_size is not None and len(clause) > max_size:
+                continue
+            if clause not in result:
+                result.append(clause)
+    return result
+
+
+class PredicateVisitor:
+    """Returns necessary condition of prepared `ast` being True as `(clauses, exact)`.
+
+    Condition is in conjunctive normal form: query may be True only if every clause
+    (frozenset of `Predicate`) has a True predicate, empty clause is never True.
+    Predicates compare values of key with literal: `==` with hashable literal,
+    `IN` / `CONTAINS` array of hashable literals gives clause of `==`, `<`, `<=`,
+    `>`, `>=` with number or string, `CONTAINS` string. Case sensitive `LIKE` and
+    `MATCH` give `contains_text` of the longest literal part of pattern.
+    `exact` is True if condition is equivalent to query. Other expressions and
+    `NOT` give no clauses.
+    """
+    def condition(self, ast):
+        if ast is None:
+            return [], False
+        return ast.accept(self)
+
+    def _no_condition(self, expr):
+        return [], False
+
+    visit_notequal = visit_key = visit_not = _no_condition
+    visit_number = visit_boolean = visit_string = visit_none = _no_condition
+    visit_regexp = visit_now = visit_array = _no_condition
+
+    def visit_equal(self, expr):
+        for key, other in ((expr.left, expr.right), (expr.right, expr.left)):
+            value = literal_value(other)
+            if isinstance(key, KeyExpression) and type(value) in HASHABLE_TYPES:
+                return [frozenset([Predicate(key.keys, operator.eq, value)])], True
+        return [], False
+
+    def _range(self, expr):
+        op = _RANGE_OPS[type(expr)]
+        key, other = expr.left, expr.right
+        if not isinstance(key, KeyExpression):
+            key, other, op = other, key, REFLECTED_OPS[op]
+        value = literal_value(other)
+        if isinstance(key, KeyExpression) and isinstance(value, RANGE_TYPES):
+            return [frozenset([Predicate(key.keys, op, value)])], True
+        return [], False
+
+    visit_lt = visit_lte = visit_gt = visit_gte = _range
+
+    def _members(self, key, container):
+        values = literal_value(container)
+        if isinstance(key, KeyExpression) and isinstance(values, LiteralArray) and \
+                LiteralArray.is_hashable(values):
+            return [frozenset(Predicate(key.keys, operator.eq, value) for value in values)], True
+        return [], False
+
+    def visit_in(self, expr):
+        return self._members(expr.left, expr.right)
+
+    def visit_contains(self, expr):
+        value = literal_value(expr.right)
+        if isinstance(expr.left, KeyExpression) and isinstance(value, basestring) and value:
+            # substring of string, item of array or key of object
+            return [frozenset([Predicate(expr.left.keys, operator.contains, value)])], True
+        return self._members(expr.right, expr.left)
+
+    def _text(self, key, text, exact=False):
+        if not isinstance(key, KeyExpression) or not text:
+            return [], False
+        return [frozenset([Predicate(key.keys, contains_text, text)])], exact
+
+    def visit_like(self, expr):
+        if expr.regexp is None or expr.regexp.flags & re.IGNORECASE:
+            # `str.lower` and case insensitive regexp don't match the same strings
+            return [], False
+        pattern = expr.right.value
+        fragments = like_fragments(pattern)
+        if not fragments:
+            return [], False
+        text = max(fragments, key=len)
+        exact = pattern == '*' + text + '*'
+        return self._text(expr.left, text, exact)
+
+    def visit_match(self, expr):
+        regexp = literal_value(expr.right)
+        if not hasattr(regexp, 'flags') or regexp.flags & (re.IGNORECASE | re.VERBOSE):
+            return [], False
+        return self._text(expr.left, regexp_prefix(regexp.pattern))
+
+    def visit_and(self, expr):
+        left, left_exact = expr.left.accept(self)
+        right, right_exact = expr.right.accept(self)
+        clauses = left + [clause for clause in right if clause not in left]
+        return clauses, left_exact and right_exact
+
+    def visit_or(self, expr):
+        left, left_exact = expr.left.accept(self)
+        right, right_exact = expr.right.accept(self)
+        clauses = _or_clauses(left, right)
+        if clauses is None:
+            return [], False
+        return clauses, left_exact and right_exact
+
+
+def predicates(ast):
+    """Returns necessary condition of prepared `ast`, see `PredicateVisitor`"""
+    return PredicateVisitor().condition(ast)
+
+
+# static costs of evaluation relative to lookup of one key level
+COMPARE_COST = 1
+TEXT_COST = 2
+LIKE_COST = 5
+MATCH_COST = 10
+NOW_COST = 5
+# static shares of records which satisfy comparison
+EQUAL_RATE = 0.1
+RANGE_RATE = 0.5
+TEXT_RATE = 0.2
+TRUTH_RATE = 0.5
+
+
+def rank(cost, rate, is_and):
+    """Order of operand in `AND` (`is_and`) or `OR` chain, expected cost of chain is
+    minimal if operands are sorted by rank: cheap operands which decide the chain
+    (False for `AND`, True for `OR`) go first"""
+    decisive = 1.0 - rate if is_and else rate
+    if not cost:
+        return 0.0
+    if decisive <= 0:
+        return float('inf')
+    return cost / decisive
+
+
+def chain_estimate(estimates, is_and):
+    """Returns `(cost, rate)` of `AND` / `OR` chain of operands `estimates` evaluated in order"""
+    cost, reach = 0.0, 1.0
+    for operand_cost, operand_rate in estimates:
+        cost += reach * operand_cost
+        if is_and:
+            reach *= operand_rate
+        else:
+            reach *= 1.0 - operand_rate
+    return cost, reach if is_and else 1.0 - reach
+
+
+class CostVisitor:
+    """Returns static estimate `(cost, rate)` of prepared expression: relative cost
+    of evaluation and share of records for which it's True. Key costs a lookup per
+    nested key, literals are free. Nothing is known about data, rates are guesses:
+    `==` is selective, ranges split records in halves"""
+    def estimate(self, ast):
+        return ast.accept(self)
+
+    def _operands_cost(self, expr):
+        return expr.left.accept(self)[0] + expr.right.accept(self)[0]
+
+    def _compare(self, expr, cost, rate):
+        return self._operands_cost(expr) + cost, rate
+
+    def visit_equal(self, expr):
+        return self._compare(expr, COMPARE_COST, EQUAL_RATE)
+
+    def visit_notequal(self, expr):
+        return self._compare(expr, COMPARE_COST, 1.0 - EQUAL_RATE)
+
+    def visit_lt(self, expr):
+        return self._compare(expr, COMPARE_COST, RANGE_RATE)
+
+    visit_lte = visit_gt = visit_gte = visit_lt
+
+    def _members(self, container, item):
+        items = literal_value(container)
+        if isinstance(items, (list, LiteralArray)):
+            rate = min(RANGE_RATE, EQUAL_RATE * len(items))
+            return container.accept(self)[0] + item.accept(self)[0] + COMPARE_COST, rate
+        return container.accept(self)[0] + item.accept(self)[0] + TEXT_COST, TEXT_RATE
+
+    def visit_in(self, expr):
+        return self._members(expr.right, expr.left)
+
+    def visit_contains(self, expr):
+        return self._members(expr.left, expr.right)
+
+    def visit_like(self, expr):
+        return self._compare(expr, LIKE_COST, TEXT_RATE)
+
+    def visit_match(self, expr):
+        return self._compare(expr, MATCH_COST, TEXT_RATE)
+
+    def _literal(self, expr):
+        value = literal_value(expr)
+        return 0, 1.0 if value is not UNPREPARED and value else 0.0
+
+    visit_number = visit_boolean = visit_string = visit_none = visit_regexp = _literal
+
+    def visit_now(self, expr):
+        return NOW_COST, 1.0
+
+    def visit_key(self, expr):
+        return len(expr.keys or ('',)), TRUTH_RATE
+
+    def visit_array(self, expr):
+        if isinstance(expr, CompactArrayExpression):
+            # `value` builds node per item
+            return 0, 1.0 if expr.items else 0.0
+        if literal_value(expr) is not UNPREPARED:
+            return 0, 1.0 if expr.value else 0.0
+        return sum(item.accept(self)[0] for item in expr.value), 1.0 if expr.value else 0.0
+
+    def visit_not(self, expr):
+        cost, rate = expr.value.accept(self)
+        return cost, 1.0 - rate
+
+    def _chain(self, expr):
+        is_and = not isinstance(expr, OrExpression)
+        estimates = [operand.accept(self) for operand in chain_operands(expr)]
+        return chain_estimate(estimates, is_and)
+
+    visit_and = visit_or = _chain
+
+
+def chain_operands(expr):
+    """Returns operands of chain of `AND` or `OR` expressions of the same type as `expr`,
+    `KeyConditionsExpression` groups are operands of `AND` chain"""
+    if type(expr.left) is type(expr):
+        operands = chain_operands(expr.left)
+    else:
+        operands = [expr.left]
+    if type(expr.right) is type(expr):
+        return operands + chain_operands(expr.right)
+    return operands + [expr.right]
+
+
+def estimate(ast):
+    """Returns static `(cost, rate)` of prepared `ast`, see `CostVisitor`"""
+    return CostVisitor().estimate(ast)
@@ -0,0 +1,63 @@
+"""Sets of row numbers as python int bitmaps: bit `n` is set if row `n` is in set.
+
+`&`, `|` and `& ~` of bitmaps are intersection, union and difference, they run
+in C over machine words, time and memory depend on number of rows in bits.
+"""
+import binascii
+import re
+
+_BITS = [1 << bit for bit in range(8)]
+_BYTE_ROWS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+_NONZERO = re.compile(b'[^\x00]+')
+
+
+def _from_bytes(data):
+    if hasattr(int, 'from_bytes'):
+        return int.from_bytes(bytes(data), 'little')
+    return int(binascii.hexlify(bytes(bytearray(reversed(data)))) or b'0', 16)
+
+
+def _to_bytes(bitmap):
+    if hasattr(bitmap, 'to_bytes'):
+        return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    hexed = '%x' % bitmap
+    data = bytearray(binascii.unhexlify(('0' if len(hexed) % 2 else '') + hexed))
+    data.reverse()
+    return bytes(data)
+
+
+def from_rows(rows):
+    """Returns bitmap of iterable of non negative ints `rows`"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    data = bytearray((max(rows) >> 3) + 1)
+    bits = _BITS
+    for row in rows:
+        data[row >> 3] |= bits[row & 7]
+    return _from_bytes(data)
+
+
+def to_rows(bitmap):
+    """Returns sorted list of rows of `bitmap`"""
+    data = _to_bytes(bitmap)
+    byte_rows = _BYTE_ROWS
+    rows = []
+    # runs of zero bytes are skipped by regexp engine
+    for match in _NONZERO.finditer(data):
+        for offset, byte in enumerate(bytearray(match.group()), match.start()):
+            base = offset << 3
+            rows.extend([base + bit for bit in byte_rows[byte]])
+    return rows
+
+
+def count(bitmap):
+    """Returns number of rows in `bitmap`"""
+    if hasattr(bitmap, 'bit_count'):
+        return bitmap.bit_count()
+    return bin(bitmap).count('1')
+
+
+def full(size):
+    """Returns bitmap of rows from 0 to `size - 1`"""
+    return (1 << size) - 1
@@ -0,0 +1,81 @@
+from collections import OrderedDict, namedtuple
+import threading
+
+from dictquery.parsers import DataQueryParser
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class ParseCache:
+    """Thread-safe LRU cache of parsed queries.
+
+    Maps query string to its ast. Cached asts are shared between callers
+    and must be treated as read-only. `maxsize=0` disables caching,
+    `maxsize=None` makes the cache unbounded.
+    """
+    def __init__(self, maxsize=512):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError('maxsize must be >= 0 or None')
+        with self._lock:
+            self._maxsize = maxsize
+            self._shrink()
+
+    def _shrink(self):
+        if self._maxsize is None:
+            return
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def parse(self, query):
+        with self._lock:
+            try:
+                ast = self._data.pop(query)
+            except KeyError:
+                self.misses += 1
+            else:
+                self._data[query] = ast
+                self.hits += 1
+                return ast
+
+        # parser instances keep tokenizer state, so each miss gets its own
+        ast = DataQueryParser().parse(query)
+        if self._maxsize == 0:
+            return ast
+        with self._lock:
+            self._data.pop(query, None)
+            self._data[query] = ast
+            self._shrink()
+        return ast
+
+    def clear(self):
+        """Drops all cached asts and resets counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.evictions,
+                self._maxsize, len(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, query):
+        return query in self._data
@@ -0,0 +1,169 @@
+"""Command line filter of JSON Lines.
+
+    dictquery [options] QUERY [FILE ...]
+
+Reads JSON Lines from files or stdin and writes matching lines as they are.
+"""
+import argparse
+import io
+import json
+import sys
+
+from dictquery.compiler import BACKENDS
+from dictquery.exceptions import DQException
+from dictquery.jsonscan import PartialDecoder
+from dictquery.parallel import parallel_filter
+from dictquery.prefilter import Prefilter
+import dictquery as dq
+
+BLOCK_SIZE = 1 << 20
+
+
+class LineMatcher:
+    """Checks if raw JSON line satisfies `compiled` query.
+    Picklable, so it's sent to worker processes instead of compiled query.
+
+    With `prefilter` lines which can't satisfy query are rejected before parsing,
+    so invalid JSON in such lines isn't reported. With `partial` only values of
+    keys used by query are decoded, see `dictquery.jsonscan`
+    """
+    def __init__(self, compiled, skip_invalid=False, prefilter=True, partial=False):
+        self.compiled = compiled
+        self.skip_invalid = skip_invalid
+        self.prefilter = Prefilter.from_compiled(compiled) if prefilter else None
+        self.decoder = PartialDecoder.from_compiled(compiled) if partial else None
+
+    def evaluate(self, line):
+        if self.prefilter is not None and not self.prefilter.check(line):
+            return False
+        try:
+            if self.decoder is not None:
+                data = self.decoder.decode(line)
+            else:
+                data = json.loads(line)
+        except ValueError:
+            if self.skip_invalid:
+                return False
+            raise DQException('Invalid JSON line: {!r}'.format(line[:80]))
+        return self.compiled.evaluate(data)
+
+
+def read_lines(stream, block_size=BLOCK_SIZE):
+    """Yields lines of binary `stream` without line separators, reads large blocks"""
+    tail = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (tail + block).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if tail.strip():
+        yield tail
+
+
+def read_files(paths, stdin, block_size=BLOCK_SIZE):
+    if not paths:
+        for line in read_lines(stdin, block_size):
+            yield line
+        return
+    for path in paths:
+        if path == '-':
+            for line in read_lines(stdin, block_size):
+                yield line
+            continue
+        with io.open(path, 'rb', buffering=0) as stream:
+            for line in read_lines(stream, block_size):
+                yield line
+
+
+def matching_lines(matcher, lines, workers=None, chunksize=1000):
+    if workers is not None:
+        return parallel_filter(matcher, lines, workers, chunksize)
+    return (line for line in lines if matcher.evaluate(line))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='dictquery',
+        description='Writes JSON Lines which satisfy QUERY. Exit status is 0 if '
+                    'any line matched, 1 if none, 2 on error.')
+    parser.add_argument('query', help='dictquery query')
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help="JSON Lines files, stdin if not given or '-'")
+    parser.add_argument('-c', '--count', action='store_true',
+                        help='print number of matching lines instead of lines')
+    parser.add_argument('-m', '--limit', type=int, metavar='N',
+                        help='stop after N matching lines')
+    parser.add_argument('-w', '--workers', type=int, metavar='N',
+                        help='evaluate lines in N worker processes')
+    parser.add_argument('--chunksize', type=int, default=1000, metavar='N',
+                        help='lines per chunk sent to worker (default: %(default)s)')
+    parser.add_argument('-i', '--ignore-case', action='store_true',
+                        help='case insensitive comparison of strings')
+    parser.add_argument('--no-nested-keys', action='store_true',
+                        help="don't split keys to nested keys")
+    parser.add_argument('--key-separator', default='.', metavar='SEP',
+                        help='nested keys separator (default: %(default)s)')
+    parser.add_argument('--raise-keyerror', action='store_true',
+                        help='fail on missing keys')
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help="skip lines which aren't valid JSON instead of failing")
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help="parse every line, don't reject lines by raw text")
+    parser.add_argument('--partial', action='store_true',
+                        help='decode only values of keys used by query, the first of '
+                             "duplicate keys is used and skipped text isn't validated")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='codegen',
+                        help='query evaluator (default: %(default)s)')
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    """Runs command line filter, returns exit status"""
+    args = build_parser().parse_args(argv)
+    stdin = stdin if stdin is not None else sys.stdin.buffer
+    stderr = stderr if stderr is not None else sys.stderr
+    if stdout is None:
+        stdout = io.open(sys.stdout.fileno(), 'wb', buffering=BLOCK_SIZE, closefd=False)
+
+    matched = 0
+    try:
+        compiled = dq.compile(
+            args.query, use_nested_keys=not args.no_nested_keys,
+            key_separator=args.key_separator, case_sensitive=not args.ignore_case,
+            raise_keyerror=args.raise_keyerror, backend=args.backend)
+        matcher = LineMatcher(
+            compiled, skip_invalid=args.skip_invalid, prefilter=not args.no_prefilter,
+            partial=args.partial)
+        lines = matching_lines(
+            matcher, read_files(args.files, stdin), args.workers, args.chunksize)
+        try:
+            write = stdout.write
+            for line in lines:
+                matched += 1
+                if args.limit is not None and matched > args.limit:
+                    matched -= 1
+                    break
+                if not args.count:
+                    write(line)
+                    write(b'\n')
+            if args.count:
+                write('{}\n'.format(matched).encode('ascii'))
+        finally:
+            if hasattr(lines, 'close'):
+                lines.close()
+        stdout.flush()
+    except BrokenPipeError:
+        # output reader has gone, e.g. `dictquery ... | head`
+        return 0 if matched else 1
+    except (DQException, IOError, ValueError) as e:
+        stderr.write('dictquery: {}\n'.format(e))
+        return 2
+    return 0 if matched else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
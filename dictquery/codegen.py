@@ -0,0 +1,285 @@
+import fnmatch
+from itertools import count
+import linecache
+import math
+import operator
+import weakref
+
+from dictquery.analysis import iter_keys, shared_prefixes
+from dictquery.compiler import ClosureCompiler, REFLECTED_OPS, SCALAR_TYPES
+from dictquery.datavalue import basestring, LiteralArray
+from dictquery.optimizer import is_member
+from dictquery.parsers import (
+    KeyExpression, AndExpression, KeyConditionsExpression, OrExpression, NotExpression,
+    EqualExpression, NotEqualExpression, LTExpression, LTEExpression,
+    GTExpression, GTEExpression, InExpression, ContainsExpression,
+    MatchExpression, LikeExpression,
+)
+
+
+COMPARISONS = {
+    EqualExpression: (operator.eq, '=='),
+    NotEqualExpression: (operator.ne, '!='),
+    LTExpression: (operator.lt, '<'),
+    LTEExpression: (operator.le, '<='),
+    GTExpression: (operator.gt, '>'),
+    GTEExpression: (operator.ge, '>='),
+}
+OP_SYMBOLS = dict(COMPARISONS.values())
+# literal arrays of this size and longer are checked with `LiteralArray` hash lookup
+HASHED_ARRAY_SIZE = 8
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, basestring) else value
+
+
+# unique names of generated sources, ids of collected compilers are reused
+_source_ids = count()
+
+# values of hoisted key prefixes: key is missing in dict, container isn't a dict
+_MISSING = object()
+_OTHER = object()
+
+
+class SourceCompiler:
+    """Generates python source of one flat function for `ast`.
+
+    Key lookups are inlined as item access for plain `dict` data. Other data
+    types and subexpressions which can't be inlined are evaluated by
+    `ClosureCompiler` functions, so semantics are the same as in `DataQueryVisitor`.
+    Key prefixes shared by several keys are looked up once into local variables
+    at the start of function.
+    """
+    function_name = '_dictquery'
+
+    def __init__(self, use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, raise_keyerror=False):
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.raise_keyerror = raise_keyerror
+        self.closure_compiler = ClosureCompiler(
+            use_nested_keys=use_nested_keys, key_separator=key_separator,
+            case_sensitive=case_sensitive, raise_keyerror=raise_keyerror)
+        self.namespace = {}
+        self._shared = frozenset()
+        # shared key prefix -> local variable, in order of assignment
+        self._locals = {}
+        self._assignments = []
+
+    def _add_name(self, prefix, value):
+        name = '_{}{}'.format(prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def _literal(self, value):
+        if value is None or isinstance(value, (bool, basestring)):
+            return repr(value)
+        if isinstance(value, float) and not math.isinf(value) and not math.isnan(value):
+            return repr(value)
+        return self._add_name('c', value)
+
+    def _fallback(self, expr):
+        return '{}(data)'.format(self._add_name('f', self.closure_compiler.compile(expr)))
+
+    def _literal_value(self, expr):
+        """Returns `(True, value)` if `expr` is compiled to constant"""
+        func = expr.accept(self.closure_compiler)
+        if getattr(func, 'is_constant', False):
+            return True, func.value
+        return False, None
+
+    def source(self, ast):
+        """Returns python source of function `_dictquery(data)`"""
+        self._locals = {}
+        self._assignments = []
+        self._shared = shared_prefixes(self._keys(key) for key in iter_keys(ast))
+        body = 'False' if ast is None else 'bool({})'.format(self.visit(ast))
+        lines = ['def {}(data):'.format(self.function_name)]
+        lines.extend('    {} = {}'.format(name, value) for name, value in self._assignments)
+        lines.append('    return {}'.format(body))
+        return '\n'.join(lines) + '\n'
+
+    def compile(self, ast):
+        """Returns compiled function `_dictquery(data)` with `source` attribute"""
+        source = self.source(ast)
+        filename = '<dictquery-{}>'.format(next(_source_ids))
+        namespace = dict(self.namespace, _lower=_lower, _fnmatchcase=fnmatch.fnmatchcase,
+                         _MISSING=_MISSING, _OTHER=_OTHER)
+        try:
+            code = compile(source, filename, 'exec')
+        except (SyntaxError, RecursionError, MemoryError):
+            # too deeply nested query for python parser
+            return self.closure_compiler.compile(ast)
+        exec(code, namespace)
+        func = namespace[self.function_name]
+        func.source = source
+        if hasattr(weakref, 'finalize'):
+            # makes generated lines visible in tracebacks while function is alive
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+            weakref.finalize(func, linecache.cache.pop, filename, None)
+        return func
+
+    def visit(self, expr):
+        if isinstance(expr, KeyConditionsExpression):
+            return self._key_conditions(expr)
+        if isinstance(expr, (AndExpression, OrExpression)):
+            operands = self._flatten(expr, type(expr))
+            joiner = '\n        and ' if isinstance(expr, AndExpression) else '\n        or '
+            return '({})'.format(joiner.join(self.visit(operand) for operand in operands))
+        if isinstance(expr, NotExpression):
+            return '(not {})'.format(self.visit(expr.value))
+        if isinstance(expr, KeyExpression):
+            return self._key_source(expr, 'bool({})'.format, expr)
+        inlined = self._inline_binary(expr)
+        if inlined is not None:
+            return inlined
+        return self._fallback(expr)
+
+    def _flatten(self, expr, expr_type):
+        if type(expr) is expr_type:
+            return self._flatten(expr.left, expr_type) + self._flatten(expr.right, expr_type)
+        return [expr]
+
+    def _key_conditions(self, expr):
+        """Inlines all conditions of group on one value of key"""
+        keys = self._keys(expr.key)
+        # every condition reads the value, it's looked up once into local variable
+        self._shared = self._shared | set(keys[:size] for size in range(1, len(keys) + 1))
+        if not expr.satisfiable:
+            return self._key_source(expr.key, lambda value: 'False', expr)
+        checks = []
+        for op, literal in expr.conditions:
+            if op is is_member:
+                if len(literal) < HASHED_ARRAY_SIZE:
+                    literal = tuple(literal)
+                checks.append(('in', self._add_name('c', literal)))
+            else:
+                checks.append((OP_SYMBOLS[op], self._literal(literal)))
+        return self._key_source(expr.key, self._lowered(lambda value: '({})'.format(' and '.join(
+            '{} {} {}'.format(value, symbol, literal) for symbol, literal in checks))), expr)
+
+    def _inline_binary(self, expr):
+        """Returns inlined source for `key op literal` expressions or None"""
+        expr_type = type(expr)
+        if expr_type in COMPARISONS:
+            op, symbol = COMPARISONS[expr_type]
+            if isinstance(expr.left, KeyExpression):
+                key, other = expr.left, expr.right
+            elif isinstance(expr.right, KeyExpression):
+                key, other = expr.right, expr.left
+                symbol = OP_SYMBOLS[REFLECTED_OPS[op]]
+            else:
+                return None
+            is_constant, value = self._literal_value(other)
+            if not is_constant or not isinstance(value, SCALAR_TYPES):
+                return None
+            literal = self._literal(value)
+            return self._key_source(key, self._lowered(
+                lambda value: '({} {} {})'.format(value, symbol, literal)), expr)
+
+        if expr_type in (InExpression, ContainsExpression):
+            if expr_type is InExpression:
+                item, container = expr.left, expr.right
+            else:
+                item, container = expr.right, expr.left
+            if isinstance(item, KeyExpression):
+                is_constant, value = self._literal_value(container)
+                if is_constant and isinstance(value, list) \
+                        and all(isinstance(val, SCALAR_TYPES) for val in value):
+                    if len(value) < HASHED_ARRAY_SIZE:
+                        # scanning of short tuple is faster than python-level lookup
+                        value = tuple(value)
+                    elif not isinstance(value, LiteralArray):
+                        value = LiteralArray(value)
+                    items = self._add_name('c', value)
+                    return self._key_source(item, self._lowered(
+                        lambda value: '({} in {})'.format(value, items)), expr)
+            elif isinstance(container, KeyExpression):
+                is_constant, value = self._literal_value(item)
+                if is_constant and isinstance(value, SCALAR_TYPES):
+                    literal = self._literal(value)
+                    return self._key_source(container, self._lowered(
+                        lambda value: '({} in {})'.format(literal, value)), expr)
+            return None
+
+        if expr_type is MatchExpression and isinstance(expr.left, KeyExpression):
+            is_constant, regexp = self._literal_value(expr.right)
+            if not is_constant:
+                return None
+            name = self._add_name('c', regexp)
+            return self._key_source(expr.left, self._lowered(
+                lambda value: '({}.match({}) is not None)'.format(name, value)), expr)
+
+        if expr_type is LikeExpression and isinstance(expr.left, KeyExpression):
+            if expr.regexp is not None:
+                # regexp is case insensitive by itself, values aren't lowered
+                name = self._add_name('c', expr.regexp)
+                return self._key_source(
+                    expr.left, lambda value: '({}.match({}) is not None)'.format(name, value),
+                    expr)
+            is_constant, pattern = self._literal_value(expr.right)
+            if not is_constant:
+                return None
+            literal = self._literal(pattern)
+            return self._key_source(expr.left, self._lowered(
+                lambda value: '_fnmatchcase({}, {})'.format(value, literal)), expr)
+        return None
+
+    def _lowered(self, make_source):
+        if self.case_sensitive:
+            return make_source
+        return lambda value: make_source('_lower({})'.format(value))
+
+    def _keys(self, key):
+        if key.keys is not None:
+            return tuple(key.keys)
+        if self.use_nested_keys:
+            return tuple(key.value.split(self.key_separator))
+        return (key.value,)
+
+    def _local(self, prefix):
+        """Returns local variable with value of shared key prefix of plain dicts,
+        `_MISSING` if key is missing or `_OTHER` if some container isn't a dict"""
+        name = self._locals.get(prefix)
+        if name is not None:
+            return name
+        key = prefix[-1]
+        if len(prefix) == 1:
+            value = "data.get({!r}, _MISSING) if type(data) is dict else _OTHER".format(key)
+        else:
+            # prefixes of shared prefix are shared
+            parent = self._local(prefix[:-1])
+            value = "{0}.get({1!r}, _MISSING) if type({0}) is dict else " \
+                    "(_MISSING if {0} is _MISSING else _OTHER)".format(parent, key)
+        name = self._locals[prefix] = '_k{}'.format(len(self._locals))
+        self._assignments.append((name, value))
+        return name
+
+    def _key_source(self, key, make_source, expr):
+        """Inlines value lookup for plain dicts, `expr` is evaluated generically otherwise"""
+        keys = self._keys(key)
+        generic = self._fallback(expr)
+        missing = generic if self.raise_keyerror else 'False'
+
+        size = len(keys)
+        while size and keys[:size] not in self._shared:
+            size -= 1
+        base = self._local(keys[:size]) if size else 'data'
+        rest = keys[size:]
+
+        # builds conditional expression from the innermost key to the outermost
+        accessors = [base]
+        for name in rest:
+            accessors.append('{}[{!r}]'.format(accessors[-1], name))
+        source = make_source(accessors[-1])
+        if not rest:
+            source = '({} if {} is _OTHER else {})'.format(generic, base, source)
+        for index in range(len(rest) - 1, -1, -1):
+            container = accessors[index]
+            source = '({} if {!r} in {} else {})'.format(source, rest[index], container, missing)
+            source = '({} if type({}) is dict else {})'.format(source, container, generic)
+        if size:
+            source = '({} if {} is _MISSING else {})'.format(missing, base, source)
+        return source
@@ -0,0 +1,491 @@
+"""In-memory collection of records with secondary indexes and query planner"""
+from bisect import bisect_left, bisect_right
+import operator
+
+from dictquery.analysis import predicates
+from dictquery.bitmap import from_rows, to_rows, count, full
+from dictquery.compiler import CompiledQuery, compile_query
+from dictquery.datavalue import (
+    iter_values, basestring, HASHABLE_TYPES, STRING_TYPES, NUMBER_TYPES, CONTAINER_TYPES)
+from dictquery.exceptions import DQException
+from dictquery.parsers import AndExpression, OrExpression, NotExpression
+
+HASH = 'hash'
+SORTED = 'sorted'
+
+# conjuncts which select more rows than this times rows of the most selective
+# one are evaluated on candidates instead of being looked up
+MAX_SCAN_RATIO = 10
+# bitmaps of index buckets with less rows are built on lookup and not kept
+MIN_CACHED_ROWS = 1024
+# sorted values are split to this number of blocks with bitmap of rows each,
+# ranges are unions of block bitmaps and bitmaps of rows at the edges
+SORTED_BLOCKS = 64
+
+_OP_SYMBOLS = {
+    operator.eq: '==',
+    operator.lt: '<',
+    operator.le: '<=',
+    operator.gt: '>',
+    operator.ge: '>=',
+}
+
+
+class Rows:
+    """Bitmaps of rows of expression: `certain` satisfy it, `maybe` have to be
+    evaluated, other rows don't satisfy it. `maybe` is None for all rows"""
+    __slots__ = ('certain', 'maybe')
+
+    def __init__(self, certain, maybe):
+        self.certain = certain
+        self.maybe = maybe
+
+    def candidates(self):
+        if self.maybe is None:
+            return None
+        return self.certain | self.maybe
+
+
+class _RowList:
+    """Rows added in increasing order and their bitmap"""
+    __slots__ = ('rows', '_bitmap')
+
+    def __init__(self):
+        self.rows = []
+        self._bitmap = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        rows = self.rows
+        if not rows or rows[-1] != row:
+            rows.append(row)
+            self._bitmap = None
+
+    @property
+    def bitmap(self):
+        if self._bitmap is not None:
+            return self._bitmap
+        bitmap = from_rows(self.rows)
+        if len(self.rows) >= MIN_CACHED_ROWS:
+            self._bitmap = bitmap
+        return bitmap
+
+
+_NO_ROWS = _RowList()
+
+
+class HashIndex:
+    """Rows by hashable values of key, for `==` and `IN`"""
+    kind = HASH
+
+    def __init__(self, keys, case_sensitive=True):
+        self.keys = keys
+        self.case_sensitive = case_sensitive
+        self.values = {}
+        # rows with values of other types, compared with literals by evaluation
+        self.unknown = _RowList()
+
+    def add(self, row, values):
+        for value in values:
+            value_type = type(value)
+            if value_type in STRING_TYPES:
+                if not self.case_sensitive:
+                    value = value.lower()
+            elif value_type in HASHABLE_TYPES:
+                if value != value:
+                    # nan isn't equal to anything
+                    continue
+            elif value_type in CONTAINER_TYPES:
+                continue
+            else:
+                self.unknown.add(row)
+                continue
+            rows = self.values.get(value)
+            if rows is None:
+                rows = self.values[value] = _RowList()
+            rows.add(row)
+
+    def supports(self, predicate):
+        return predicate.op is operator.eq
+
+    def estimate(self, predicate):
+        return len(self.values.get(predicate.value, _NO_ROWS)) + len(self.unknown)
+
+    def lookup(self, predicate):
+        return Rows(self.values.get(predicate.value, _NO_ROWS).bitmap, self.unknown.bitmap)
+
+
+class _SortedValues:
+    """Values and their rows sorted by value, new values are sorted on lookup.
+
+    Adds are cheap, but the first lookup after them merges all pending values
+    and rebuilds bitmaps of all blocks, which is O(rows): positions of later rows
+    shift on insert, so keeping blocks up to date per add wouldn't be cheaper.
+    Interleaving adds with range lookups is slow, add in bulk before querying.
+    """
+    def __init__(self):
+        self.values = []
+        self.rows = []
+        self._pending = []
+        self._block = 1
+        self._blocks = []
+
+    def add(self, value, row):
+        self._pending.append((value, row))
+
+    def _sort(self):
+        if self._pending:
+            pairs = sorted(list(zip(self.values, self.rows)) + self._pending,
+                           key=operator.itemgetter(0))
+            self.values = [value for value, _ in pairs]
+            self.rows = [row for _, row in pairs]
+            self._pending = []
+            rows = self.rows
+            block = self._block = max(MIN_CACHED_ROWS, -(-len(rows) // SORTED_BLOCKS))
+            self._blocks = [from_rows(rows[start:start + block])
+                            for start in range(0, len(rows) - block + 1, block)]
+
+    def bounds(self, op, value):
+        """Returns slice of rows which values satisfy `row_value op value`"""
+        self._sort()
+        if op is operator.gt:
+            return bisect_right(self.values, value), len(self.values)
+        if op is operator.ge:
+            return bisect_left(self.values, value), len(self.values)
+        if op is operator.lt:
+            return 0, bisect_left(self.values, value)
+        if op is operator.le:
+            return 0, bisect_right(self.values, value)
+        return bisect_left(self.values, value), bisect_right(self.values, value)
+
+    def bitmap(self, start, stop):
+        """Returns bitmap of rows of slice, whole blocks are taken from their bitmaps"""
+        block = self._block
+        first, last = -(-start // block), stop // block
+        if first >= last:
+            return from_rows(self.rows[start:stop])
+        bitmap = from_rows(self.rows[start:first * block] + self.rows[last * block:stop])
+        for block_bitmap in self._blocks[first:last]:
+            bitmap |= block_bitmap
+        return bitmap
+
+
+class SortedIndex:
+    """Rows sorted by number and string values of key, for `<`, `<=`, `>`, `>=` and `==`.
+
+    Rows which have values of other kind than literal are evaluated, comparison
+    of them may raise `TypeError` depending on order of values
+    """
+    kind = SORTED
+
+    def __init__(self, keys, case_sensitive=True):
+        self.keys = keys
+        self.case_sensitive = case_sensitive
+        self.numbers = _SortedValues()
+        self.strings = _SortedValues()
+        self.non_numbers = _RowList()
+        self.non_strings = _RowList()
+        # rows with values of types which may be equal to literals
+        self.unknown = _RowList()
+
+    def add(self, row, values):
+        for value in values:
+            value_type = type(value)
+            if value_type in NUMBER_TYPES:
+                self.non_strings.add(row)
+                if value == value:
+                    # nan isn't ordered
+                    self.numbers.add(value, row)
+                continue
+            self.non_numbers.add(row)
+            if value_type in STRING_TYPES:
+                self.strings.add(value if self.case_sensitive else value.lower(), row)
+                continue
+            self.non_strings.add(row)
+            if value_type not in HASHABLE_TYPES and value_type not in CONTAINER_TYPES:
+                self.unknown.add(row)
+
+    def supports(self, predicate):
+        if predicate.op not in _OP_SYMBOLS:
+            # `CONTAINS` and text search are evaluated
+            return False
+        return type(predicate.value) in NUMBER_TYPES or type(predicate.value) in STRING_TYPES
+
+    def _values(self, predicate):
+        if isinstance(predicate.value, basestring):
+            return self.strings, self.non_strings
+        return self.numbers, self.non_numbers
+
+    def _other(self, predicate):
+        values, other = self._values(predicate)
+        return self.unknown if predicate.op is operator.eq else other
+
+    def estimate(self, predicate):
+        values, _ = self._values(predicate)
+        start, stop = values.bounds(predicate.op, predicate.value)
+        return stop - start + len(self._other(predicate))
+
+    def lookup(self, predicate):
+        values, _ = self._values(predicate)
+        start, stop = values.bounds(predicate.op, predicate.value)
+        other = self._other(predicate).bitmap
+        return Rows(values.bitmap(start, stop) & ~other, other)
+
+
+INDEX_KINDS = {
+    HASH: HashIndex,
+    SORTED: SortedIndex,
+}
+
+
+def _and(left, right):
+    certain = left.certain & right.certain
+    left_candidates, right_candidates = left.candidates(), right.candidates()
+    if left_candidates is None:
+        maybe = right_candidates
+    elif right_candidates is None:
+        maybe = left_candidates
+    else:
+        maybe = left_candidates & right_candidates
+    if maybe is not None:
+        maybe &= ~certain
+    return Rows(certain, maybe)
+
+
+def _or(left, right):
+    certain = left.certain | right.certain
+    if left.maybe is None or right.maybe is None:
+        return Rows(certain, None)
+    return Rows(certain, (left.maybe | right.maybe) & ~certain)
+
+def _conjuncts(expr):
+    if isinstance(expr, AndExpression):
+        return _conjuncts(expr.left) + _conjuncts(expr.right)
+    return [expr]
+
+
+class Scan:
+    """Index lookup of plan"""
+    def __init__(self, index, predicate, estimate):
+        self.index = index
+        self.predicate = predicate
+        self.estimate = estimate
+
+    def __repr__(self):
+        op = self.predicate.op
+        return '<Scan {} index {!r} {} {!r}, ~{} rows>'.format(
+            self.index.kind, self.predicate.keys, _OP_SYMBOLS.get(op, getattr(op, '__name__', op)),
+            self.predicate.value, self.estimate)
+
+
+class Plan:
+    """Evaluation plan of query: `conjuncts` of top level `AND` looked up in indexes
+    (as list of their `scans`), `residual` query evaluated on rows they select.
+    Without conjuncts every row is evaluated"""
+    def __init__(self, compiled, conjuncts, residual):
+        self.compiled = compiled
+        self.conjuncts = conjuncts
+        self.residual = residual
+
+    @property
+    def scans(self):
+        return [scan for _, scans in self.conjuncts for scan in scans]
+
+    @property
+    def full_scan(self):
+        return not self.conjuncts
+
+    def __repr__(self):
+        return '<Plan scans={!r} residual={}>'.format(self.scans, self.residual is not None)
+
+
+class Collection:
+    """In-memory list of records with secondary indexes on keys.
+
+    `create_index(key, 'hash')` indexes values for `==` / `IN`, `'sorted'` for
+    `<`, `<=`, `>`, `>=` and `==`. Planner looks up indexable conjuncts of top level
+    `AND` (comparisons of key with literal, their `AND` / `OR` / `NOT`), intersects
+    rows they select and evaluates only other conjuncts on them. Conjuncts which
+    select much more rows than the most selective one aren't looked up. Queries
+    without indexable conjuncts are evaluated on every record.
+
+    Records aren't copied, changing indexed values of added record breaks indexes.
+    Rows which aren't evaluated don't raise errors they would raise on evaluation.
+    """
+    def __init__(self, records=(), use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, backend='closure'):
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.backend = backend
+        self.records = []
+        self.indexes = {}
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, row):
+        return self.records[row]
+
+    def _keys(self, key):
+        if self.use_nested_keys:
+            return tuple(key.split(self.key_separator))
+        return (key,)
+
+    def create_index(self, key, kind=HASH):
+        """Indexes values of `key` (with nested keys) in index of `kind`: 'hash' or 'sorted'"""
+        if kind not in INDEX_KINDS:
+            raise DQException("Unknown index kind '{}', expected one of: {}".format(
+                kind, ', '.join(sorted(INDEX_KINDS))))
+        keys = self._keys(key)
+        index = INDEX_KINDS[kind](keys, self.case_sensitive)
+        for row, record in enumerate(self.records):
+            index.add(row, iter_values(record, keys))
+        self.indexes.setdefault(keys, {})[kind] = index
+        return index
+
+    def drop_index(self, key, kind=HASH):
+        keys = self._keys(key)
+        del self.indexes[keys][kind]
+        if not self.indexes[keys]:
+            del self.indexes[keys]
+
+    def add(self, record):
+        row = len(self.records)
+        self.records.append(record)
+        for keys, indexes in self.indexes.items():
+            for index in indexes.values():
+                index.add(row, iter_values(record, keys))
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def _compile(self, query):
+        return compile_query(
+            query, use_nested_keys=self.use_nested_keys, key_separator=self.key_separator,
+            case_sensitive=self.case_sensitive, backend=self.backend)
+
+    def _scans(self, expr):
+        """Returns index scans of comparison `expr` or None if it isn't indexable"""
+        clauses, exact = predicates(expr)
+        if not exact or len(clauses) != 1 or not clauses[0]:
+            return None
+        scans = []
+        for predicate in clauses[0]:
+            index = self._index(predicate)
+            if index is None:
+                return None
+            scans.append(Scan(index, predicate, index.estimate(predicate)))
+        return scans
+
+    def _index(self, predicate):
+        indexes = self.indexes.get(predicate.keys, {})
+        if predicate.op is operator.eq and HASH in indexes:
+            return indexes[HASH]
+        index = indexes.get(SORTED)
+        if index is not None and index.supports(predicate):
+            return index
+        return None
+
+    def _plan_expr(self, expr):
+        """Returns scans of indexable `expr` and estimate of rows it selects"""
+        if isinstance(expr, (AndExpression, OrExpression)):
+            left, right = self._plan_expr(expr.left), self._plan_expr(expr.right)
+            if left is None or right is None:
+                return None
+            if isinstance(expr, AndExpression):
+                return left[0] + right[0], min(left[1], right[1])
+            return left[0] + right[0], left[1] + right[1]
+        if isinstance(expr, NotExpression):
+            value = self._plan_expr(expr.value)
+            if value is None:
+                return None
+            return value[0], len(self.records)
+        scans = self._scans(expr)
+        if scans is None:
+            return None
+        return scans, sum(scan.estimate for scan in scans)
+
+    def plan(self, query):
+        """Returns `Plan` of query string or `CompiledQuery`"""
+        compiled = self._compile(query)
+        if compiled.raise_keyerror or compiled.case_sensitive != self.case_sensitive \
+                or compiled.prepared_ast is None:
+            # missing keys aren't in indexes, strings are compared differently
+            return Plan(compiled, [], None)
+        raw = _conjuncts(compiled.ast)
+        prepared = _conjuncts(compiled.prepared_ast)
+        planned = [self._plan_expr(expr) for expr in prepared]
+        estimates = [item[1] for item in planned if item is not None]
+        if not estimates:
+            return Plan(compiled, [], None)
+        limit = min(estimates) * MAX_SCAN_RATIO
+
+        conjuncts, residual = [], None
+        for raw_expr, expr, item in zip(raw, prepared, planned):
+            if item is not None and item[1] <= limit:
+                conjuncts.append((expr, item[0]))
+            else:
+                residual = raw_expr if residual is None else AndExpression(residual, raw_expr)
+        if residual is not None:
+            residual = CompiledQuery(
+                residual, use_nested_keys=compiled.use_nested_keys,
+                key_separator=compiled.key_separator, case_sensitive=compiled.case_sensitive,
+                backend=compiled.backend)
+        return Plan(compiled, conjuncts, residual)
+
+    def _rows(self, expr):
+        if isinstance(expr, AndExpression):
+            return _and(self._rows(expr.left), self._rows(expr.right))
+        if isinstance(expr, OrExpression):
+            return _or(self._rows(expr.left), self._rows(expr.right))
+        if isinstance(expr, NotExpression):
+            value = self._rows(expr.value)
+            if value.maybe is None:
+                return Rows(0, None)
+            return Rows(full(len(self.records)) & ~(value.certain | value.maybe), value.maybe)
+        result = None
+        for scan in self._scans(expr):
+            rows = scan.index.lookup(scan.predicate)
+            result = rows if result is None else _or(result, rows)
+        return result
+
+    def bitmap(self, query):
+        """Returns bitmap of rows which satisfy query, see `dictquery.bitmap`"""
+        plan = query if isinstance(query, Plan) else self.plan(query)
+        evaluate = plan.compiled.evaluate
+        records = self.records
+        if plan.full_scan:
+            return from_rows(row for row, record in enumerate(records) if evaluate(record))
+
+        rows = None
+        for expr, _ in plan.conjuncts:
+            expr_rows = self._rows(expr)
+            rows = expr_rows if rows is None else _and(rows, expr_rows)
+        bitmap = rows.certain
+        if plan.residual is not None:
+            residual = plan.residual.evaluate
+            bitmap = from_rows(row for row in to_rows(bitmap) if residual(records[row]))
+        maybe = rows.maybe
+        if maybe is None:
+            maybe = full(len(records)) & ~rows.certain
+        return bitmap | from_rows(row for row in to_rows(maybe) if evaluate(records[row]))
+
+    def rows(self, query):
+        """Returns sorted list of rows which satisfy query"""
+        return to_rows(self.bitmap(query))
+
+    def filter(self, query):
+        """Returns list of records which satisfy query string or `CompiledQuery`, in order of adding"""
+        records = self.records
+        return [records[row] for row in self.rows(query)]
+
+    def count(self, query):
+        return count(self.bitmap(query))
@@ -0,0 +1,714 @@
+from datetime import datetime
+import fnmatch
+from itertools import count
+import operator
+import threading
+from timeit import default_timer
+
+from dictquery.analysis import (
+    key_paths, chain_operands, estimate, rank, iter_keys, shared_prefixes, REFLECTED_OPS)
+from dictquery.exceptions import DQException
+from dictquery.datavalue import (
+    iter_values, iter_query_value, LazyValues, DataQueryItem, LiteralArray,
+    basestring, match_regexp)
+from dictquery.optimizer import prepare, reorder as reorder_operands, rewrite as rewrite_ast
+from dictquery.parallel import parallel_filter
+from dictquery.parsers import (
+    KeyExpression, CompactArrayExpression, KeyConditionsExpression, UNPREPARED)
+from dictquery.vectorized import VectorCompiler, mask, where
+from dictquery.visitors import DataQueryVisitor
+
+
+SCALAR_TYPES = (float, basestring, bool, type(None))
+REORDER_MODES = (False, None, 'static', 'adaptive')
+# adaptive chains time every `ADAPTIVE_SAMPLE`th evaluation and reorder operands
+# after every `ADAPTIVE_REPLAN` timed ones, static estimate weighs as
+# `ADAPTIVE_PRIOR` timed evaluations, older measurements weigh less on every replan
+ADAPTIVE_SAMPLE = 16
+ADAPTIVE_REPLAN = 64
+ADAPTIVE_PRIOR = 8
+ADAPTIVE_DECAY = 0.5
+
+
+def _constant(value):
+    def constant(data):
+        return value
+    constant.is_constant = True
+    constant.value = value
+    return constant
+
+
+def _is_constant(func):
+    return getattr(func, 'is_constant', False)
+
+
+# not resolved value of shared key prefix
+_UNRESOLVED = object()
+
+
+class _CachedValues:
+    """Lazy values cached as they are consumed, so they may be iterated many times
+    and every value is resolved once"""
+    __slots__ = ('_source', '_values')
+
+    def __init__(self, source):
+        self._source = iter(source)
+        self._values = []
+
+    def __iter__(self):
+        values = self._values
+        index = 0
+        while True:
+            if index < len(values):
+                yield values[index]
+                index += 1
+                continue
+            if self._source is None:
+                return
+            try:
+                value = next(self._source)
+            except StopIteration:
+                self._source = None
+                return
+            values.append(value)
+
+
+def _iter_rest(values, keys):
+    for value in values:
+        for val in iter_values(value, keys):
+            yield val
+
+
+def _rest_values(values, keys):
+    """Values of nested `keys` of every value of `values`"""
+    if type(values) is tuple and len(values) == 1:
+        return iter_values(values[0], keys)
+    return _iter_rest(values, keys)
+
+
+class AdaptiveChain:
+    """Compiled operands of `AND` (`stop` is False) or `OR` (`stop` is True) chain,
+    evaluated in order until one of them returns `stop`.
+
+    Every `ADAPTIVE_SAMPLE`th evaluation evaluated operands are timed and their
+    pass rates counted. Periodically operands are sorted by `dictquery.analysis.rank`
+    of measured cost and rate, operands which weren't evaluated yet use static
+    `estimates` scaled to measured time. Measurements are added and operands
+    sorted under a lock, chain may be evaluated by several threads.
+    """
+    def __init__(self, operands, estimates, stop):
+        self.operands = operands
+        self.estimates = estimates
+        self.stop = stop
+        self.order = list(range(len(operands)))
+        self.ordered = list(operands)
+        self.calls = [0.0] * len(operands)
+        self.passes = [0.0] * len(operands)
+        self.times = [0.0] * len(operands)
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def compile(self):
+        """Returns function `f(data)` which evaluates chain"""
+        counter = count(1)
+        chain = self
+        stop = self.stop
+
+        def adaptive_chain(data):
+            if next(counter) % ADAPTIVE_SAMPLE:
+                for operand in chain.ordered:
+                    if bool(operand(data)) is stop:
+                        return stop
+                return not stop
+            return chain._sample(data)
+        adaptive_chain.chain = chain
+        return adaptive_chain
+
+    def _sample(self, data):
+        stop = self.stop
+        result = not stop
+        measured = []
+        for index in self.order:
+            start = default_timer()
+            value = bool(self.operands[index](data))
+            measured.append((index, default_timer() - start, value))
+            if value is stop:
+                result = stop
+                break
+        with self._lock:
+            for index, elapsed, value in measured:
+                self.times[index] += elapsed
+                self.calls[index] += 1
+                if value:
+                    self.passes[index] += 1
+            self._samples += 1
+            if self._samples % ADAPTIVE_REPLAN == 0:
+                self.replan()
+        return result
+
+    def replan(self):
+        """Sorts operands by rank of measured cost and rate, called under `_lock`"""
+        static_time = sum(calls * cost for calls, (cost, _) in zip(self.calls, self.estimates))
+        # seconds per unit of static cost
+        unit = sum(self.times) / static_time if static_time else 0.0
+        ranks = []
+        for index, (static_cost, static_rate) in enumerate(self.estimates):
+            calls = self.calls[index]
+            cost = self.times[index] / calls if calls else static_cost * unit
+            rate = (self.passes[index] + static_rate * ADAPTIVE_PRIOR) / (calls + ADAPTIVE_PRIOR)
+            ranks.append(rank(cost, rate, not self.stop))
+        order = sorted(self.order, key=ranks.__getitem__)
+        self.ordered = [self.operands[index] for index in order]
+        self.order = order
+        for stats in (self.calls, self.passes, self.times):
+            for index in range(len(stats)):
+                stats[index] *= ADAPTIVE_DECAY
+
+
+class ClosureCompiler:
+    """Compiles `ast` to a tree of nested closures.
+
+    Every `visit_*` method returns function `f(data)`, literals are converted
+    once at compile time. Evaluation semantics are the same as in `DataQueryVisitor`.
+
+    Key prefixes shared by several keys of query (`age` of `age > 1 AND age < 9`,
+    `user.address` of `user.address.city` and `user.address.zip`) are resolved once
+    per evaluation: functions get record list `[data, prefix values...]` instead of
+    `data`, values are resolved on first access. Prefixes are shared only without
+    `raise_keyerror`: with it, KeyError is raised when a missing key is read.
+    """
+    def __init__(self, use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, raise_keyerror=False, adaptive=False):
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.raise_keyerror = raise_keyerror
+        # `AND` / `OR` chains are compiled to `AdaptiveChain`
+        self.adaptive = adaptive
+        # key prefixes shared by keys of compiled ast, resolved once per evaluation
+        self._shared = frozenset()
+        self._memo_getters = {}
+        # converts literals, uses values precomputed by `PrepareVisitor` if any
+        self.literals = DataQueryVisitor(None, case_sensitive=case_sensitive)
+
+    def compile(self, ast):
+        """Returns function `f(data)` which evaluates to `True` or `False`"""
+        if ast is None:
+            return lambda data: False
+        if not self.raise_keyerror:
+            self._shared = shared_prefixes(self._key_path(key) for key in iter_keys(ast))
+        try:
+            func = ast.accept(self)
+        finally:
+            shared, self._shared = self._shared, frozenset()
+            self._memo_getters = {}
+        if _is_constant(func):
+            result = bool(func.value)
+            return lambda data: result
+        if shared:
+            unresolved = [_UNRESOLVED] * len(shared)
+            return lambda data: bool(func([data] + unresolved))
+        return lambda data: bool(func(data))
+
+    def _compile_op(self, op, left, right):
+        if _is_constant(right):
+            right_value = right.value
+            if _is_constant(left):
+                try:
+                    return _constant(op(left.value, right_value))
+                except Exception:
+                    # keep errors at evaluation time, same as visitor does
+                    pass
+            return lambda data: op(left(data), right_value)
+        if _is_constant(left):
+            left_value = left.value
+            return lambda data: op(left_value, right(data))
+        return lambda data: op(left(data), right(data))
+
+    def _compile_binary(self, op, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if op in REFLECTED_OPS:
+            if isinstance(expr.left, KeyExpression) and _is_constant(right) \
+                    and isinstance(right.value, SCALAR_TYPES):
+                return self._compile_key_op(expr.left, op, right.value)
+            if isinstance(expr.right, KeyExpression) and _is_constant(left) \
+                    and isinstance(left.value, SCALAR_TYPES):
+                # literal doesn't know how to compare with `DataQueryItem`,
+                # so python calls reflected operation of the item
+                return self._compile_key_op(expr.right, REFLECTED_OPS[op], left.value)
+        return self._compile_op(op, left, right)
+
+    def _compile_key_op(self, key_expr, op, value, lower=True):
+        """Compares values of key with literal without building `DataQueryItem`"""
+        get_values = self._compile_values(key_expr)
+        if self.case_sensitive or not lower:
+            def key_op(data):
+                for val in get_values(data):
+                    if op(val, value):
+                        return True
+                return False
+        else:
+            def key_op(data):
+                for val in get_values(data):
+                    if isinstance(val, basestring):
+                        val = val.lower()
+                    if op(val, value):
+                        return True
+                return False
+        return key_op
+
+    def _key_path(self, expr):
+        if expr.keys is not None:
+            return expr.keys
+        if self.use_nested_keys:
+            return tuple(expr.value.split(self.key_separator))
+        return (expr.value,)
+
+    def _compile_values(self, expr):
+        """Returns function `f(data)` which returns lazy iterable of key values"""
+        key = expr.value
+        keys = self._key_path(expr)
+        if self.raise_keyerror:
+            return lambda data: iter_query_value(data, key, raise_keyerror=True, keys=keys)
+        if self._shared:
+            return self._shared_values(keys)
+        return lambda data: iter_values(data, keys)
+
+    def _shared_values(self, keys):
+        """Returns function `f(record)` which returns values of `keys` starting from
+        values of the longest shared prefix"""
+        size = len(keys)
+        while size and keys[:size] not in self._shared:
+            size -= 1
+        if not size:
+            return lambda record: iter_values(record[0], keys)
+        prefix_values = self._memo_values(keys[:size])
+        if size == len(keys):
+            return prefix_values
+        rest = keys[size:]
+        return lambda record: _rest_values(prefix_values(record), rest)
+
+    def _memo_values(self, prefix):
+        """Returns function `f(record)` which returns values of shared `prefix`,
+        resolved once per record"""
+        getter = self._memo_getters.get(prefix)
+        if getter is not None:
+            return getter
+        key = prefix[-1:]
+        if len(prefix) == 1:
+            def resolve(record):
+                return iter_values(record[0], key)
+        else:
+            # prefixes of shared prefix are shared
+            parent_values = self._memo_values(prefix[:-1])
+
+            def resolve(record):
+                return _rest_values(parent_values(record), key)
+
+        # slot of prefix values in record
+        slot = len(self._memo_getters) + 1
+
+        def memo_values(record):
+            values = record[slot]
+            if values is _UNRESOLVED:
+                values = resolve(record)
+                if type(values) is not tuple:
+                    # lazy values are resolved until the first decisive one
+                    values = _CachedValues(values)
+                record[slot] = values
+            return values
+        self._memo_getters[prefix] = memo_values
+        return memo_values
+
+    def _flatten(self, expr, expr_type):
+        if type(expr) is expr_type:
+            return self._flatten(expr.left, expr_type) + self._flatten(expr.right, expr_type)
+        return [expr.accept(self)]
+
+    def visit_lt(self, expr):
+        return self._compile_binary(operator.lt, expr)
+
+    def visit_lte(self, expr):
+        return self._compile_binary(operator.le, expr)
+
+    def visit_gt(self, expr):
+        return self._compile_binary(operator.gt, expr)
+
+    def visit_gte(self, expr):
+        return self._compile_binary(operator.ge, expr)
+
+    def visit_equal(self, expr):
+        return self._compile_binary(operator.eq, expr)
+
+    def visit_notequal(self, expr):
+        return self._compile_binary(operator.ne, expr)
+
+    def _compile_contains(self, container_expr, item_expr):
+        container = container_expr.accept(self)
+        item = item_expr.accept(self)
+        if isinstance(item_expr, KeyExpression) and _is_constant(container) \
+                and isinstance(container.value, list) \
+                and all(isinstance(val, SCALAR_TYPES) for val in container.value):
+            return self._compile_key_in(item_expr, container.value)
+        return self._compile_op(operator.contains, container, item)
+
+    def _compile_key_in(self, key_expr, items):
+        """Checks if any value of key is equal to any item of literal array.
+
+        Same as `list.__contains__(DataQueryItem)`, which compares every
+        list item with `DataQueryItem.__eq__`
+        """
+        get_values = self._compile_values(key_expr)
+        case_sensitive = self.case_sensitive
+        if not isinstance(items, LiteralArray) and LiteralArray.is_hashable(items):
+            items = LiteralArray(items)
+
+        def key_in(data):
+            for val in get_values(data):
+                if not case_sensitive and isinstance(val, basestring):
+                    val = val.lower()
+                if val in items:
+                    return True
+            return False
+        return key_in
+
+    def visit_contains(self, expr):
+        return self._compile_contains(expr.left, expr.right)
+
+    def visit_in(self, expr):
+        # right operand is evaluated first, same as in `DataQueryVisitor`
+        return self._compile_contains(expr.right, expr.left)
+
+    def visit_match(self, expr):
+        def match(left, right):
+            # if dictvalue.DataQueryItem class or class with the same interface
+            if hasattr(left, 'match'):
+                return left.match(right)
+            return right.match(left) is not None
+        return self._compile_binary(match, expr)
+
+    def visit_like(self, expr):
+        if expr.regexp is not None:
+            if isinstance(expr.left, KeyExpression):
+                # regexp is case insensitive by itself, values aren't lowered
+                return self._compile_key_op(
+                    expr.left, match_regexp, expr.regexp, lower=False)
+            left = expr.left.accept(self)
+            return self._compile_op(
+                lambda left, regexp: regexp.match(left) is not None,
+                left, _constant(expr.regexp))
+
+        def like(left, right):
+            # if dictvalue.DataQueryItem class or class with the same interface
+            if hasattr(left, 'like'):
+                return left.like(right)
+            return fnmatch.fnmatchcase(left, right)
+        return self._compile_binary(like, expr)
+
+    def visit_key(self, expr):
+        key = expr.value
+        keys = self._key_path(expr)
+        raise_keyerror = self.raise_keyerror
+        case_sensitive = self.case_sensitive
+        if self._shared:
+            get_values = self._shared_values(keys)
+
+            def get_shared_item(record):
+                values = get_values(record)
+                if not isinstance(values, (tuple, _CachedValues)):
+                    # items iterate values many times
+                    values = _CachedValues(values)
+                return DataQueryItem(key=key, values=values, case_sensitive=case_sensitive)
+            return get_shared_item
+
+        def get_item(data):
+            return DataQueryItem(
+                key=key,
+                values=LazyValues(data, key, raise_keyerror=raise_keyerror, keys=keys),
+                case_sensitive=case_sensitive)
+        return get_item
+
+    def _compile_literal(self, expr):
+        return _constant(expr.accept(self.literals))
+
+    visit_number = visit_boolean = visit_string = _compile_literal
+    visit_none = visit_regexp = _compile_literal
+
+    def visit_now(self, expr):
+        return lambda data: datetime.utcnow()
+
+    def visit_array(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return _constant(expr.prepared)
+        if isinstance(expr, CompactArrayExpression):
+            return _constant(expr.accept(self.literals))
+        items = [item.accept(self) for item in expr.value]
+        if all(_is_constant(item) for item in items):
+            return _constant([item.value for item in items])
+        return lambda data: [item(data) for item in items]
+
+    def visit_not(self, expr):
+        value = expr.value.accept(self)
+        if _is_constant(value):
+            return _constant(not bool(value.value))
+        return lambda data: not bool(value(data))
+
+    def _adaptive_chain(self, expr, stop):
+        exprs = chain_operands(expr)
+        return AdaptiveChain(
+            [operand.accept(self) for operand in exprs],
+            [estimate(operand) for operand in exprs], stop).compile()
+
+    def _compile_key_conditions(self, expr):
+        """Checks `expr.conditions` on values of key looked up once.
+
+        Single value is checked by every condition in order. With several values
+        every condition needs any value which satisfies it, as `AND` of key comparisons
+        """
+        get_values = self._compile_values(expr.key)
+        conditions = expr.conditions
+        satisfiable = expr.satisfiable
+        lower = not self.case_sensitive
+
+        def key_conditions(data):
+            values = get_values(data)
+            if type(values) is not tuple:
+                values = list(values)
+            if len(values) == 1:
+                if not satisfiable:
+                    return False
+                value = values[0]
+                if lower and isinstance(value, basestring):
+                    value = value.lower()
+                for op, literal in conditions:
+                    if not op(value, literal):
+                        return False
+                return True
+            if lower:
+                values = [val.lower() if isinstance(val, basestring) else val for val in values]
+            for op, literal in conditions:
+                for value in values:
+                    if op(value, literal):
+                        break
+                else:
+                    return False
+            return True
+        return key_conditions
+
+    def visit_and(self, expr):
+        if isinstance(expr, KeyConditionsExpression):
+            return self._compile_key_conditions(expr)
+        if self.adaptive:
+            return self._adaptive_chain(expr, False)
+        operands = self._flatten(expr, type(expr))
+        if len(operands) == 2:
+            left, right = operands
+            return lambda data: bool(left(data)) and bool(right(data))
+
+        def and_(data):
+            for operand in operands:
+                if not operand(data):
+                    return False
+            return True
+        return and_
+
+    def visit_or(self, expr):
+        if self.adaptive:
+            return self._adaptive_chain(expr, True)
+        operands = self._flatten(expr, type(expr))
+        if len(operands) == 2:
+            left, right = operands
+            return lambda data: bool(left(data)) or bool(right(data))
+
+        def or_(data):
+            for operand in operands:
+                if operand(data):
+                    return True
+            return False
+        return or_
+
+
+def _visitor_backend(ast, **options):
+    return DataQueryVisitor(ast, **options).evaluate
+
+
+def _closure_backend(ast, **options):
+    return ClosureCompiler(**options).compile(ast)
+
+
+def _codegen_backend(ast, **options):
+    # codegen module depends on `ClosureCompiler`
+    from dictquery.codegen import SourceCompiler
+    return SourceCompiler(**options).compile(ast)
+
+
+BACKENDS = {
+    'visitor': _visitor_backend,
+    'closure': _closure_backend,
+    'codegen': _codegen_backend,
+}
+
+
+def _with_fallback(reordered, written):
+    """Returns function which evaluates `reordered` operands and evaluates records
+    on which they raise again by `written`, so reordering doesn't add errors"""
+    def evaluate(data):
+        try:
+            return reordered(data)
+        except Exception:
+            return written(data)
+    if hasattr(reordered, 'source'):
+        evaluate.source = reordered.source
+    return evaluate
+
+
+class CompiledQuery:
+    """Reusable query compiled with one of `BACKENDS`. Checks if `data` satisfies `ast`.
+
+    `reorder` evaluates operands of `AND` / `OR` chains in other order: 'static'
+    sorts them by estimated cost and selectivity (see `dictquery.optimizer.ReorderVisitor`),
+    'adaptive' also measures them at runtime and sorts again ('closure' backend only).
+    With `raise_keyerror` operands aren't reordered, the first missing key is raised.
+    Records on which reordered operands raise are evaluated again in written order.
+    `rewrite` drops repeated and contradictory operands, merges `==` of one key into
+    `IN` and comparisons of one key into one lookup (see `dictquery.optimizer.RewriteVisitor`).
+    """
+    def __init__(self, ast, use_nested_keys=True,
+                 key_separator='.', case_sensitive=True,
+                 raise_keyerror=False, backend='closure', reorder=False, rewrite=False):
+        if backend not in BACKENDS:
+            raise DQException("Unknown backend '{}', expected one of: {}".format(
+                backend, ', '.join(sorted(BACKENDS))))
+        if reorder not in REORDER_MODES:
+            raise DQException("Unknown reorder mode '{}', expected one of: False, 'static', 'adaptive'"
+                              .format(reorder))
+        if reorder == 'adaptive' and backend != 'closure':
+            raise DQException("Adaptive reorder requires 'closure' backend")
+        self.ast = ast
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.raise_keyerror = raise_keyerror
+        self.backend = backend
+        self.reorder = reorder
+        self.rewrite = rewrite
+        self.prepared_ast = prepare(
+            ast, use_nested_keys=use_nested_keys,
+            key_separator=key_separator, case_sensitive=case_sensitive)
+        options = dict(
+            use_nested_keys=use_nested_keys, key_separator=key_separator,
+            case_sensitive=case_sensitive, raise_keyerror=raise_keyerror)
+        written_ast = self.prepared_ast
+        if rewrite:
+            written_ast = self._rewrite(written_ast)
+        self._evaluate = BACKENDS[backend](written_ast, **options)
+        if reorder and not raise_keyerror:
+            # rewrite goes after reorder, which doesn't split groups of conditions
+            reordered_ast = reorder_operands(self.prepared_ast)
+            if rewrite:
+                reordered_ast = self._rewrite(reordered_ast)
+            if reorder == 'adaptive':
+                options['adaptive'] = True
+            self._evaluate = _with_fallback(
+                BACKENDS[backend](reordered_ast, **options), self._evaluate)
+        self._vectorized = UNPREPARED
+        self._flat = None
+
+    def _rewrite(self, ast):
+        return rewrite_ast(
+            ast, use_nested_keys=self.use_nested_keys, key_separator=self.key_separator,
+            case_sensitive=self.case_sensitive, raise_keyerror=self.raise_keyerror)
+
+    @property
+    def source(self):
+        """Generated python source of query for 'codegen' backend, None for others"""
+        return getattr(self._evaluate, 'source', None)
+
+    def evaluate(self, data):
+        return self._evaluate(data)
+
+    def key_paths(self):
+        """Returns dict of nested keys tuples read by query.
+
+        Path maps to True if it's read by the whole query and to False if it's read
+        only in some `OR` branches, see `dictquery.analysis.KeyPathsVisitor`
+        """
+        return key_paths(self.prepared_ast)
+
+    def keys(self):
+        """Returns dict of keys read by query as written in query, see `key_paths`"""
+        return dict(
+            (self.key_separator.join(path), required)
+            for path, required in self.key_paths().items())
+
+    def match(self, data):
+        return self._evaluate(data)
+
+    @property
+    def vectorized(self):
+        """Query compiled for `dictquery.vectorized`, None if it can't be vectorized"""
+        if self._vectorized is UNPREPARED:
+            self._vectorized = VectorCompiler(
+                raise_keyerror=self.raise_keyerror).compile(self.prepared_ast)
+        return self._vectorized
+
+    def mask(self, records):
+        """Returns numpy boolean array, True for `records` which satisfy query.
+
+        Keys are pulled into columns once per batch and compared as arrays,
+        records which can't be vectorized are checked one by one. Requires numpy
+        """
+        return mask(self, records)
+
+    @property
+    def flat(self):
+        """The same query with nested keys disabled, key path is a name of flat key"""
+        if not self.use_nested_keys:
+            return self
+        if self._flat is None:
+            self._flat = CompiledQuery(
+                self.ast, use_nested_keys=False, key_separator=self.key_separator,
+                case_sensitive=self.case_sensitive, raise_keyerror=self.raise_keyerror,
+                backend=self.backend, reorder=self.reorder, rewrite=self.rewrite)
+        return self._flat
+
+    def where(self, columns):
+        """Returns numpy array of indices of matching rows of columnar data.
+
+        `columns` is dict of equal length lists or numpy arrays or numpy structured
+        array, dotted key is a column name. Requires numpy
+        """
+        return where(self, columns)
+
+    def __reduce__(self):
+        # compiled functions aren't pickled, query is compiled again on unpickling
+        return self.__class__, (
+            self.ast, self.use_nested_keys, self.key_separator,
+            self.case_sensitive, self.raise_keyerror, self.backend, self.reorder, self.rewrite)
+
+    def filter(self, data, workers=None, chunksize=1000):
+        """Yields items of iterable `data` which satisfy query.
+
+        With `workers` items are evaluated by that many processes in chunks of
+        `chunksize`, see `dictquery.parallel.parallel_filter`
+        """
+        if workers is not None:
+            return parallel_filter(self, data, workers, chunksize)
+        return self._filter(data)
+
+    def _filter(self, data):
+        evaluate = self._evaluate
+        for item in data:
+            if evaluate(item):
+                yield item
+
+
+def compile_query(query, **options):
+    """Returns `query` compiled by `dictquery.compile` with `options`,
+    `CompiledQuery` is returned as is"""
+    if isinstance(query, CompiledQuery):
+        return query
+    # imported here, `dictquery` package imports this module
+    import dictquery
+    return dictquery.compile(query, **options)
@@ -3,6 +3,7 @@ try:
 except ImportError:
     from collections import Iterable, Sequence, Mapping
 
+from itertools import chain
 import fnmatch
 import operator
 import re
@@ -34,6 +35,20 @@ def _get_instance_value(obj, key):
 def _get_mapping_value(obj, key):
     return obj[key]
 
+_MISSING = object()
+
+
+def _is_in(value, container):
+    return value in container
+
+
+def match_regexp(value, regexp):
+    return regexp.match(value)
+
+def compile_like(pattern, case_sensitive=True):
+    """Translates glob `pattern` of LIKE operation to compiled regexp"""
+    return re.compile(fnmatch.translate(pattern), 0 if case_sensitive else re.IGNORECASE)
+
 
 class AbsItem:
     def __init__(self, value):
@@ -68,65 +83,224 @@ class IterableItem(AbsItem):
                 continue
 
 
-def item_factory(value):
+def _mapping_values(value, key):
+    return (value[key],)
+
+
+def _instance_values(value, key):
+    return (_get_instance_value(value, key),)
+
+
+def _iterable_values(value, key):
+    for item in value:
+        try:
+            if type(item) is dict:
+                yield item[key]
+                continue
+            getter = values_getter(item)
+            if getter is _mapping_values:
+                yield item[key]
+            elif getter is _instance_values:
+                yield _get_instance_value(item, key)
+        except KeyError:
+            continue
+
+
+def _string_values(value, key):
+    # string is iterable of strings, which are neither mappings nor instances
+    return ()
+
+
+_values_getters = {
+    dict: _mapping_values,
+    list: _iterable_values,
+    tuple: _iterable_values,
+    str: _string_values,
+    bytes: _iterable_values,
+    int: None,
+    float: None,
+    bool: None,
+    type(None): None,
+}
+_VALUES_GETTERS_LIMIT = 1024
+
+
+def values_getter(value):
+    """Returns function `f(value, key)` which gets values of `key` from `value` or None.
+
+    Function is resolved once per concrete type, ABC `isinstance` checks are slow
+    """
+    value_type = type(value)
+    try:
+        return _values_getters[value_type]
+    except KeyError:
+        pass
     if _is_mapping(value):
-        return MappingItem(value)
+        getter = _mapping_values
     elif _is_instance(value):
-        return InstanceItem(value)
+        getter = _instance_values
     elif _is_iterable(value):
-        return IterableItem(value)
-    return None
+        getter = _iterable_values
+    else:
+        getter = None
+    # dynamically created types shouldn't grow cache forever
+    if len(_values_getters) < _VALUES_GETTERS_LIMIT:
+        _values_getters[value_type] = getter
+    return getter
 
 
-def query_value(data, data_key, use_nested_keys=True,
-                key_separator='.', raise_keyerror=False):
-    result = []
+_item_classes = {
+    _mapping_values: MappingItem,
+    _instance_values: InstanceItem,
+    _iterable_values: IterableItem,
+    _string_values: IterableItem,
+}
+
+
+def item_factory(value):
+    item_class = _item_classes.get(values_getter(value))
+    if item_class is None:
+        return None
+    return item_class(value)
+
+
+def _split_key(data_key, use_nested_keys, key_separator):
     if use_nested_keys:
-        keys = data_key.split(key_separator)
-    else:
-        keys = [data_key]
+        return data_key.split(key_separator)
+    return [data_key]
 
-    def get_value(value, keys):
-        if not keys:
-            return
-        item = item_factory(value)
-        if item is None:
-            return
 
-        if len(keys) == 1:
-            try:
-                for val in item.get_value(keys[0]):
-                    result.append(val)
-            except KeyError:
-                pass
-            return
+def iter_values(data, keys, index=0):
+    """Returns lazy iterable of values found by nested `keys` in `data`"""
+    getter = values_getter(data)
+    if getter is None:
+        return ()
+    try:
+        values = getter(data, keys[index])
+    except KeyError:
+        return ()
+    if index == len(keys) - 1:
+        return values
+    return _iter_nested_values(values, keys, index + 1)
+
+
+def _iter_nested_values(values, keys, index):
+    for value in values:
+        for val in iter_values(value, keys, index):
+            yield val
+
+
+def iter_query_value(data, data_key, use_nested_keys=True,
+                     key_separator='.', raise_keyerror=False, keys=None):
+    """Lazily yields values found by `data_key` in `data`, see `query_value`.
+
+    Nested arrays are walked one item at a time, so consumer can stop at the first
+    decisive value. `DQKeyError` is raised when iteration ends without values.
+    """
+    if keys is None:
+        keys = _split_key(data_key, use_nested_keys, key_separator)
+    found = False
+    for val in iter_values(data, keys):
+        found = True
+        yield val
+    if not found and raise_keyerror:
+        raise DQKeyError("Key '{}' not found".format(data_key))
 
-        try:
-            for next_val in item.get_value(keys[0]):
-                get_value(next_val, keys[1:])
-        except KeyError:
-            return
 
-    get_value(data, keys)
+def query_value(data, data_key, use_nested_keys=True,
+                key_separator='.', raise_keyerror=False, keys=None):
+    """Returns list of values found by `data_key` in `data`.
+
+    `keys` is a precomputed tuple of nested keys, `data_key` isn't split when it's given
+    """
+    if keys is None:
+        keys = _split_key(data_key, use_nested_keys, key_separator)
+    result = list(iter_values(data, keys))
     if not result and raise_keyerror:
         raise DQKeyError("Key '{}' not found".format(data_key))
     return result
 
 
+class LazyValues:
+    """Values of `data_key` in `data`, resolved again on every iteration"""
+    def __init__(self, data, data_key, use_nested_keys=True,
+                 key_separator='.', raise_keyerror=False, keys=None):
+        if keys is None:
+            keys = _split_key(data_key, use_nested_keys, key_separator)
+        self.data = data
+        self.data_key = data_key
+        self.keys = keys
+        self.raise_keyerror = raise_keyerror
+
+    def __iter__(self):
+        if self.raise_keyerror:
+            return iter_query_value(
+                self.data, self.data_key, raise_keyerror=True, keys=self.keys)
+        return iter(iter_values(self.data, self.keys))
+
+
+# types which hash is consistent with `==` between each other (1 == 1.0 == True)
+HASHABLE_TYPES = frozenset([str, int, float, bool, type(None)])
+# types of values which are compared with string / number literals
+STRING_TYPES = frozenset([str, type(u'')])
+NUMBER_TYPES = frozenset([int, float, bool])
+# values which are never equal to literals and can't be compared with them
+CONTAINER_TYPES = frozenset([list, tuple, dict])
+
+
+class LiteralArray(list):
+    """List of literal values with hashed membership test.
+
+    Values of `HASHABLE_TYPES` are looked up in `members` frozenset, other values
+    are compared with every item like in `list`.
+    """
+    def __init__(self, values=()):
+        list.__init__(self, values)
+        self.members = frozenset(self)
+
+    def __contains__(self, item):
+        if type(item) in HASHABLE_TYPES:
+            return item in self.members
+        return list.__contains__(self, item)
+
+    @classmethod
+    def is_hashable(cls, values):
+        return all(type(val) in HASHABLE_TYPES for val in values)
+
+
 class DataQueryItem:
+    """Values of key compared with operations. `values` may be a lazy iterable,
+    operations stop at the first value which decides the result of `strategy`"""
     def __init__(self, key, values, case_sensitive=True, strategy=any):
         self.key = key
-        self.values = values
+        self._values = values
         self.strategy = strategy
         self.case_sensitive = case_sensitive
 
-    def __apply_op(self, other, op):
-        result = []
-        for val in self.values:
-            if isinstance(val, basestring) and not self.case_sensitive:
-                val = val.lower()
-            result.append(op(val, other))
-        return bool(result and self.strategy(result))
+    @property
+    def values(self):
+        """List of values, lazy values are resolved on first access"""
+        if not isinstance(self._values, list):
+            self._values = list(self._values)
+        return self._values
+
+    def __apply_op(self, other, op, lower=True):
+        lower = lower and not self.case_sensitive
+        if self.strategy is any:
+            for val in self._values:
+                if lower and isinstance(val, basestring):
+                    val = val.lower()
+                if op(val, other):
+                    return True
+            return False
+
+        results = (
+            op(val.lower() if lower and isinstance(val, basestring) else val, other)
+            for val in self._values)
+        first = next(results, _MISSING)
+        if first is _MISSING:
+            return False
+        return bool(self.strategy(chain((first,), results)))
 
     def __lt__(self, other):
         return self.__apply_op(other, operator.lt)
@@ -149,11 +323,17 @@ class DataQueryItem:
     def __contains__(self, item):
         return self.__apply_op(item, operator.contains)
 
+    def is_in(self, container):
+        """Same as `container.__contains__(self)` for list, but iterates values first"""
+        return self.__apply_op(container, _is_in)
+
     def __len__(self):
         """checks if object is True or False. for bool operation to work with this class in python2.7"""
-        if not self.values:
+        results = (bool(val) for val in self._values)
+        first = next(results, _MISSING)
+        if first is _MISSING:
             return 0
-        return 1 if self.strategy(bool(val) for val in self.values) else 0
+        return 1 if self.strategy(chain((first,), results)) else 0
 
     def __bool__(self):
         return bool(self.__len__())
@@ -162,4 +342,7 @@ class DataQueryItem:
         return self.__apply_op(regexp, lambda val, r: re.match(r, val))
 
     def like(self, pattern):
+        # regexp from `compile_like` is case insensitive by itself, values aren't lowered
+        if hasattr(pattern, 'match'):
+            return self.__apply_op(pattern, match_regexp, lower=False)
         return self.__apply_op(pattern, fnmatch.fnmatchcase)
@@ -0,0 +1,103 @@
+"""Search of many keywords in text with Aho-Corasick automaton.
+
+`pyahocorasick` (`pip install dictquery[ahocorasick]`) is used if installed,
+otherwise automaton is built in python. Both scan text once, time doesn't
+depend on number of keywords.
+"""
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class _Automaton:
+    """Aho-Corasick automaton in python, transitions are resolved with failure
+    links once per state and char and cached"""
+    def __init__(self, keywords):
+        goto = [{}]
+        output = [()]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    output.append(())
+                    goto[state][char] = next_state
+                state = next_state
+            output[state] += (keyword,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                output[next_state] += output[fail[next_state]]
+
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+        self.transitions = [dict(state) for state in goto]
+
+    def _transition(self, state, char):
+        target = state
+        while True:
+            next_state = self.goto[target].get(char)
+            if next_state is not None:
+                break
+            if not target:
+                next_state = 0
+                break
+            target = self.fail[target]
+        self.transitions[state][char] = next_state
+        return next_state
+
+    def find(self, text):
+        transitions = self.transitions
+        output = self.output
+        found = set()
+        state = 0
+        for char in text:
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                next_state = self._transition(state, char)
+            state = next_state
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class _ExternalAutomaton:
+    def __init__(self, keywords):
+        self.automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            self.automaton.add_word(keyword, keyword)
+        self.automaton.make_automaton()
+
+    def find(self, text):
+        return set(keyword for _, keyword in self.automaton.iter(text))
+
+
+class KeywordMatcher:
+    """Finds which of non empty string `keywords` are substrings of text"""
+    def __init__(self, keywords):
+        keywords = set(keywords)
+        if '' in keywords:
+            raise ValueError('Empty keyword')
+        if ahocorasick is not None and keywords:
+            self._automaton = _ExternalAutomaton(keywords)
+        else:
+            self._automaton = _Automaton(keywords)
+
+    def find(self, text):
+        """Returns set of keywords found in string `text`"""
+        return self._automaton.find(text)
@@ -0,0 +1,447 @@
+import copy
+import operator
+
+from dictquery.analysis import CostVisitor, chain_operands, rank, literal_value, REFLECTED_OPS
+from dictquery.datavalue import compile_like, LiteralArray, HASHABLE_TYPES
+from dictquery.parsers import (
+    UNPREPARED, KeyExpression, ArrayExpression, CompactArrayExpression, BooleanExpression,
+    NumberExpression, StringExpression, NowExpression, BinaryExpression, UnaryExpression, AndExpression, KeyConditionsExpression,
+    NotExpression, InExpression, EqualExpression, NotEqualExpression,
+    LTExpression, LTEExpression, GTExpression, GTEExpression)
+from dictquery.visitors import DataQueryVisitor
+
+
+class PrepareVisitor:
+    """Returns copy of `ast` with values precomputed for evaluation.
+
+    `KeyExpression.keys` gets tuple of nested keys, literals get converted
+    `prepared` value (numbers, strings, arrays, compiled regexps), arrays of hashable
+    literals become `LiteralArray` with hashed membership test, `LikeExpression`
+    gets glob pattern translated to `regexp`, so evaluation does only lookups and
+    comparisons. Prepared ast is bound to the options it was prepared with.
+    Source `ast` isn't modified, it may be shared by parse cache.
+    """
+    def __init__(self, use_nested_keys=True, key_separator='.', case_sensitive=True):
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.literals = DataQueryVisitor(None, case_sensitive=case_sensitive)
+
+    def prepare(self, ast):
+        if ast is None:
+            return None
+        return ast.accept(self)
+
+    def _binary(self, expr):
+        prepared = copy.copy(expr)
+        prepared.left = expr.left.accept(self)
+        prepared.right = expr.right.accept(self)
+        return prepared
+
+    def _literal(self, expr):
+        prepared = copy.copy(expr)
+        prepared.prepared = expr.accept(self.literals)
+        return prepared
+
+    visit_lt = visit_lte = visit_gt = visit_gte = _binary
+    visit_equal = visit_notequal = visit_contains = visit_in = _binary
+    visit_match = visit_and = visit_or = _binary
+    visit_number = visit_boolean = visit_string = visit_none = visit_regexp = _literal
+
+    def visit_like(self, expr):
+        prepared = self._binary(expr)
+        prepared.regexp = compile_like(expr.right.value, self.case_sensitive)
+        return prepared
+
+    def visit_key(self, expr):
+        prepared = copy.copy(expr)
+        if self.use_nested_keys:
+            prepared.keys = tuple(expr.value.split(self.key_separator))
+        else:
+            prepared.keys = (expr.value,)
+        return prepared
+
+    def visit_now(self, expr):
+        # `NOW` is evaluated on every call
+        return copy.copy(expr)
+
+    def visit_array(self, expr):
+        prepared = copy.copy(expr)
+        if isinstance(expr, CompactArrayExpression):
+            prepared.prepared = LiteralArray(expr.accept(self.literals))
+            return prepared
+        prepared.value = [item.accept(self) for item in expr.value]
+        if all(item.prepared is not UNPREPARED for item in prepared.value):
+            values = [item.prepared for item in prepared.value]
+            if LiteralArray.is_hashable(values):
+                # IN / CONTAINS check members with hash lookup
+                values = LiteralArray(values)
+            prepared.prepared = values
+        return prepared
+
+    def visit_not(self, expr):
+        prepared = copy.copy(expr)
+        prepared.value = expr.value.accept(self)
+        return prepared
+
+
+def prepare(ast, use_nested_keys=True, key_separator='.', case_sensitive=True):
+    """Returns prepared copy of `ast`, see `PrepareVisitor`"""
+    return PrepareVisitor(
+        use_nested_keys=use_nested_keys, key_separator=key_separator,
+        case_sensitive=case_sensitive).prepare(ast)
+
+
+class ReorderVisitor:
+    """Returns copy of prepared `ast` with operands of `AND` / `OR` chains sorted by
+    rank of their static estimates (see `dictquery.analysis.CostVisitor`), so cheap
+    and selective operands are evaluated first. Operands with equal rank keep order.
+
+    Result doesn't depend on order of operands, missing keys are False wherever
+    they are read. Operands after the deciding one aren't evaluated, so errors
+    they would raise, e.g. on comparison of string with number, may change:
+    `CompiledQuery` evaluates records on which reordered query raises as written.
+    """
+    def __init__(self):
+        self.costs = CostVisitor()
+
+    def reorder(self, ast):
+        if ast is None:
+            return None
+        return ast.accept(self)
+
+    def _chain(self, expr):
+        if isinstance(expr, KeyConditionsExpression):
+            # operands of group are evaluated together
+            return expr
+        is_and = isinstance(expr, AndExpression)
+        operands = [operand.accept(self) for operand in chain_operands(expr)]
+        ranks = []
+        for operand in operands:
+            cost, rate = self.costs.estimate(operand)
+            ranks.append(rank(cost, rate, is_and))
+        order = sorted(range(len(operands)), key=ranks.__getitem__)
+        result = operands[order[0]]
+        for index in order[1:]:
+            result = type(expr)(result, operands[index])
+        return result
+
+    def _same(self, expr):
+        return expr
+
+    visit_and = visit_or = _chain
+    visit_lt = visit_lte = visit_gt = visit_gte = _same
+    visit_equal = visit_notequal = visit_contains = visit_in = _same
+    visit_match = visit_like = visit_key = visit_array = visit_now = _same
+    visit_number = visit_boolean = visit_string = visit_none = visit_regexp = _same
+
+    def visit_not(self, expr):
+        reordered = copy.copy(expr)
+        reordered.value = expr.value.accept(self)
+        return reordered
+
+
+def reorder(ast):
+    """Returns copy of prepared `ast` with reordered operands, see `ReorderVisitor`"""
+    return ReorderVisitor().reorder(ast)
+
+
+# `key op literal` comparisons, `literal op key` is `key reflected_op literal`
+_COMPARISON_OPS = {
+    EqualExpression: operator.eq,
+    NotEqualExpression: operator.ne,
+    LTExpression: operator.lt,
+    LTEExpression: operator.le,
+    GTExpression: operator.gt,
+    GTEExpression: operator.ge,
+}
+
+
+def is_member(value, items):
+    """Operation of `KeyConditionsExpression` for `key IN [...]`"""
+    return value in items
+
+
+def _is_hashable_array(values):
+    # `PrepareVisitor` makes `LiteralArray` of hashable values only
+    return isinstance(values, LiteralArray) or \
+        isinstance(values, list) and LiteralArray.is_hashable(values)
+
+
+def signature(expr):
+    """Returns hashable structure of prepared `expr`, equal for the same expressions"""
+    if isinstance(expr, KeyExpression):
+        return ('key', expr.keys)
+    if isinstance(expr, NowExpression):
+        # `NOW` is different on every evaluation
+        return ('now', id(expr))
+    if isinstance(expr, BinaryExpression):
+        return (type(expr).__name__, signature(expr.left), signature(expr.right))
+    if isinstance(expr, UnaryExpression):
+        return (type(expr).__name__, signature(expr.value))
+    if expr.prepared is UNPREPARED:
+        # array with keys
+        return (type(expr).__name__,) + tuple(signature(item) for item in expr.value)
+    if isinstance(expr.prepared, LiteralArray):
+        # huge arrays are slow to `repr`, members are compared with `==` anyway
+        return ('array', tuple(expr.prepared))
+    return ('literal', repr(expr.prepared))
+
+
+def satisfiable(conditions):
+    """Returns False if no single value satisfies all `(op, literal)` conditions.
+
+    True means some value may satisfy them, conditions which can't be compared
+    with each other are always satisfiable.
+    """
+    candidates = None
+    lower = upper = None
+    try:
+        for op, literal in conditions:
+            if op is operator.eq or op is is_member:
+                values = [literal] if op is operator.eq else list(literal)
+                if candidates is not None:
+                    values = [value for value in candidates if value in values]
+                candidates = values
+            elif op is operator.gt or op is operator.ge:
+                if lower is None or literal > lower[1] or literal == lower[1] and op is operator.gt:
+                    lower = (op, literal)
+            elif op is operator.lt or op is operator.le:
+                if upper is None or literal < upper[1] or literal == upper[1] and op is operator.lt:
+                    upper = (op, literal)
+        if candidates is None and lower is not None and upper is not None:
+            if lower[1] == upper[1]:
+                candidates = [lower[1]]
+            elif lower[1] > upper[1]:
+                return False
+        if candidates is None:
+            return True
+        return any(all(op(value, literal) for op, literal in conditions) for value in candidates)
+    except TypeError:
+        return True
+
+
+class RewriteVisitor:
+    """Returns copy of prepared `ast` without redundant conditions, which are common
+    in generated queries.
+
+    Repeated operands of `AND` / `OR` chains are dropped, `x AND NOT x` is False,
+    `x OR NOT x` is True, `TRUE` / `FALSE` operands are folded. `key == literal` and
+    `key IN [...]` operands of `OR` on the same key become one `IN` with hashed
+    membership test, `NOT` of them in `AND` become one `NOT key IN [...]`. Other
+    comparisons of the same key with literals in `AND` are grouped into
+    `KeyConditionsExpression`, which compiled backends check with one lookup of key.
+
+    Result doesn't change, missing keys are False wherever they are read. Errors of
+    operands which are no longer evaluated, e.g. comparison of string with number,
+    may not be raised. With `raise_keyerror` operands which may raise missing key
+    aren't folded.
+    """
+    def __init__(self, use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, raise_keyerror=False):
+        self.raise_keyerror = raise_keyerror
+        # prepares new nodes
+        self.preparer = PrepareVisitor(
+            use_nested_keys=use_nested_keys, key_separator=key_separator,
+            case_sensitive=case_sensitive)
+
+    def rewrite(self, ast):
+        if ast is None:
+            return None
+        return ast.accept(self)
+
+    def _same(self, expr):
+        return expr
+
+    visit_lt = visit_lte = visit_gt = visit_gte = _same
+    visit_equal = visit_notequal = visit_contains = visit_in = _same
+    visit_match = visit_like = visit_key = visit_array = visit_now = _same
+    visit_number = visit_boolean = visit_string = visit_none = visit_regexp = _same
+
+    def visit_not(self, expr):
+        value = expr.value.accept(self)
+        if isinstance(value, BooleanExpression):
+            return self._constant(not value.prepared)
+        rewritten = copy.copy(expr)
+        rewritten.value = value
+        return rewritten
+
+    def _constant(self, value):
+        return BooleanExpression('TRUE' if value else 'FALSE').accept(self.preparer)
+
+    def _chain(self, expr):
+        if isinstance(expr, KeyConditionsExpression):
+            return expr
+        is_and = isinstance(expr, AndExpression)
+        operands = []
+        seen = set()
+        for operand in chain_operands(expr):
+            operand = operand.accept(self)
+            parts = chain_operands(operand) if type(operand) is type(expr) else [operand]
+            for part in parts:
+                if isinstance(part, BooleanExpression):
+                    if bool(part.prepared) is is_and:
+                        # `TRUE` in `AND`, `FALSE` in `OR`
+                        continue
+                    if not self.raise_keyerror or not operands:
+                        return part
+                    # operands after it are never evaluated
+                    return self._build(type(expr), operands + [part])
+                key = signature(part)
+                if key not in seen:
+                    seen.add(key)
+                    operands.append(part)
+        if not self.raise_keyerror:
+            for operand in operands:
+                if isinstance(operand, NotExpression) and signature(operand.value) in seen:
+                    return self._constant(not is_and)
+        if not operands:
+            return self._constant(is_and)
+        operands = self._merge_members(operands, is_and)
+        if is_and:
+            operands = self._group_conditions(operands)
+        return self._build(type(expr), operands)
+
+    visit_and = visit_or = _chain
+
+    def _build(self, chain_type, operands):
+        result = operands[0]
+        for operand in operands[1:]:
+            result = chain_type(result, operand)
+        return result
+
+    def _members(self, expr):
+        """Returns `(key, literal)` of `key == literal` or `(key, array)` of
+        `key IN [literals]` or None"""
+        if isinstance(expr, EqualExpression):
+            for key, other in ((expr.left, expr.right), (expr.right, expr.left)):
+                if isinstance(key, KeyExpression) and type(literal_value(other)) in HASHABLE_TYPES:
+                    return key, other
+        elif isinstance(expr, InExpression) and isinstance(expr.left, KeyExpression):
+            if _is_hashable_array(literal_value(expr.right)):
+                return expr.left, expr.right
+        return None
+
+    def _merge_members(self, operands, is_and):
+        """Merges `key == literal` operands of `OR` and `NOT key == literal` operands
+        of `AND` on the same key into one `IN` at place of the first of them"""
+        merged = []
+        groups = {}
+        for operand in operands:
+            members = None
+            if not is_and:
+                members = self._members(operand)
+            elif isinstance(operand, NotExpression):
+                members = self._members(operand.value)
+            if members is None:
+                merged.append(operand)
+                continue
+            key, literal = members
+            index = groups.get(key.keys)
+            if self.raise_keyerror and index != len(merged) - 1:
+                # operands between them may decide the chain before reading missing key
+                index = None
+            if index is None:
+                groups[key.keys] = len(merged)
+                merged.append([operand, key, [literal]])
+            else:
+                merged[index][2].append(literal)
+        for index, entry in enumerate(merged):
+            if not isinstance(entry, list):
+                continue
+            operand, key, literals = entry
+            if len(literals) > 1:
+                operand = InExpression(key, self._merged_array(literals))
+                if is_and:
+                    operand = NotExpression(operand)
+            merged[index] = operand
+        return merged
+
+    def _merged_array(self, literals):
+        """Returns prepared array of prepared literals and literal arrays, items of
+        compact arrays aren't converted again"""
+        values = []
+        items = []
+        item_classes = set()
+        for literal in literals:
+            if isinstance(literal, CompactArrayExpression):
+                item_classes.add(literal.item_class)
+                items.extend(literal.items)
+            elif isinstance(literal, (NumberExpression, StringExpression)):
+                item_classes.add(type(literal))
+                items.append(literal.value)
+            else:
+                item_classes.add(None)
+            if isinstance(literal, ArrayExpression):
+                values.extend(literal.prepared)
+            else:
+                values.append(literal.prepared)
+        if len(item_classes) == 1 and None not in item_classes:
+            array = CompactArrayExpression(item_classes.pop(), tuple(items))
+        else:
+            nodes = []
+            for literal in literals:
+                if isinstance(literal, ArrayExpression):
+                    nodes.extend(literal.value)
+                else:
+                    nodes.append(literal)
+            array = ArrayExpression(nodes)
+        array.prepared = LiteralArray(values)
+        return array
+
+    def _condition(self, expr):
+        """Returns `(key, op, literal)` of comparison of key with scalar literal or None"""
+        op = _COMPARISON_OPS.get(type(expr))
+        if op is not None:
+            for key, other, key_op in ((expr.left, expr.right, op),
+                                       (expr.right, expr.left, REFLECTED_OPS[op])):
+                value = literal_value(other)
+                if isinstance(key, KeyExpression) and type(value) in HASHABLE_TYPES:
+                    return key, key_op, value
+        elif isinstance(expr, InExpression) and isinstance(expr.left, KeyExpression):
+            values = literal_value(expr.right)
+            if _is_hashable_array(values):
+                if not isinstance(values, LiteralArray):
+                    values = LiteralArray(values)
+                return expr.left, is_member, values
+        return None
+
+    def _group_conditions(self, operands):
+        """Groups comparisons of the same key with literals at place of the first of them"""
+        grouped = []
+        groups = {}
+        for operand in operands:
+            condition = self._condition(operand)
+            if condition is None:
+                grouped.append(operand)
+                continue
+            key = condition[0].keys
+            index = groups.get(key)
+            if self.raise_keyerror and index != len(grouped) - 1:
+                index = None
+            if index is None:
+                groups[key] = len(grouped)
+                grouped.append([operand])
+            else:
+                grouped[index].append(operand)
+        for index, members in enumerate(grouped):
+            if not isinstance(members, list):
+                continue
+            if len(members) == 1:
+                grouped[index] = members[0]
+                continue
+            group = KeyConditionsExpression(self._build(AndExpression, members[:-1]), members[-1])
+            conditions = [self._condition(member) for member in members]
+            group.key = conditions[0][0]
+            group.conditions = tuple((op, literal) for _, op, literal in conditions)
+            group.satisfiable = satisfiable(group.conditions)
+            grouped[index] = group
+        return grouped
+
+
+def rewrite(ast, use_nested_keys=True, key_separator='.',
+            case_sensitive=True, raise_keyerror=False):
+    """Returns copy of prepared `ast` without redundant conditions, see `RewriteVisitor`"""
+    return RewriteVisitor(
+        use_nested_keys=use_nested_keys, key_separator=key_separator,
+        case_sensitive=case_sensitive, raise_keyerror=raise_keyerror).rewrite(ast)
@@ -0,0 +1,61 @@
+"""Filtering of large iterables in worker processes"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# query of worker process, set once by `_init_worker`
+_worker_query = None
+
+
+def _init_worker(compiled):
+    global _worker_query
+    _worker_query = compiled
+
+
+def _match_chunk(chunk):
+    """Returns indices of items of `chunk` which satisfy query of worker"""
+    evaluate = _worker_query.evaluate
+    return [index for index, item in enumerate(chunk) if evaluate(item)]
+
+
+def _chunks(data, chunksize):
+    iterator = iter(data)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_filter(compiled, data, workers, chunksize=1000, max_pending=None):
+    """Yields items of iterable `data` which satisfy `compiled` query in input order.
+
+    `compiled` query (or any picklable object with `evaluate(item)` method) is
+    pickled once per worker process, items are sent to workers
+    in chunks of `chunksize`, only indices of matched items are sent back.
+    At most `max_pending` chunks (default `2 * workers`) are in flight, so `data`
+    is consumed as fast as workers evaluate it.
+    """
+    if chunksize < 1:
+        raise ValueError('chunksize must be positive')
+    if max_pending is None:
+        max_pending = 2 * workers
+    max_pending = max(max_pending, 1)
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(compiled,))
+    pending = deque()
+    try:
+        for chunk in _chunks(data, chunksize):
+            pending.append((chunk, executor.submit(_match_chunk, chunk)))
+            if len(pending) >= max_pending:
+                chunk, future = pending.popleft()
+                for index in future.result():
+                    yield chunk[index]
+        while pending:
+            chunk, future = pending.popleft()
+            for index in future.result():
+                yield chunk[index]
+    finally:
+        for chunk, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -25,11 +25,23 @@ BINARY_OPS = ('IN', 'NOTEQUAL', 'LTE', 'GTE', 'LT', 'GT',
               'EQUAL', 'MATCH', 'LIKE', 'CONTAINS')
 VALUES = ('BOOLEAN', 'NUMBER', 'NONE', 'NOW', 'STRING', 'REGEXP')
 
+# marks literal which value wasn't converted by `dictquery.optimizer.PrepareVisitor`
+UNPREPARED = object()
+
+
+# Expressions are pickled as class and constructor arguments only, values set by
+# `dictquery.optimizer.PrepareVisitor` aren't pickled and are computed again.
+
 
 class LiteralExpression:
+    prepared = UNPREPARED
+
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return self.__class__, (self.value,)
+
     def accept(self, visitor):
         return visitor.visit_literal(self)
 
@@ -38,6 +50,9 @@ class UnaryExpression:
     def __init__(self, value):
         self.value = value
 
+    def __reduce__(self):
+        return self.__class__, (self.value,)
+
     def accept(self, visitor):
         return visitor.visit_unary(self)
 
@@ -47,6 +62,9 @@ class BinaryExpression:
         self.left = left
         self.right = right
 
+    def __reduce__(self):
+        return self.__class__, (self.left, self.right)
+
     def accept(self, visitor):
         return visitor.visit_binary(self)
 
@@ -77,6 +95,9 @@ class StringExpression(LiteralExpression):
 
 
 class KeyExpression(LiteralExpression):
+    # tuple of nested keys, set by `dictquery.optimizer.PrepareVisitor`
+    keys = None
+
     def accept(self, visitor):
         return visitor.visit_key(self)
 
@@ -91,6 +112,23 @@ class ArrayExpression(LiteralExpression):
         return visitor.visit_array(self)
 
 
+class CompactArrayExpression(ArrayExpression):
+    """Array of literals of the same `item_class` kept as tuple of raw token values.
+
+    Huge arrays don't allocate expression per item, `value` builds them on access
+    """
+    def __init__(self, item_class, items):
+        self.item_class = item_class
+        self.items = items
+
+    def __reduce__(self):
+        return self.__class__, (self.item_class, self.items)
+
+    @property
+    def value(self):
+        return [self.item_class(item) for item in self.items]
+
+
 class InExpression(BinaryExpression):
     def accept(self, visitor):
         return visitor.visit_in(self)
@@ -112,6 +150,9 @@ class MatchExpression(BinaryExpression):
 
 
 class LikeExpression(BinaryExpression):
+    # pattern compiled by `dictquery.optimizer.PrepareVisitor`
+    regexp = None
+
     def accept(self, visitor):
         return visitor.visit_like(self)
 
@@ -146,6 +187,19 @@ class AndExpression(BinaryExpression):
         return visitor.visit_and(self)
 
 
+class KeyConditionsExpression(AndExpression):
+    """`AND` chain of comparisons of one key with literals, built by
+    `dictquery.optimizer.RewriteVisitor` to look key up once.
+
+    `conditions` are `(op, literal)` pairs checked as `op(value, literal)`,
+    `satisfiable` is False if no single value satisfies all of them.
+    Visitors which don't know it evaluate it as `AND` chain.
+    """
+    key = None
+    conditions = ()
+    satisfiable = True
+
+
 class OrExpression(BinaryExpression):
     def accept(self, visitor):
         return visitor.visit_or(self)
@@ -226,7 +280,7 @@ class DataQueryParser:
             rightval = self.andstatement()
             leftval = op(leftval, rightval)
         if self.nexttok is not None and self.nexttok.type != 'RPAR':
-            raise DQSyntaxError("Expected AND or OR instead of %s" % self.nexttok.value)
+            raise DQSyntaxError("Expected AND or OR instead of %s" % (self.nexttok.value,))
         return leftval
 
     def andstatement(self):
@@ -293,6 +347,10 @@ class DataQueryParser:
         if self._accept(VALUES):
             return token_to_class[self.tok.type](self.tok.value)
 
+        if self._accept('ARRAY'):
+            item_type, items = self.tok.value
+            return CompactArrayExpression(token_to_class[item_type], items)
+
         if self._accept('LBRACKET'):
             return self.array()
         raise DQSyntaxError("Can't parse expr")
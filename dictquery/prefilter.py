@@ -0,0 +1,162 @@
+"""Prefilter of raw JSON lines.
+
+`PrefilterVisitor` extracts substrings which must be in raw JSON text of any
+record satisfying query, e.g. `status == "failed"` can't be True if line has
+no `"status"` and `"failed"`. Lines without them are rejected before parsing.
+Condition is a list of clauses, clause is a set of needles, line satisfies
+clause if it has any of its needles.
+"""
+import json
+
+from dictquery.analysis import like_fragments, _or_clauses
+from dictquery.datavalue import LiteralArray, basestring
+from dictquery.parsers import (
+    KeyExpression, StringExpression, ArrayExpression, UNPREPARED)
+
+# clauses with more needles are dropped, checking them is too slow
+MAX_NEEDLES = 32
+
+
+def _json_needle(value, quoted=True):
+    text = json.dumps(value, ensure_ascii=False)
+    if not quoted:
+        text = text[1:-1]
+    return text.encode('utf-8')
+
+
+def _and(*conditions):
+    result = []
+    for condition in conditions:
+        for clause in condition:
+            if clause not in result:
+                result.append(clause)
+    return result
+
+
+def _clause(needles):
+    needles = frozenset(needles)
+    if not needles or b'' in needles or len(needles) > MAX_NEEDLES:
+        # empty needle is in any line
+        return []
+    return [needles]
+
+
+class PrefilterVisitor:
+    """Returns necessary condition of prepared `ast` being True as list of clauses.
+
+    Only facts which hold for every JSON text are used: keys of found values
+    are quoted strings in line, strings compared with `==` / `IN` are quoted
+    strings, `CONTAINS` / `LIKE` substrings are in string or in array of strings.
+    Values aren't used if case insensitive. `NOT` gives no condition. Line with
+    backslash may have any text escaped, so it isn't checked at all.
+    """
+    def __init__(self, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+
+    def condition(self, ast):
+        if ast is None:
+            return []
+        return ast.accept(self)
+
+    def _keys(self, expr):
+        if not isinstance(expr, KeyExpression):
+            return []
+        return _and(*[_clause([_json_needle(key)]) for key in expr.keys])
+
+    def _value(self, expr):
+        if isinstance(expr, KeyExpression) or expr.prepared is UNPREPARED:
+            return None
+        return expr.prepared
+
+    def _strings(self, values, quoted=True):
+        """Clause of any of string `values`, no clauses if some value isn't a string"""
+        if not self.case_sensitive:
+            return []
+        if not all(isinstance(value, basestring) for value in values):
+            return []
+        return _clause([_json_needle(value, quoted) for value in values])
+
+    def _operands(self, expr):
+        return _and(self._keys(expr.left), self._keys(expr.right))
+
+    def visit_equal(self, expr):
+        condition = self._operands(expr)
+        for key, other in ((expr.left, expr.right), (expr.right, expr.left)):
+            if isinstance(key, KeyExpression) and isinstance(other, StringExpression):
+                condition = _and(condition, self._strings([self._value(other)]))
+        return condition
+
+    visit_notequal = visit_lt = visit_lte = visit_gt = visit_gte = _operands
+    visit_match = _operands
+
+    def _contains(self, container, item):
+        condition = _and(self._keys(container), self._keys(item))
+        if isinstance(item, KeyExpression) and isinstance(container, ArrayExpression):
+            values = self._value(container)
+            if isinstance(values, LiteralArray):
+                condition = _and(condition, self._strings(values))
+        elif isinstance(container, KeyExpression) and isinstance(item, StringExpression):
+            # substring of string, item of array or key of object
+            condition = _and(condition, self._strings([self._value(item)], quoted=False))
+        return condition
+
+    def visit_contains(self, expr):
+        return self._contains(expr.left, expr.right)
+
+    def visit_in(self, expr):
+        return self._contains(expr.right, expr.left)
+
+    def visit_like(self, expr):
+        condition = self._keys(expr.left)
+        if isinstance(expr.left, KeyExpression) and isinstance(expr.right, StringExpression):
+            for part in like_fragments(expr.right.value):
+                condition = _and(condition, self._strings([part], quoted=False))
+        return condition
+
+    def visit_key(self, expr):
+        return self._keys(expr)
+
+    def _no_condition(self, expr):
+        return []
+
+    visit_number = visit_boolean = visit_string = visit_none = _no_condition
+    visit_regexp = visit_array = visit_now = visit_not = _no_condition
+
+    def visit_and(self, expr):
+        return _and(expr.left.accept(self), expr.right.accept(self))
+
+    def visit_or(self, expr):
+        return _or_clauses(expr.left.accept(self), expr.right.accept(self), MAX_NEEDLES) or []
+
+
+class Prefilter:
+    """Checks if raw JSON line (bytes) may satisfy query"""
+    def __init__(self, clauses):
+        # longer needles are usually rarer and reject line earlier
+        self.clauses = sorted(
+            (tuple(sorted(clause, key=len, reverse=True)) for clause in clauses),
+            key=lambda clause: -min(len(needle) for needle in clause))
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        """Returns prefilter of `CompiledQuery` or None if there are no conditions.
+
+        Missing keys raise `DQKeyError` with `raise_keyerror`, lines aren't skipped
+        """
+        if compiled.raise_keyerror:
+            return None
+        clauses = PrefilterVisitor(compiled.case_sensitive).condition(compiled.prepared_ast)
+        if not clauses:
+            return None
+        return cls(clauses)
+
+    def check(self, line):
+        if b'\\' in line:
+            return True
+        for clause in self.clauses:
+            for needle in clause:
+                if needle in line:
+                    break
+            else:
+                return False
+        return True
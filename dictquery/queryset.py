@@ -0,0 +1,290 @@
+"""Matching of one record against many queries"""
+from bisect import bisect_left, bisect_right
+import operator
+
+from dictquery.analysis import predicates, contains_text
+from dictquery.compiler import compile_query
+from dictquery.datavalue import (
+    iter_values, basestring, STRING_TYPES, NUMBER_TYPES, CONTAINER_TYPES)
+from dictquery.keywords import KeywordMatcher
+
+# relative cost of predicates used to select indexed clause, `==` costs 1
+RANGE_COST = 16
+TEXT_COST = 2
+
+_SCALAR_TYPES = STRING_TYPES | NUMBER_TYPES | frozenset([type(None)])
+
+
+def _discard(mapping, key, query_id):
+    ids = mapping[key]
+    ids.discard(query_id)
+    if not ids:
+        del mapping[key]
+
+
+class _KeyIndex:
+    """Predicates on values of one key path: hash table of `==` literals, sorted
+    lists of range literals, separately for numbers and strings, and keywords of
+    `CONTAINS` / `LIKE` / `MATCH` searched in strings at once by `KeywordMatcher`"""
+    def __init__(self, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self.equal = {}
+        # (op, is_string) -> [sorted literals, query ids]
+        self.ranges = {}
+        # keyword -> query ids, substrings of strings
+        self.keywords = {}
+        # keyword -> query ids of `CONTAINS`, items of arrays and keys of objects
+        self.members = {}
+        self._matcher = None
+        # query id -> number of predicates
+        self.queries = {}
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(self.keywords)
+        return self._matcher
+
+    def cost(self, predicate):
+        """Estimated number of queries evaluated when `predicate` is True"""
+        if predicate.op is operator.eq:
+            return 1 + len(self.equal.get(predicate.value, ()))
+        if predicate.op is operator.contains or predicate.op is contains_text:
+            return TEXT_COST + len(self.keywords.get(predicate.value, ()))
+        range_key = (predicate.op, isinstance(predicate.value, basestring))
+        # about a half of range predicates are True
+        return RANGE_COST + len(self.ranges.get(range_key, ((), ()))[0]) // 2
+
+    def add(self, predicate, query_id):
+        if predicate.op is operator.eq:
+            self.equal.setdefault(predicate.value, set()).add(query_id)
+        elif predicate.op is operator.contains or predicate.op is contains_text:
+            if predicate.value not in self.keywords:
+                self._matcher = None
+            self.keywords.setdefault(predicate.value, set()).add(query_id)
+            if predicate.op is operator.contains:
+                self.members.setdefault(predicate.value, set()).add(query_id)
+        else:
+            range_key = (predicate.op, isinstance(predicate.value, basestring))
+            literals, ids = self.ranges.setdefault(range_key, ([], []))
+            index = bisect_right(literals, predicate.value)
+            literals.insert(index, predicate.value)
+            ids.insert(index, query_id)
+        self.queries[query_id] = self.queries.get(query_id, 0) + 1
+
+    def remove(self, predicate, query_id):
+        if predicate.op is operator.eq:
+            _discard(self.equal, predicate.value, query_id)
+        elif predicate.op is operator.contains or predicate.op is contains_text:
+            # query may have both predicates with the same keyword
+            if query_id in self.keywords.get(predicate.value, ()):
+                _discard(self.keywords, predicate.value, query_id)
+                if predicate.value not in self.keywords:
+                    self._matcher = None
+            if query_id in self.members.get(predicate.value, ()):
+                _discard(self.members, predicate.value, query_id)
+        else:
+            range_key = (predicate.op, isinstance(predicate.value, basestring))
+            literals, ids = self.ranges[range_key]
+            index = bisect_left(literals, predicate.value)
+            while ids[index] != query_id:
+                index += 1
+            del literals[index]
+            del ids[index]
+            if not literals:
+                del self.ranges[range_key]
+        self.queries[query_id] -= 1
+        if not self.queries[query_id]:
+            del self.queries[query_id]
+
+    def lookup(self, values, hits):
+        """Adds ids of queries with True predicates to `hits`.
+
+        Returns False if some value has type which can't be checked by index
+        """
+        for value in values:
+            value_type = type(value)
+            if value_type in STRING_TYPES:
+                if not self.case_sensitive:
+                    value = value.lower()
+                is_string = True
+            elif value_type in NUMBER_TYPES:
+                if value != value:
+                    # nan isn't equal to anything and not ordered
+                    continue
+                is_string = False
+            elif value is None:
+                ids = self.equal.get(None)
+                if ids:
+                    hits.update(ids)
+                continue
+            elif value_type in CONTAINER_TYPES:
+                if self.members and not self._lookup_members(value, hits):
+                    return False
+                continue
+            else:
+                return False
+
+            ids = self.equal.get(value)
+            if ids:
+                hits.update(ids)
+            for (op, range_is_string), (literals, ids) in self.ranges.items():
+                if range_is_string is not is_string:
+                    continue
+                if op is operator.gt:
+                    hits.update(ids[:bisect_left(literals, value)])
+                elif op is operator.ge:
+                    hits.update(ids[:bisect_right(literals, value)])
+                elif op is operator.lt:
+                    hits.update(ids[bisect_right(literals, value):])
+                else:
+                    hits.update(ids[bisect_left(literals, value):])
+            if is_string and self.keywords:
+                for keyword in self.matcher.find(value):
+                    hits.update(self.keywords[keyword])
+        return True
+
+    def _lookup_members(self, value, hits):
+        """`CONTAINS` of array items or object keys, items aren't lowered"""
+        members = self.members
+        if isinstance(value, dict) and len(value) > len(members):
+            for keyword, ids in members.items():
+                if keyword in value:
+                    hits.update(ids)
+            return True
+        for item in value:
+            if isinstance(item, basestring):
+                ids = members.get(item)
+                if ids:
+                    hits.update(ids)
+            elif type(item) not in _SCALAR_TYPES and type(item) not in CONTAINER_TYPES:
+                return False
+        return True
+
+
+class QuerySet:
+    """Many queries matched against one record at once.
+
+    Every query is analyzed to necessary condition (see `dictquery.analysis.PredicateVisitor`),
+    predicates of its cheapest clause are indexed: `==` / `IN` literals in hash tables,
+    ranges in sorted lists. Clause cost is estimated by number of indexed queries which
+    share its predicates, so literals common to many queries are avoided. Record is looked up once per indexed key path and only queries
+    with True predicates are evaluated, queries which are equivalent to the indexed clause
+    match without evaluation. Queries without conditions are evaluated for every record.
+
+    Queries which aren't evaluated don't raise errors they would raise on evaluation,
+    e.g. on comparison of string with number.
+    """
+    def __init__(self, use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, backend='closure'):
+        self.use_nested_keys = use_nested_keys
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.backend = backend
+        self._queries = {}
+        self._order = {}
+        self._counter = 0
+        # query id -> indexed clause
+        self._clauses = {}
+        # ids of queries which match if indexed clause is True
+        self._exact = set()
+        # ids of queries evaluated for every record
+        self._unindexed = set()
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._queries)
+
+    def __contains__(self, query_id):
+        return query_id in self._queries
+
+    def __getitem__(self, query_id):
+        return self._queries[query_id]
+
+    def _compile(self, query):
+        return compile_query(
+            query, use_nested_keys=self.use_nested_keys, key_separator=self.key_separator,
+            case_sensitive=self.case_sensitive, backend=self.backend)
+
+    def _clause_cost(self, clause):
+        cost = 0
+        for predicate in clause:
+            index = self._indexes.get(predicate.keys)
+            if index is not None:
+                cost += index.cost(predicate)
+            else:
+                cost += 1 if predicate.op is operator.eq else RANGE_COST
+        return cost
+
+    def add(self, query_id, query):
+        """Adds query string or `CompiledQuery`, replaces query with the same id"""
+        if query_id in self._queries:
+            self.remove(query_id)
+        compiled = self._compile(query)
+        self._queries[query_id] = compiled
+        self._order[query_id] = self._counter
+        self._counter += 1
+
+        clauses, exact = predicates(compiled.prepared_ast)
+        if compiled.raise_keyerror or compiled.case_sensitive != self.case_sensitive:
+            # index would skip errors or compare strings differently
+            clauses = []
+        if not clauses:
+            self._unindexed.add(query_id)
+            return
+        clause = min(clauses, key=self._clause_cost)
+        self._clauses[query_id] = clause
+        if exact and len(clauses) == 1:
+            self._exact.add(query_id)
+        # query with empty clause never matches and isn't indexed
+        for predicate in clause:
+            index = self._indexes.get(predicate.keys)
+            if index is None:
+                index = self._indexes[predicate.keys] = _KeyIndex(self.case_sensitive)
+            index.add(predicate, query_id)
+
+    def remove(self, query_id):
+        """Removes query, raises KeyError if there is no such query"""
+        del self._queries[query_id]
+        del self._order[query_id]
+        self._unindexed.discard(query_id)
+        self._exact.discard(query_id)
+        for predicate in self._clauses.pop(query_id, ()):
+            index = self._indexes[predicate.keys]
+            index.remove(predicate, query_id)
+            if not index:
+                del self._indexes[predicate.keys]
+
+    def match(self, data):
+        """Returns list of ids of queries which `data` satisfies, in order of adding"""
+        hits = set()
+        maybe = set(self._unindexed)
+        for keys, index in self._indexes.items():
+            if not index.lookup(iter_values(data, keys), hits):
+                maybe.update(index.queries)
+
+        exact = self._exact
+        queries = self._queries
+        result = [
+            query_id for query_id in hits
+            if query_id in exact or queries[query_id].evaluate(data)]
+        result.extend(
+            query_id for query_id in maybe - hits if queries[query_id].evaluate(data))
+        result.sort(key=self._order.__getitem__)
+        return result
+
+
+def compile_many(queries, use_nested_keys=True, key_separator='.',
+                 case_sensitive=True, backend='closure'):
+    """Returns `QuerySet` of `queries`: dict of id to query or iterable of queries,
+    ids are positions then"""
+    query_set = QuerySet(
+        use_nested_keys=use_nested_keys, key_separator=key_separator,
+        case_sensitive=case_sensitive, backend=backend)
+    items = queries.items() if hasattr(queries, 'items') else enumerate(queries)
+    for query_id, query in items:
+        query_set.add(query_id, query)
+    return query_set
@@ -41,8 +41,49 @@ tok_regex = re.compile(
     '|'.join('(?P<%s>%s)' % pair for pair in token_specification),
     re.IGNORECASE)
 
+# arrays of numbers or of strings without escapes, e.g. `[1, 2, 3]`, `["a", 'b']`.
+# Such array is emitted as one `ARRAY` token with value `(item type, tuple of items)`
+# instead of token per item, huge arrays are tokenized without python loop.
+_number_pattern = dict(token_specification)['NUMBER']
+_string_pattern = r'"[^"\\]*"|\'[^\'\\]*\''
+_array_item_patterns = (
+    ('NUMBER', _number_pattern),
+    ('STRING', _string_pattern),
+)
+compact_array_regexes = [
+    (item_type,
+     re.compile(r'\[[\n\s\t ]*((?:{0})(?:[\n\s\t ]*,[\n\s\t ]*(?:{0}))*)[\n\s\t ]*\]'.format(
+         item_pattern)),
+     re.compile(item_pattern))
+    for item_type, item_pattern in _array_item_patterns
+]
+
+
+def _compact_array(text, pos):
+    """Returns `(ARRAY token, end position)` for homogeneous array at `pos` or None"""
+    for item_type, array_regex, item_regex in compact_array_regexes:
+        match = array_regex.match(text, pos)
+        if match is None:
+            continue
+        items = item_regex.findall(match.group(1))
+        if item_type == 'STRING':
+            items = [item[1:-1] for item in items]
+        return Token('ARRAY', (item_type, tuple(items))), match.end()
+    return None
+
+
 def gen_tokens(text, skip_ws=True):
-    for match in tok_regex.finditer(text):
+    pos = 0
+    end = len(text)
+    while pos < end:
+        if text[pos] == '[':
+            compact = _compact_array(text, pos)
+            if compact is not None:
+                token, pos = compact
+                yield token
+                continue
+        match = tok_regex.match(text, pos)
+        pos = match.end()
         tok_type = match.lastgroup
         if tok_type == 'MISMATCH':
             raise DQSyntaxError("Unexpected character at pos %d" % match.start())
@@ -0,0 +1,432 @@
+"""Vectorized evaluation of queries over batches of records with numpy.
+
+Values of every key referenced by query are pulled into a `Column` once per
+batch, comparisons, IN and AND / OR / NOT run as numpy array operations.
+Values which can't be compared the same way as `DataQueryVisitor` does (nested
+arrays, objects, dates, big ints, operations which raise `TypeError` in python)
+are evaluated by scalar function for their records only.
+"""
+from itertools import repeat
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from dictquery.analysis import REFLECTED_OPS
+from dictquery.exceptions import DQException
+from dictquery.datavalue import LiteralArray, values_getter, basestring
+from dictquery.parsers import KeyExpression, ArrayExpression, UNPREPARED
+
+
+# kinds of column values
+MISSING, NUMBER, STRING, NONE, OTHER, INTEGER = range(6)
+# python ints out of this range aren't converted to float64 exactly
+MAX_EXACT_INT = 2 ** 53
+
+
+class _Missing(object):
+    """Record has no value of key"""
+
+
+class _Other(object):
+    """Record needs generic lookup of key"""
+
+
+_MISSING = _Missing()
+_OTHER = _Other()
+
+VALUE_KINDS = {
+    float: NUMBER,
+    bool: NUMBER,
+    int: INTEGER,
+    str: STRING,
+    type(None): NONE,
+    _Missing: MISSING,
+}
+
+
+def require_numpy():
+    if np is None:
+        raise DQException('numpy is required for vectorized evaluation')
+
+
+class Column:
+    """Values of one key for every record of batch.
+
+    `kinds` is array of value kinds, `numbers` has float values of NUMBER rows,
+    `strings` is object or numpy unicode array with values of STRING rows
+    (lowered if case insensitive) and empty strings in other rows
+    """
+    def __init__(self, kinds, numbers, strings):
+        self.kinds = kinds
+        self.numbers = numbers
+        self.strings = strings
+        self.is_missing = kinds == MISSING
+        self.is_number = kinds == NUMBER
+        self.is_string = kinds == STRING
+        self.is_none = kinds == NONE
+        self.is_other = kinds == OTHER
+        self.present = ~self.is_missing
+
+    @classmethod
+    def from_values(cls, values, case_sensitive=True):
+        """Builds column from list of values, `_MISSING` marks records without
+        key and `_OTHER` - records which values can't be vectorized"""
+        size = len(values)
+        kinds = np.fromiter(
+            map(VALUE_KINDS.get, map(type, values), repeat(OTHER, size)),
+            dtype=np.int8, count=size)
+        objects = np.fromiter(values, dtype=object, count=size)
+
+        numbers = np.zeros(size, dtype=np.float64)
+        is_integer = kinds == INTEGER
+        is_number = (kinds == NUMBER) | is_integer
+        try:
+            numbers[is_number] = objects[is_number].astype(np.float64)
+            inexact = np.abs(numbers) >= MAX_EXACT_INT
+        except OverflowError:
+            inexact = np.zeros(size, dtype=bool)
+            inexact[is_integer] = [abs(value) >= MAX_EXACT_INT for value in objects[is_integer]]
+            is_number &= ~inexact
+            numbers[is_number] = objects[is_number].astype(np.float64)
+        # ints which can't be compared as floats are checked by scalar function
+        kinds[is_integer & inexact] = OTHER
+        kinds[kinds == INTEGER] = NUMBER
+
+        strings = np.full(size, '', dtype=object)
+        is_string = kinds == STRING
+        if case_sensitive:
+            strings[is_string] = objects[is_string]
+        else:
+            strings[is_string] = [value.lower() for value in objects[is_string]]
+        return cls(kinds, numbers, strings)
+
+
+    @classmethod
+    def from_array(cls, array, case_sensitive=True):
+        """Builds column from numpy array, numbers and strings aren't converted
+        to python objects one by one"""
+        kind = array.dtype.kind
+        size = len(array)
+        if kind in 'biuf':
+            kinds = np.full(size, NUMBER, dtype=np.int8)
+            numbers = array.astype(np.float64)
+            if kind in 'iu' and array.dtype.itemsize >= 8:
+                kinds[np.abs(numbers) >= MAX_EXACT_INT] = OTHER
+            return cls(kinds, numbers, np.full(size, '', dtype=object))
+        if kind == 'U':
+            if not case_sensitive:
+                array = np.char.lower(array)
+            # numpy unicode array is compared without python objects
+            return cls(np.full(size, STRING, dtype=np.int8),
+                       np.zeros(size, dtype=np.float64), array)
+        return cls.from_values(array.tolist(), case_sensitive)
+
+
+def record_value(record, keys):
+    """Returns value of nested `keys` found through plain dicts,
+    `_MISSING` if there is no value or `_OTHER` if record needs generic lookup"""
+    if type(record) is not dict:
+        return _OTHER
+    value = record
+    for key in keys:
+        if type(value) is dict:
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+            continue
+        if type(value) is str or values_getter(value) is None:
+            # scalars and strings have no keys
+            return _MISSING
+        return _OTHER
+    return value
+
+
+class RecordBatch:
+    """Columns of keys pulled from list of records, each column is built once"""
+    def __init__(self, records, case_sensitive=True):
+        self.records = records
+        self.size = len(records)
+        self.case_sensitive = case_sensitive
+        self.columns = {}
+        self.plain = set(map(type, records)) <= set([dict])
+
+    def values(self, keys):
+        if self.plain and len(keys) == 1:
+            # `dict.get` is called without python loop
+            return list(map(dict.get, self.records, repeat(keys[0], self.size),
+                            repeat(_MISSING, self.size)))
+        return [record_value(record, keys) for record in self.records]
+
+    def column(self, keys):
+        column = self.columns.get(keys)
+        if column is None:
+            column = Column.from_values(self.values(keys), self.case_sensitive)
+            self.columns[keys] = column
+        return column
+
+
+class ColumnBatch:
+    """Batch of columns: dict of equal length lists or numpy arrays, or numpy
+    structured array. Key path joined with `key_separator` is column name
+    """
+    def __init__(self, columns, key_separator='.', case_sensitive=True):
+        if np is not None and isinstance(columns, np.ndarray):
+            if columns.dtype.names is None:
+                raise DQException('columns must be dict or numpy structured array')
+            columns = dict((name, columns[name]) for name in columns.dtype.names)
+        sizes = set(len(values) for values in columns.values())
+        if len(sizes) > 1:
+            raise DQException('columns must have the same length')
+        self.data = columns
+        self.size = sizes.pop() if sizes else 0
+        self.key_separator = key_separator
+        self.case_sensitive = case_sensitive
+        self.columns = {}
+        self._lists = {}
+
+    def column(self, keys):
+        column = self.columns.get(keys)
+        if column is None:
+            values = self.data.get(self.key_separator.join(keys))
+            if values is None:
+                column = Column.from_values([_MISSING] * self.size)
+            elif isinstance(values, np.ndarray):
+                column = Column.from_array(values, self.case_sensitive)
+            else:
+                column = Column.from_values(list(values), self.case_sensitive)
+            self.columns[keys] = column
+        return column
+
+    def _list(self, name):
+        values = self._lists.get(name)
+        if values is None:
+            values = self.data[name]
+            values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+            self._lists[name] = values
+        return values
+
+    def row(self, index):
+        """Returns flat dict of python values of all columns for row `index`"""
+        return dict((name, self._list(name)[index]) for name in self.data)
+
+    def rows(self):
+        return ColumnRows(self)
+
+
+class ColumnRows:
+    """Lazy sequence of rows of `ColumnBatch`, rows are built on access"""
+    def __init__(self, batch):
+        self.batch = batch
+
+    def __len__(self):
+        return self.batch.size
+
+    def __getitem__(self, index):
+        return self.batch.row(index)
+
+    def __iter__(self):
+        for index in range(self.batch.size):
+            yield self.batch.row(index)
+
+
+class Unsupported(Exception):
+    """Expression can't be vectorized, whole batch is evaluated by scalar function"""
+
+
+class VectorCompiler:
+    """Compiles prepared `ast` to function `f(batch)` which returns
+    `(result, fallback)` boolean arrays. `result` is valid for rows where
+    `fallback` is False, other rows must be evaluated by scalar function
+    """
+    def __init__(self, raise_keyerror=False):
+        self.raise_keyerror = raise_keyerror
+
+    def compile(self, ast):
+        """Returns vectorized function or None if `ast` can't be vectorized"""
+        if ast is None:
+            return None
+        try:
+            return ast.accept(self)
+        except Unsupported:
+            return None
+
+    def _unsupported(self, expr):
+        raise Unsupported(type(expr).__name__)
+
+    # literals are vectorized only as operands of comparisons
+    visit_match = visit_like = visit_now = _unsupported
+    visit_number = visit_boolean = visit_string = visit_none = _unsupported
+    visit_regexp = visit_array = _unsupported
+
+    def _literal(self, expr):
+        if isinstance(expr, KeyExpression) or expr.prepared is UNPREPARED:
+            raise Unsupported(type(expr).__name__)
+        return expr.prepared
+
+    def _fallback(self, column):
+        if self.raise_keyerror:
+            return column.is_other | column.is_missing
+        return column.is_other.copy()
+
+    def _compile_binary(self, op, expr):
+        if isinstance(expr.left, KeyExpression):
+            return self._compare(expr.left.keys, op, self._literal(expr.right))
+        if isinstance(expr.right, KeyExpression):
+            return self._compare(expr.right.keys, REFLECTED_OPS[op], self._literal(expr.left))
+        raise Unsupported(type(expr).__name__)
+
+    def _compare(self, keys, op, value):
+        if isinstance(value, (list, LiteralArray)):
+            raise Unsupported('array comparison')
+        is_number = type(value) in (float, bool)
+        if not is_number and not isinstance(value, basestring) and value is not None:
+            raise Unsupported(type(value).__name__)
+        eq = op is operator.eq or op is operator.ne
+
+        def compare(batch):
+            column = batch.column(keys)
+            fallback = self._fallback(column)
+            if value is None:
+                result = column.is_none.copy()
+                if not eq:
+                    # None can't be ordered
+                    fallback |= column.present
+            elif is_number:
+                result = column.is_number & (
+                    column.numbers == float(value) if eq else op(column.numbers, float(value)))
+                if not eq:
+                    fallback |= column.is_string | column.is_none
+            else:
+                result = column.is_string & (
+                    column.strings == value if eq else op(column.strings, value))
+                if not eq:
+                    fallback |= column.is_number | column.is_none
+            if op is operator.ne:
+                result = column.present & ~result
+            return result, fallback
+        return compare
+
+    def visit_lt(self, expr):
+        return self._compile_binary(operator.lt, expr)
+
+    def visit_lte(self, expr):
+        return self._compile_binary(operator.le, expr)
+
+    def visit_gt(self, expr):
+        return self._compile_binary(operator.gt, expr)
+
+    def visit_gte(self, expr):
+        return self._compile_binary(operator.ge, expr)
+
+    def visit_equal(self, expr):
+        return self._compile_binary(operator.eq, expr)
+
+    def visit_notequal(self, expr):
+        return self._compile_binary(operator.ne, expr)
+
+    def _compile_contains(self, container_expr, item_expr):
+        if not isinstance(item_expr, KeyExpression) or \
+                not isinstance(container_expr, ArrayExpression):
+            raise Unsupported('contains')
+        items = self._literal(container_expr)
+        if not isinstance(items, LiteralArray):
+            raise Unsupported('array of not hashable values')
+        keys = item_expr.keys
+        numbers = np.array(
+            [float(item) for item in items if type(item) in (float, bool)], dtype=np.float64)
+        strings = [item for item in items if type(item) is str]
+        contains_none = None in items.members
+
+        def contains(batch):
+            column = batch.column(keys)
+            result = column.is_number & np.isin(column.numbers, numbers)
+            if column.strings.dtype.kind == 'U':
+                result |= column.is_string & np.isin(column.strings, strings)
+            else:
+                result |= column.is_string & np.fromiter(
+                    map(items.members.__contains__, column.strings),
+                    dtype=bool, count=len(column.strings))
+            if contains_none:
+                result |= column.is_none
+            return result, self._fallback(column)
+        return contains
+
+    def visit_contains(self, expr):
+        return self._compile_contains(expr.left, expr.right)
+
+    def visit_in(self, expr):
+        return self._compile_contains(expr.right, expr.left)
+
+    def visit_key(self, expr):
+        keys = expr.keys
+
+        def truth(batch):
+            column = batch.column(keys)
+            result = column.is_number & (column.numbers != 0)
+            result |= column.is_string & (column.strings != '')
+            return result, self._fallback(column)
+        return truth
+
+    def visit_not(self, expr):
+        value = expr.value.accept(self)
+
+        def not_(batch):
+            result, fallback = value(batch)
+            return ~result, fallback
+        return not_
+
+    def visit_and(self, expr):
+        left, right = expr.left.accept(self), expr.right.accept(self)
+
+        def and_(batch):
+            left_result, left_fallback = left(batch)
+            right_result, right_fallback = right(batch)
+            # right operand isn't evaluated by scalar function if left is False
+            fallback = left_fallback | (left_result & right_fallback)
+            return left_result & right_result, fallback
+        return and_
+
+    def visit_or(self, expr):
+        left, right = expr.left.accept(self), expr.right.accept(self)
+
+        def or_(batch):
+            left_result, left_fallback = left(batch)
+            right_result, right_fallback = right(batch)
+            fallback = left_fallback | (~left_result & right_fallback)
+            return left_result | right_result, fallback
+        return or_
+
+
+def evaluate_batch(vectorized, evaluate, batch, items):
+    """Returns boolean mask of `items` for `batch`, rows which can't be
+    vectorized are checked by scalar `evaluate`"""
+    if vectorized is None:
+        return np.fromiter((bool(evaluate(item)) for item in items),
+                           dtype=bool, count=batch.size)
+    result, fallback = vectorized(batch)
+    for index in np.flatnonzero(fallback):
+        result[index] = evaluate(items[index])
+    return result
+
+
+def where(compiled, columns):
+    """Returns numpy array of indices of rows of `columns` which satisfy `compiled`
+    query, see `ColumnBatch`. Rows which can't be vectorized are checked as flat dicts
+    `{column name: value}` with nested keys disabled"""
+    require_numpy()
+    batch = ColumnBatch(columns, compiled.key_separator, compiled.case_sensitive)
+    result = evaluate_batch(
+        compiled.vectorized, compiled.flat.evaluate, batch, batch.rows())
+    return np.flatnonzero(result)
+
+
+def mask(compiled, records):
+    """Returns numpy boolean array, True for `records` which satisfy `compiled` query"""
+    require_numpy()
+    if not isinstance(records, list):
+        records = list(records)
+    batch = RecordBatch(records, compiled.case_sensitive)
+    return evaluate_batch(compiled.vectorized, compiled.evaluate, batch, records)
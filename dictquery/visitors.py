@@ -1,16 +1,27 @@
+import copy
 from datetime import datetime
 import fnmatch
 import operator
 import re
 
 from dictquery.exceptions import DQException, DQEvaluationError
-from dictquery.datavalue import query_value, DataQueryItem
+from dictquery.datavalue import LazyValues, DataQueryItem, compile_like
 from dictquery.parsers import (
     AndExpression, OrExpression, NotExpression,
-    KeyExpression, VALUE_EXPRESSIONS,
+    KeyExpression, NumberExpression, CompactArrayExpression,
+    VALUE_EXPRESSIONS, UNPREPARED,
 )
 
 
+def compact_array_values(expr, case_sensitive=True):
+    """Converts items of `CompactArrayExpression` same as `visit_number` / `visit_string`"""
+    if expr.item_class is NumberExpression:
+        return [float(item) for item in expr.items]
+    if case_sensitive:
+        return list(expr.items)
+    return [item.lower() for item in expr.items]
+
+
 class DataQueryVisitor:
     """Default data visitor. Evaluates to `True` or `False`. Checks if `data` satisfies `ast`"""
     def __init__(self, ast, use_nested_keys=True,
@@ -23,22 +34,21 @@ class DataQueryVisitor:
         self.ast = ast
         self.data = None
 
-    def _get_dict_value(self, dict_key):
+    def _get_dict_value(self, dict_key, keys=None):
         if self.data is None:
             raise DQException('self.data is not specified')
-        return query_value(
+        return LazyValues(
             self.data, dict_key, self.use_nested_keys,
-            self.key_separator, self.raise_keyerror)
+            self.key_separator, self.raise_keyerror, keys)
 
     def evaluate(self, data):
+        """Checks `data`. Record is bound to a shallow copy of visitor, so one
+        visitor may evaluate from many threads at once or reentrantly"""
         if self.ast is None:
             return False
-        try:
-            self.data = data
-            result = bool(self.ast.accept(self))
-        finally:
-            self.data = None
-        return result
+        visitor = copy.copy(self)
+        visitor.data = data
+        return bool(self.ast.accept(visitor))
 
     def match(self, data):
         return self.evaluate(data)
@@ -61,11 +71,17 @@ class DataQueryVisitor:
     def visit_notequal(self, expr):
         return operator.ne(expr.left.accept(self), expr.right.accept(self))
 
+    def _contains(self, container, item):
+        # if dictvalue.DataQueryItem class or class with the same interface
+        if isinstance(container, list) and hasattr(item, 'is_in'):
+            return item.is_in(container)
+        return operator.contains(container, item)
+
     def visit_contains(self, expr):
-        return operator.contains(expr.left.accept(self), expr.right.accept(self))
+        return self._contains(expr.left.accept(self), expr.right.accept(self))
 
     def visit_in(self, expr):
-        return operator.contains(expr.right.accept(self), expr.left.accept(self))
+        return self._contains(expr.right.accept(self), expr.left.accept(self))
 
     def visit_match(self, expr):
         left = expr.left.accept(self)
@@ -76,6 +92,10 @@ class DataQueryVisitor:
 
     def visit_like(self, expr):
         left = expr.left.accept(self)
+        if expr.regexp is not None:
+            if hasattr(left, 'like'):
+                return left.like(expr.regexp)
+            return expr.regexp.match(left) is not None
         # if dictvalue.DataQueryItem class or class with the same interface
         if hasattr(left, 'like'):
             return  left.like(expr.right.accept(self))
@@ -84,16 +104,22 @@ class DataQueryVisitor:
     def visit_key(self, expr):
         return DataQueryItem(
             key=expr.value,
-            values=self._get_dict_value(expr.value),
+            values=self._get_dict_value(expr.value, expr.keys),
             case_sensitive=self.case_sensitive,)
 
     def visit_number(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return expr.prepared
         return float(expr.value)
 
     def visit_boolean(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return expr.prepared
         return expr.value.lower() == 'true'
 
     def visit_string(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return expr.prepared
         return expr.value if self.case_sensitive else expr.value.lower()
 
     def visit_now(self, expr):
@@ -103,12 +129,18 @@ class DataQueryVisitor:
         return None
 
     def visit_regexp(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return expr.prepared
         if self.case_sensitive:
             return re.compile(expr.value)
         else:
             return re.compile(expr.value, re.IGNORECASE)
 
     def visit_array(self, expr):
+        if expr.prepared is not UNPREPARED:
+            return expr.prepared
+        if isinstance(expr, CompactArrayExpression):
+            return compact_array_values(expr, self.case_sensitive)
         result = []
         for item in expr.value:
             result.append(item.accept(self))
@@ -205,9 +237,7 @@ class MongoQueryVisitor:
 
     def visit_like(self, expr):
         left, right = self._get_binary_operands(expr)
-        right = fnmatch.translate(right)
-        pattern =  re.compile(right, 0 if self.case_sensitive else re.IGNORECASE)
-        return {left: {'$regex': pattern}}
+        return {left: {'$regex': compile_like(right, self.case_sensitive)}}
 
     def visit_key(self, expr):
         return expr.value
@@ -234,6 +264,8 @@ class MongoQueryVisitor:
             return re.compile(expr.value, re.IGNORECASE)
 
     def visit_array(self, expr):
+        if isinstance(expr, CompactArrayExpression):
+            return compact_array_values(expr, self.case_sensitive)
         result = []
         for item in expr.value:
             result.append(item.accept(self))
@@ -18,6 +18,11 @@ AUTHOR = 'Denis Lisovik'
 
 REQUIRED = []
 
+EXTRAS = {
+    'numpy': ['numpy'],
+    'ahocorasick': ['pyahocorasick'],
+}
+
 here = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -70,8 +75,11 @@ setup(
     url=URL,
     packages=['dictquery'],
 
-    entry_points={},
+    entry_points={
+        'console_scripts': ['dictquery=dictquery.cli:main'],
+    },
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     include_package_data=True,
     license='MIT',
     classifiers=[
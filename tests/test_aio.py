@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+from dictquery.exceptions import DQKeyError
+import dictquery as dq
+
+
+async def arange(count):
+    for i in range(count):
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+        yield {'age': i % 50, 'id': i}
+
+
+async def collect(iterable):
+    return [item async for item in iterable]
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        ThreadPoolExecutor.__init__(self, max_workers=1)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return ThreadPoolExecutor.submit(self, *args, **kwargs)
+
+
+class TestAsync(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_afilter(self):
+        expected = [item for item in self.run_async(collect(arange(3000))) if item['age'] >= 18]
+        for batch_size, use_executor in ((1000, True), (100, False), (1, True)):
+            result = self.run_async(collect(dq.afilter(
+                arange(3000), 'age >= 18', batch_size=batch_size, use_executor=use_executor)))
+            self.assertEqual(result, expected)
+
+    def test_afilter_executor(self):
+        executor = CountingExecutor()
+        result = self.run_async(collect(dq.afilter(arange(1200), 'age >= 18', executor=executor)))
+        self.assertEqual(len(result), 1200 * 32 // 50)
+        self.assertEqual(executor.calls, 3)
+        executor.shutdown()
+
+    def test_afilter_iterable(self):
+        data = [{'age': 12}, {'age': 27}, {}]
+        result = self.run_async(collect(dq.afilter(data, 'age > 18', backend='codegen')))
+        self.assertEqual(result, [{'age': 27}])
+        compiled = dq.compile('age', raise_keyerror=True)
+        with self.assertRaises(DQKeyError):
+            self.run_async(collect(dq.afilter(data, compiled)))
+
+    def test_afilter_yields_control(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def main():
+            task = asyncio.ensure_future(ticker())
+            result = await collect(dq.afilter(
+                [{'age': i} for i in range(1000)], 'age >= 0', batch_size=100))
+            task.cancel()
+            return result
+
+        self.assertEqual(len(self.run_async(main())), 1000)
+        self.assertGreaterEqual(len(ticks), 10)
+
+    def test_amatch(self):
+        self.assertTrue(self.run_async(dq.amatch({'age': 27}, 'age == 27')))
+        self.assertFalse(self.run_async(dq.amatch({'age': 27}, 'age == "X"', case_sensitive=False)))
+        with self.assertRaises(DQKeyError):
+            self.run_async(dq.amatch({}, 'age', raise_keyerror=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from dictquery.analysis import key_paths, iter_keys, shared_prefixes
+import dictquery as dq
+
+
+def paths(query, **options):
+    return key_paths(dq.compile(query, **options).prepared_ast)
+
+
+class TestKeyPaths(unittest.TestCase):
+    def test_key_paths(self):
+        self.assertEqual(paths('a == 1 AND (NOT `b.c` OR d IN [e, 2]) AND f CONTAINS "x"'),
+                         {('a',): True, ('b', 'c'): False, ('d',): False, ('e',): False,
+                          ('f',): True})
+        self.assertEqual(paths('(a OR b) AND (a == 1 OR a LIKE "x*")'), {('a',): True, ('b',): False})
+        self.assertEqual(paths('NOT (a OR b > c)'), {('a',): False, ('b',): False, ('c',): False})
+        self.assertEqual(paths('(a AND b) OR (b AND c)'),
+                         {('a',): False, ('b',): True, ('c',): False})
+        self.assertEqual(paths('`x.y` MATCH /z/', use_nested_keys=False), {('x.y',): True})
+        self.assertEqual(paths('[1, 2] CONTAINS 1 AND NOW > 1'), {})
+        self.assertEqual(key_paths(None), {})
+
+    def test_compiled(self):
+        compiled = dq.compile('`user/age` > 18 AND (status == "x" OR user)', key_separator='/')
+        self.assertEqual(compiled.key_paths(),
+                         {('user', 'age'): True, ('status',): False, ('user',): False})
+        self.assertEqual(compiled.keys(), {'user/age': True, 'status': False, 'user': False})
+        self.assertEqual(dq.compile('').keys(), {})
+
+
+
+class TestSharedPrefixes(unittest.TestCase):
+    def test_shared_prefixes(self):
+        ast = dq.compile('a > 1 AND (a < 5 OR `u.x.c` IN [`u.x.z`, 2]) AND NOT `u.y`').prepared_ast
+        keys = [key.keys for key in iter_keys(ast)]
+        self.assertEqual(keys, [('a',), ('a',), ('u', 'x', 'c'), ('u', 'x', 'z'), ('u', 'y')])
+        self.assertEqual(shared_prefixes(keys), {('a',), ('u',), ('u', 'x')})
+        self.assertEqual(shared_prefixes([('a', 'b'), ('c',)]), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import random
+import unittest
+
+from dictquery.bitmap import from_rows, to_rows, count, full
+
+
+class TestBitmap(unittest.TestCase):
+    def test_rows(self):
+        self.assertEqual(from_rows([]), 0)
+        self.assertEqual(from_rows([0, 3, 3, 9]), 0b1000001001)
+        self.assertEqual(to_rows(0b1000001001), [0, 3, 9])
+        self.assertEqual(to_rows(0), [])
+        self.assertEqual(count(from_rows([1, 5, 1000])), 3)
+        self.assertEqual(to_rows(full(10)), list(range(10)))
+
+    def test_random(self):
+        rnd = random.Random(1)
+        for size in (1, 8, 100, 5000):
+            rows = sorted(set(rnd.randrange(size) for _ in range(size // 3 + 1)))
+            other = set(rnd.randrange(size) for _ in range(size // 2))
+            bitmap, other_bitmap = from_rows(rows), from_rows(other)
+            self.assertEqual(to_rows(bitmap), rows)
+            self.assertEqual(to_rows(bitmap & other_bitmap), sorted(set(rows) & other))
+            self.assertEqual(to_rows(bitmap & ~other_bitmap), sorted(set(rows) - other))
+            self.assertEqual(count(bitmap | other_bitmap), len(set(rows) | other))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+from dictquery.cache import ParseCache
+from dictquery.exceptions import DQSyntaxError
+from dictquery.parsers import EqualExpression
+import dictquery as dq
+
+
+class TestParseCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = ParseCache(maxsize=4)
+        ast1 = cache.parse('age == 12')
+        ast2 = cache.parse('age == 12')
+        self.assertIs(ast1, ast2)
+        self.assertIsInstance(ast1, EqualExpression)
+        info = cache.info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.currsize, 1)
+
+    def test_lru_eviction(self):
+        cache = ParseCache(maxsize=2)
+        cache.parse('a')
+        cache.parse('b')
+        cache.parse('a')
+        cache.parse('c')
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.info().evictions, 1)
+
+    def test_resize(self):
+        cache = ParseCache(maxsize=None)
+        for key in 'abcdef':
+            cache.parse(key)
+        self.assertEqual(len(cache), 6)
+        cache.maxsize = 2
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.info().evictions, 4)
+        with self.assertRaises(ValueError):
+            cache.maxsize = -1
+
+    def test_disabled(self):
+        cache = ParseCache(maxsize=0)
+        self.assertIsNot(cache.parse('a'), cache.parse('a'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.info().misses, 2)
+
+    def test_clear(self):
+        cache = ParseCache()
+        cache.parse('a')
+        cache.parse('a')
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 0, 512, 0))
+
+    def test_syntax_error_not_cached(self):
+        cache = ParseCache()
+        with self.assertRaises(DQSyntaxError):
+            cache.parse('x y')
+        self.assertNotIn('x y', cache)
+
+    def test_threads(self):
+        cache = ParseCache(maxsize=8)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(200):
+                    query = 'key{} == {}'.format(i % 16, n)
+                    self.assertIsInstance(cache.parse(query), EqualExpression)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        info = cache.info()
+        self.assertEqual(info.hits + info.misses, 8 * 200)
+        self.assertLessEqual(info.currsize, 8)
+
+
+class TestModuleCache(unittest.TestCase):
+    def setUp(self):
+        dq.clear_cache()
+
+    def tearDown(self):
+        dq.set_cache_size(512)
+        dq.clear_cache()
+
+    def test_match_uses_cache(self):
+        for _ in range(3):
+            self.assertTrue(dq.match({'age': 18}, 'age == 18'))
+        info = dq.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 2)
+
+    def test_set_cache_size(self):
+        dq.set_cache_size(1)
+        dq.compile('a')
+        dq.compile('b')
+        self.assertEqual(dq.cache_info().currsize, 1)
+        self.assertEqual(dq.cache_info().evictions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from dictquery.cli import main, read_lines
+
+
+LINES = [
+    b'{"age": 20, "name": {"first": "Alice"}, "tags": ["x"]}',
+    b'{"age": 12,   "name": {"first": "Bob"}}',
+    b'{"age": 30, "name": {"first": "\\u0410\\u043d\\u043d\\u0430"}}\r',
+    b'{"age": 40, "name": "Eve"}',
+]
+DATA = b'\n'.join(LINES[:2]) + b'\n\n' + b'\n'.join(LINES[2:])
+
+
+class TestCli(unittest.TestCase):
+    def run_cli(self, argv, data=DATA):
+        stdout, stderr = io.BytesIO(), io.StringIO()
+        status = main(argv, stdin=io.BytesIO(data), stdout=stdout, stderr=stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_filter(self):
+        status, output, _ = self.run_cli(['age >= 20'])
+        self.assertEqual(status, 0)
+        self.assertEqual(output, LINES[0] + b'\n' + LINES[2] + b'\n' + LINES[3] + b'\n')
+        status, output, _ = self.run_cli(['`name.first` == "Анна"'])
+        self.assertEqual(output, LINES[2] + b'\n')
+        status, output, _ = self.run_cli(['age > 100'])
+        self.assertEqual((status, output), (1, b''))
+
+    def test_options(self):
+        self.assertEqual(self.run_cli(['-c', 'age >= 20'])[1], b'3\n')
+        self.assertEqual(self.run_cli(['--limit', '1', 'age >= 20'])[1], LINES[0] + b'\n')
+        self.assertEqual(self.run_cli(['-c', '-m', '2', 'age >= 20'])[1], b'2\n')
+        self.assertEqual(self.run_cli(['-c', '-i', '`name.first` == "bob"'])[1], b'1\n')
+        self.assertEqual(self.run_cli(['-c', '--no-nested-keys', '`name.first`'])[1], b'0\n')
+        for backend in ('visitor', 'closure', 'codegen'):
+            self.assertEqual(self.run_cli(['-c', '--backend', backend, 'tags'])[1], b'1\n')
+        self.assertEqual(self.run_cli(['--partial', 'age >= 20'])[1], self.run_cli(['age >= 20'])[1])
+        self.assertEqual(self.run_cli(['-c', '--partial', '`name.first` == "Анна"'])[1], b'1\n')
+
+    def test_workers(self):
+        data = b'\n'.join(b'{"id": %d}' % i for i in range(500))
+        status, output, _ = self.run_cli(['-w', '2', '--chunksize', '7', 'id >= 490'], data)
+        self.assertEqual(output, b''.join(b'{"id": %d}\n' % i for i in range(490, 500)))
+        self.assertEqual(self.run_cli(['-w', '2', '-c', '-m', '3', 'id'], data)[1], b'3\n')
+
+    def test_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'data.jsonl')
+        with open(path, 'wb') as f:
+            f.write(DATA)
+        status, output, _ = self.run_cli(['-c', 'age >= 20', path, '-', path])
+        self.assertEqual(output, b'9\n')
+        status, _, error = self.run_cli(['age', os.path.join(directory, 'missing.jsonl')])
+        self.assertEqual(status, 2)
+        self.assertIn('missing.jsonl', error)
+
+    def test_errors(self):
+        status, _, error = self.run_cli(['age >=='])
+        self.assertEqual(status, 2)
+        status, _, error = self.run_cli(['--no-prefilter', 'age'], b'{"age": 1}\nnot json\n')
+        self.assertEqual(status, 2)
+        self.assertIn('Invalid JSON', error)
+        status, _, error = self.run_cli(['age'], b'{"age": 1}\nnot json "age"\n')
+        self.assertEqual(status, 2)
+        # line without "age" can't match and isn't parsed
+        status, _, error = self.run_cli(['age'], b'{"age": 1}\nnot json\n')
+        self.assertEqual(status, 0)
+        status, output, _ = self.run_cli(['--skip-invalid', 'age'], b'{"age": 1}\nnot json\n')
+        self.assertEqual((status, output), (0, b'{"age": 1}\n'))
+        status, _, error = self.run_cli(['--raise-keyerror', 'x'], b'{"age": 1}\n')
+        self.assertEqual(status, 2)
+
+    def test_read_lines(self):
+        lines = list(read_lines(io.BytesIO(DATA), block_size=5))
+        self.assertEqual(lines, LINES)
+
+
+if __name__ == '__main__':
+    unittest.main()
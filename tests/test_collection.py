@@ -0,0 +1,159 @@
+import random
+import unittest
+
+from dictquery.exceptions import DQException
+import dictquery as dq
+
+
+RECORDS = [
+    {'id': 0, 'name': 'Alice', 'age': 31, 'city': 'Paris', 'tags': ['a', 'b']},
+    {'id': 1, 'name': 'Bob', 'age': 17, 'city': 'Berlin', 'tags': ['b']},
+    {'id': 2, 'name': 'carol', 'age': 45, 'city': 'paris'},
+    {'id': 3, 'name': 'Dave', 'age': 17.5, 'city': ['Paris', 'Rome']},
+    {'id': 4, 'name': 'Eve', 'city': 'Rome', 'user': {'score': 3}},
+    {'id': 5, 'name': 'Frank', 'age': 60, 'city': None, 'user': [{'score': 7}, {'score': 1}]},
+]
+
+
+class TestCollection(unittest.TestCase):
+    def setUp(self):
+        self.collection = dq.Collection(RECORDS)
+        self.collection.create_index('city')
+        self.collection.create_index('age', 'sorted')
+        self.collection.create_index('user.score', 'sorted')
+
+    def ids(self, query):
+        return [record['id'] for record in self.collection.filter(query)]
+
+    def test_filter(self):
+        self.assertEqual(self.ids('city == "Paris"'), [0])
+        self.assertEqual(self.ids('city IN ["Rome", "Berlin"]'), [1, 4])
+        self.assertEqual(self.ids('age >= 18'), [0, 2, 5])
+        self.assertEqual(self.ids('17 < age AND age < 40'), [0, 3])
+        self.assertEqual(self.ids('`user.score` > 2'), [4, 5])
+        self.assertEqual(self.ids('city == null'), [5])
+        self.assertEqual(self.ids('city == "Paris" OR age > 50'), [0, 5])
+        self.assertEqual(self.ids('age > 18 AND NOT city == "Paris"'), [2, 5])
+        self.assertEqual(self.ids('city == "Paris" AND tags CONTAINS "b"'), [0])
+        self.assertEqual(self.ids('name LIKE "*a*"'), [2, 3, 5])
+        self.assertEqual(self.collection.count('city IN []'), 0)
+
+    def test_plan(self):
+        plan = self.collection.plan('city == "Paris" AND name == "Alice" AND age > 10')
+        self.assertEqual([scan.predicate.keys for scan in plan.scans], [('city',), ('age',)])
+        self.assertIsNotNone(plan.residual)
+        self.assertEqual(self.collection.filter(plan.compiled), [RECORDS[0]])
+
+        plan = self.collection.plan('city IN ["Berlin", "Rome"] AND age < 20')
+        self.assertEqual(len(plan.scans), 3)
+        self.assertIsNone(plan.residual)
+        self.assertEqual(self.collection.rows(plan), [1])
+        self.assertTrue(self.collection.plan('city == "Paris" OR name == "Bob"').full_scan)
+        self.assertTrue(self.collection.plan('name == "Bob"').full_scan)
+
+        # unselective conjuncts are evaluated on rows of selective ones
+        collection = dq.Collection({'a': i, 'b': i % 2} for i in range(100))
+        collection.create_index('a', 'sorted')
+        collection.create_index('b')
+        plan = collection.plan('b == 1 AND a < 4')
+        self.assertEqual([scan.predicate.keys for scan in plan.scans], [('a',)])
+        self.assertEqual(collection.rows(plan), [1, 3])
+        self.assertEqual(collection.bitmap(plan), 0b1010)
+
+    def test_case_insensitive(self):
+        collection = dq.Collection(RECORDS, case_sensitive=False)
+        collection.create_index('city')
+        collection.create_index('name', 'sorted')
+        self.assertEqual([r['id'] for r in collection.filter('city == "PARIS"')], [0, 2])
+        self.assertEqual([r['id'] for r in collection.filter('name < "c"')], [0, 1])
+        # indexes don't apply to queries compiled with other options
+        self.assertEqual(collection.filter(dq.compile('city == "paris"')), [RECORDS[2]])
+        self.assertTrue(collection.plan(dq.compile('city == "paris"')).full_scan)
+
+    def test_add(self):
+        self.collection.add({'id': 6, 'city': 'Paris', 'age': 18})
+        self.collection.extend([{'id': 7, 'age': 70}])
+        self.assertEqual(len(self.collection), 8)
+        self.assertEqual(self.ids('city == "Paris"'), [0, 6])
+        self.assertEqual(self.ids('age > 17.5'), [0, 2, 5, 6, 7])
+        self.collection.drop_index('age', 'sorted')
+        self.assertTrue(self.collection.plan('age > 17.5').full_scan)
+        with self.assertRaises(DQException):
+            self.collection.create_index('age', 'btree')
+
+    def test_errors(self):
+        collection = dq.Collection([{'a': 1}, {'a': 'x'}, {'a': [1, 2]}])
+        collection.create_index('a', 'sorted')
+        # rows which values can't be compared with literal are evaluated
+        with self.assertRaises(TypeError):
+            collection.filter('a > 0')
+        self.assertEqual(collection.filter('a == 1'), [{'a': 1}])
+
+    def test_sorted_text(self):
+        records = [{'name': 'alex'}, {'name': 'x'}, {'name': 'box'}, {'name': 'y'}]
+        collection = dq.Collection(records)
+        collection.create_index('name', 'sorted')
+        for query in ('name CONTAINS "x"', 'name LIKE "*x*"', 'NOT name CONTAINS "x"',
+                      'name >= "b" AND name CONTAINS "x"'):
+            self.assertEqual(collection.filter(query), [r for r in records if dq.match(r, query)], query)
+        plan = collection.plan('name >= "b" AND name CONTAINS "x"')
+        self.assertEqual(len(plan.scans), 1)
+        self.assertIsNotNone(plan.residual)
+        repr(plan)
+
+    def test_same_as_filter(self):
+        rnd = random.Random(5)
+        values = ['0', '1', '2.5', '"x"', '"y"', 'true', 'null']
+        numbers = ['0', '1', '2.5', '3']
+
+        def atom():
+            key = rnd.choice(['a', 'b', '`c.d`', 'e'])
+            kind = rnd.randrange(5)
+            if kind == 0:
+                return '{} IN [{}, {}]'.format(key, rnd.choice(values), rnd.choice(values))
+            if kind == 1:
+                return '{} {} {}'.format(rnd.choice(['a', '`c.d`']), rnd.choice(['<', '<=', '>', '>=']),
+                                         rnd.choice(numbers))
+            if kind == 2:
+                return 'b {} "{}"'.format(rnd.choice(['<', '>=']), rnd.choice(['x', 'xy', 'y']))
+            if kind == 3:
+                return 'NOT {} == {}'.format(key, rnd.choice(values))
+            return '{} == {}'.format(key, rnd.choice(values))
+
+        def query(depth=0):
+            if depth > 2 or rnd.random() < 0.4:
+                return atom()
+            return '({} {} {})'.format(query(depth + 1), rnd.choice(['AND', 'OR']), query(depth + 1))
+
+        def record():
+            data = {}
+            if rnd.random() < 0.8:
+                data['a'] = rnd.choice([0, 1, 2, 2.5, 3, True, False, float('nan')])
+            if rnd.random() < 0.8:
+                data['b'] = rnd.choice(['x', 'xy', 'y', 'z'])
+            data['c'] = rnd.choice([{'d': rnd.choice([0, 1, 3, 'x', None])},
+                                    [{'d': rnd.choice([0, 1, 3])}, {'d': rnd.choice([1, 2.5])}]])
+            data['e'] = rnd.choice([1, 'x', None, [1], {'x': 1}])
+            return data
+
+        records = [record() for _ in range(3000)]
+        collection = dq.Collection(records)
+        collection.create_index('a', 'sorted')
+        collection.create_index('b')
+        collection.create_index('b', 'sorted')
+        collection.create_index('c.d', 'sorted')
+        collection.create_index('e')
+        checked = 0
+        for _ in range(300):
+            text = query()
+            try:
+                expected = list(dq.filter(records, text))
+            except TypeError:
+                continue
+            self.assertEqual(collection.filter(text), expected, text)
+            checked += 1
+        self.assertGreater(checked, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+import gc
+import linecache
+import pickle
+import threading
+import unittest
+
+from dictquery.compiler import AdaptiveChain, CompiledQuery, ClosureCompiler
+from dictquery.exceptions import DQException, DQKeyError
+from dictquery.parsers import DataQueryParser
+import dictquery as dq
+
+
+class User:
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+
+DATA = [
+    {
+        'age': 27, 'isActive': False, 'eyeColor': 'green',
+        'name': {'firstname': 'Marion', 'secondname': 'Delgado'},
+        'email': 'mariondelgado@bleendot.com',
+        'registered': datetime(2015, 3, 29, 6, 7, 58),
+        'tags': ['voluptate', 'ex', 'dolor'],
+        'user.address': '155 Village Road',
+        'friends': [
+            {'id': 0, 'age': 27, 'name': {'firstname': 'Ratliff'}},
+            {'id': 1, 'age': 19, 'name': {'firstname': 'Raymond'}},
+            {'id': 2, 'age': 34, 'name': {'firstname': 'Mavis'}},
+        ],
+    },
+    {'age': 12, 'isActive': True, 'eyeColor': 'Blue', 'tags': [], 'friends': []},
+    {'age': 18.0, 'eyeColor': None, 'name': 'Nobody', 'friends': [User('Jim', 40), 23, 'x']},
+    {'age': '18', 'email': 'CYBERLIS@EXAMPLE.COM'},
+    {},
+    {'users': User('cyberlis', 26)},
+    [{'age': 1}, {'age': 40}],
+]
+
+QUERIES = [
+    'age',
+    'NOT age',
+    'isActive',
+    'age == 27',
+    'age != 27',
+    '27 == age',
+    'age == 18 OR age == "18"',
+    'eyeColor == "green"',
+    'eyeColor == "blue"',
+    'eyeColor == NONE',
+    'isActive == FALSE',
+    'eyeColor IN ["blue", "green", "black"]',
+    'age IN [1, 2, 3, 12, 18, 19, 20, 21, 22, 23, 27, "18", TRUE, NONE]',
+    '`friends.age` IN [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 19]',
+    'eyeColor IN ["Green", "BLUE"] OR ["voluptate", "x"] CONTAINS tags',
+    '["blue", "green"] CONTAINS eyeColor',
+    'tags CONTAINS "ex"',
+    'name CONTAINS "firstname"',
+    'eyeColor IN "the green one"',
+    '`name.firstname` == "Marion"',
+    '`friends.age` > 30',
+    '`friends.age` <= 19 AND `friends.name.firstname` LIKE "Ray*"',
+    '`friends.name` == "Jim"',
+    '`users.name` == "cyberlis" AND `users.age` == 26',
+    r'email MATCH /\w+@\w+\.com/',
+    'email LIKE "*@example.com"',
+    '`user.address`',
+    'registered < NOW',
+    'age == age',
+    '(age == 27 OR age == 12) AND NOT isActive',
+    'age == 1 AND age == 40',
+    'age > 12 AND age < 30 AND (age != 27 OR eyeColor == "green")',
+    '`name.firstname` == "Marion" OR `name.secondname` LIKE "D*" OR name == "Nobody"',
+    '`friends.age` > 20 AND `friends.name.firstname` IN ["Mavis", "Jim"] AND `friends.name`',
+    '`users.name` == `users.name` AND NOT `users.age` < 20',
+    'NOT (eyeColor == "green" OR eyeColor == "Blue") AND friends',
+    '"hello" IN "hello world"',
+    '12 < 23',
+    'TRUE',
+    '',
+]
+
+OPTIONS = [
+    {},
+    {'case_sensitive': False},
+    {'use_nested_keys': False},
+    {'raise_keyerror': True},
+]
+
+
+def evaluate(compiled, data):
+    try:
+        return compiled.match(data)
+    except Exception as e:
+        return type(e)
+
+
+class BackendTestMixin:
+    """Checks that `backend` gives the same results as `DataQueryVisitor`"""
+    backend = None
+
+    def assert_same_results(self, queries, data, options):
+        parser = DataQueryParser()
+        for query in queries:
+            ast = parser.parse(query)
+            expected = CompiledQuery(ast, backend='visitor', **options)
+            compiled = CompiledQuery(ast, backend=self.backend, **options)
+            for item in data:
+                self.assertEqual(
+                    evaluate(compiled, item), evaluate(expected, item),
+                    '{!r} {} on {!r}'.format(query, options, item))
+
+    def test_same_as_visitor(self):
+        for options in OPTIONS:
+            self.assert_same_results(QUERIES, DATA, options)
+
+    def test_filter(self):
+        compiled = dq.compile('age >= 18', backend=self.backend)
+        result = list(compiled.filter([{'age': 12}, {'age': 18}, {}, {'age': 27}]))
+        self.assertEqual(result, [{'age': 18}, {'age': 27}])
+        result = list(dq.filter([{'age': 12}, {'age': 27}], 'age < 18', backend=self.backend))
+        self.assertEqual(result, [{'age': 12}])
+
+    def test_raise_keyerror(self):
+        compiled = dq.compile('age', raise_keyerror=True, backend=self.backend)
+        with self.assertRaises(DQKeyError):
+            compiled.match({})
+
+
+class TestClosureBackend(BackendTestMixin, unittest.TestCase):
+    backend = 'closure'
+
+    def test_constant_folding(self):
+        compiler = ClosureCompiler()
+        parser = DataQueryParser()
+        self.assertTrue(compiler.compile(parser.parse('12 < 23'))({}))
+        self.assertFalse(compiler.compile(parser.parse('NOT TRUE'))({}))
+        func = compiler.compile(parser.parse('12 < "a"'))
+        with self.assertRaises(TypeError):
+            func({})
+
+    def test_default_backend(self):
+        self.assertEqual(dq.compile('age').backend, 'closure')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(DQException):
+            dq.compile('age', backend='unknown')
+
+
+class TestVisitorBackend(BackendTestMixin, unittest.TestCase):
+    backend = 'visitor'
+
+
+class TestCodegenBackend(BackendTestMixin, unittest.TestCase):
+    backend = 'codegen'
+
+    def test_source(self):
+        compiled = dq.compile("age >= 12 AND `name.first` == 'A{}n'", backend='codegen')
+        self.assertIn("data['age'] >= 12.0", compiled.source)
+        self.assertIn("data['name']['first'] == 'A{}n'", compiled.source)
+        self.assertTrue(compiled.match({'age': 12, 'name': {'first': 'A{}n'}}))
+        self.assertIsNone(dq.compile('age').source)
+
+    def test_fallback_for_lists(self):
+        compiled = dq.compile('`friends.age` > 30', backend='codegen')
+        self.assertTrue(compiled.match({'friends': [{'age': 12}, {'age': 40}]}))
+        self.assertFalse(compiled.match({'friends': {'age': 12}}))
+
+    def test_linecache(self):
+        compiled = dq.compile('age > 1', backend='codegen')
+        filename = compiled._evaluate.__code__.co_filename
+        self.assertEqual(linecache.getline(filename, 1), 'def _dictquery(data):\n')
+        other = dq.compile('age > 2', backend='codegen')
+        self.assertNotEqual(other._evaluate.__code__.co_filename, filename)
+        del compiled
+        gc.collect()
+        self.assertNotIn(filename, linecache.cache)
+
+    def test_deep_query(self):
+        # too many nested parentheses for python parser, falls back to closures
+        query = 'NOT (' * 200 + 'age == 1' + ')' * 200
+        compiled = dq.compile(query, backend='codegen')
+        self.assertIsNone(compiled.source)
+        self.assertTrue(compiled.match({'age': 1}))
+
+
+class Counted:
+    """Object which counts reads of its attributes"""
+    reads = 0
+
+    def __init__(self, **values):
+        self.__dict__['values'] = values
+
+    def __getattr__(self, name):
+        Counted.reads += 1
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class TestSharedKeys(unittest.TestCase):
+    def test_resolved_once(self):
+        data = Counted(age=40, status='y', user=Counted(address=Counted(city='a', zip=1)))
+        compiled = dq.compile("age > 18 AND age < 65 AND (age != 30 OR status == 'x')")
+        Counted.reads = 0
+        self.assertTrue(compiled.match(data))
+        self.assertEqual(Counted.reads, 1)
+        compiled = dq.compile("`user.address.city` == 'a' AND `user.address.zip` > 0")
+        Counted.reads = 0
+        self.assertTrue(compiled.match(data))
+        self.assertEqual(Counted.reads, 4)
+
+    def test_source(self):
+        source = dq.compile("age > 18 AND age < 65 AND `user.address.city` == 'a' "
+                            "AND `user.address.zip` > 0", backend='codegen').source
+        self.assertEqual(source.count("'age'"), 1)
+        self.assertEqual(source.count("'user'"), 1)
+        self.assertEqual(source.count("'address'"), 1)
+        compiled = dq.compile("`a.b` == 1 AND `a.c` == 2", backend='codegen')
+        self.assertTrue(compiled.match({'a': {'b': 1, 'c': 2}}))
+        self.assertTrue(compiled.match({'a': [{'b': 1}, {'c': 2}]}))
+        self.assertFalse(compiled.match({'a': {'b': 1}}))
+        self.assertFalse(compiled.match({}))
+        self.assertFalse(compiled.match(None))
+
+
+class Expensive:
+    """Value which counts comparisons"""
+    def __init__(self):
+        self.calls = 0
+
+    def __eq__(self, other):
+        self.calls += 1
+        return True
+
+    __hash__ = object.__hash__
+
+
+class TestReorder(unittest.TestCase):
+    def test_same_results(self):
+        parser = DataQueryParser()
+        for backend in ('closure', 'visitor', 'codegen'):
+            for reorder in ('static', 'adaptive'):
+                if reorder == 'adaptive' and backend != 'closure':
+                    continue
+                for options in OPTIONS:
+                    for query in QUERIES:
+                        ast = parser.parse(query)
+                        expected = CompiledQuery(ast, backend='visitor', **options)
+                        compiled = CompiledQuery(ast, backend=backend, reorder=reorder, **options)
+                        for item in DATA * 20:
+                            result, expected_result = evaluate(compiled, item), evaluate(expected, item)
+                            if options.get('raise_keyerror') or isinstance(expected_result, bool) \
+                                    and isinstance(result, bool):
+                                # errors of operands which aren't evaluated may change
+                                self.assertEqual(result, expected_result, (query, reorder, options))
+
+    def test_static(self):
+        value = Expensive()
+        compiled = dq.compile('a == 1 AND b == 1', reorder='static')
+        self.assertFalse(compiled.match({'a': value, 'b': 2}))
+        self.assertEqual(value.calls, 1)
+        compiled = dq.compile('a MATCH /x+/ AND `b.c.d` > 1 AND e == 1', reorder='static')
+        self.assertFalse(compiled.match({'a': 1, 'e': 2}))
+        self.assertTrue(compiled.match({'a': 'xx', 'b': {'c': {'d': 2}}, 'e': 1}))
+
+    def test_adaptive(self):
+        value = Expensive()
+        compiled = dq.compile('a == 1 AND b == 1', reorder='adaptive')
+        for _ in range(2000):
+            self.assertFalse(compiled.match({'a': value, 'b': 2}))
+        # `a == 1` is always True, `b == 1` is evaluated first
+        calls = value.calls
+        for _ in range(1000):
+            compiled.match({'a': value, 'b': 2})
+        self.assertLess(value.calls - calls, 10)
+        self.assertTrue(compiled.match({'a': value, 'b': 1}))
+
+    def test_adaptive_threads(self):
+        operands = [lambda data: data % 2 == 0, lambda data: data % 3 == 0, lambda data: data > 10]
+        chain = AdaptiveChain(operands, [(1.0, 0.5)] * 3, False)
+        evaluate = chain.compile()
+        expected = [i for i in range(2000) if i % 6 == 0 and i > 10]
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(4):
+                    self.assertEqual([i for i in range(2000) if evaluate(i)], expected)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        # every 16th evaluation is sampled, none of samples are lost
+        self.assertEqual(chain._samples, 8 * 4 * 2000 // 16)
+        self.assertEqual(sorted(chain.order), [0, 1, 2])
+        self.assertEqual([operands[index] for index in chain.order], chain.ordered)
+
+    def test_raise_keyerror(self):
+        # missing keys are read in order of query
+        compiled = dq.compile('missing == 1 AND a == 2', raise_keyerror=True, reorder='static')
+        with self.assertRaises(DQKeyError):
+            compiled.match({'a': 1})
+
+    def test_errors_in_written_order(self):
+        # `c <= "x"` raises on list, written order decides on missing `a` first
+        query = 'a != 1 AND NOT c <= "x"'
+        for reorder, backend in (('static', 'closure'), ('static', 'codegen'), ('adaptive', 'closure')):
+            compiled = dq.compile(query, reorder=reorder, backend=backend)
+            for _ in range(100):
+                self.assertFalse(compiled.match({'c': []}))
+            with self.assertRaises(TypeError):
+                compiled.match({'a': 2, 'c': []})
+            self.assertTrue(compiled.match({'a': 2, 'c': 'y'}))
+        self.assertIn('<=', dq.compile(query, reorder='static', backend='codegen').source)
+
+    def test_options(self):
+        with self.assertRaises(DQException):
+            dq.compile('a', reorder='dynamic')
+        with self.assertRaises(DQException):
+            dq.compile('a', reorder='adaptive', backend='codegen')
+        compiled = pickle.loads(pickle.dumps(dq.compile('a AND b', reorder='adaptive')))
+        self.assertEqual(compiled.reorder, 'adaptive')
+        self.assertEqual(compiled.flat.reorder, 'adaptive')
+        self.assertEqual(list(dq.filter([{'a': 1}, {'a': 2}], 'a > 1 OR b', reorder='static')),
+                         [{'a': 2}])
+
+
+class TestRewrite(unittest.TestCase):
+    QUERIES = QUERIES + [
+        'age == 12 OR age == 27 OR age == "18" OR eyeColor == "Blue"',
+        'age > 10 AND age <= 20 AND age != 12.5',
+        'age == 1 AND age == 40',
+        'age > 30 AND age < 10 OR isActive',
+        'NOT eyeColor == "green" AND NOT eyeColor == NONE AND NOT eyeColor IN ["blue"]',
+        '`friends.age` > 20 AND `friends.age` < 25',
+        'age == 27 AND NOT age == 27 OR tags AND tags',
+        'email LIKE "*.com" AND age > 1 AND email LIKE "*.com" AND 30 > age',
+    ]
+
+    def test_same_results(self):
+        parser = DataQueryParser()
+        for backend in ('closure', 'visitor', 'codegen'):
+            for options in OPTIONS:
+                for query in self.QUERIES:
+                    ast = parser.parse(query)
+                    expected = CompiledQuery(ast, backend='visitor', **options)
+                    compiled = CompiledQuery(ast, backend=backend, rewrite=True, **options)
+                    for item in DATA:
+                        result, expected_result = evaluate(compiled, item), evaluate(expected, item)
+                        if TypeError not in (result, expected_result):
+                            # errors of operands which aren't evaluated may change
+                            self.assertEqual(result, expected_result, (query, backend, options, item))
+
+    def test_several_values(self):
+        # every condition may be satisfied by other value of key
+        for backend in ('closure', 'codegen'):
+            compiled = dq.compile('x == 1 AND x == 2', backend=backend, rewrite=True)
+            self.assertFalse(compiled.match({'x': 1}))
+            self.assertTrue(compiled.match([{'x': 1}, {'x': 2}]))
+            compiled = dq.compile('`a.x` > 10 AND `a.x` <= 20', backend=backend, rewrite=True)
+            self.assertTrue(compiled.match({'a': {'x': 15}}))
+            self.assertFalse(compiled.match({'a': {'x': 25}}))
+            self.assertTrue(compiled.match({'a': [{'x': 5}, {'x': 25}]}))
+            self.assertFalse(compiled.match({'a': [{'x': 5}, {'y': 15}]}))
+            compiled = dq.compile('name > "a" AND name < "c"', backend=backend, rewrite=True,
+                                  case_sensitive=False)
+            self.assertTrue(compiled.match({'name': 'Bob'}))
+
+    def test_lookups(self):
+        data = Counted(a=5, b=15)
+        compiled = dq.compile('a == 1 OR a == 2 OR a == 3 OR b > 10 AND b < 20 AND b != 12',
+                              backend='visitor', rewrite=True)
+        Counted.reads = 0
+        self.assertTrue(compiled.match(data))
+        self.assertEqual(Counted.reads, 4)
+        compiled = dq.compile('a == 1 OR a == 2 OR a == 3 OR b > 10 AND b < 20 AND b != 12',
+                              rewrite=True)
+        Counted.reads = 0
+        self.assertTrue(compiled.match(data))
+        self.assertEqual(Counted.reads, 2)
+
+    def test_options(self):
+        compiled = dq.compile('a == 1 OR a == 2', rewrite=True, reorder='static')
+        compiled = pickle.loads(pickle.dumps(compiled))
+        self.assertTrue(compiled.rewrite)
+        self.assertTrue(compiled.flat.rewrite)
+        self.assertEqual(list(dq.filter([{'a': 1}, {'a': 3}], 'a == 3 OR a == 4', rewrite=True)),
+                         [{'a': 3}])
+        compiled = dq.compile('a == 1 OR missing == 1 OR a == 2', raise_keyerror=True, rewrite=True)
+        with self.assertRaises(DQKeyError):
+            compiled.match({'a': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
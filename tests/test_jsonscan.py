@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import unittest
+
+from dictquery.jsonscan import PartialDecoder, projection
+import dictquery as dq
+
+
+def decode(text, *paths):
+    return PartialDecoder(paths).decode(text)
+
+
+def match(compiled, data):
+    try:
+        return compiled.match(data)
+    except TypeError:
+        return TypeError
+
+
+class TestProjection(unittest.TestCase):
+    def test_projection(self):
+        self.assertEqual(projection([('a', 'b'), ('a', 'c'), ('d',)]),
+                         {'a': {'b': None, 'c': None}, 'd': None})
+        self.assertEqual(projection([('a', 'b'), ('a',)]), {'a': None})
+        self.assertEqual(projection([]), {})
+
+
+class TestPartialDecoder(unittest.TestCase):
+    def test_decode(self):
+        text = ('{"payload": {"a": [1, "x]}", {"b": "\\"{"}]}, "status": "ok", '
+                '"user": [{"age": 3, "z": {}}, 5, [{"age": 1}], {"name": "\\u0410"}], '
+                '"tags": [1, 2], "status": "dup"')
+        self.assertEqual(decode(text, ('status',), ('user', 'age'), ('user', 'name'), ('tags',)),
+                         {'status': 'ok', 'user': [{'age': 3}, {'name': u'А'}], 'tags': [1, 2]})
+        self.assertEqual(decode(b'{"\\u0061": {"b": 1, "c": 2}}', ('a', 'b')), {'a': {'b': 1}})
+        self.assertEqual(decode(u'{"ключ": "значение"}'.encode('utf-8'), (u'ключ',)),
+                         {u'ключ': u'значение'})
+        self.assertEqual(decode(' {"a": 1} ', ('b',)), {})
+        self.assertEqual(decode('[{"a": 1}, 2, {"b": 3}]', ('a',)), [{'a': 1}, {}])
+        self.assertEqual(decode('12'), 12)
+        # text after the last referenced key isn't read
+        self.assertEqual(decode('{"a": 1, "b": 2} x', ('a',)), {'a': 1})
+
+    def test_errors(self):
+        for text in ('{"a" 1}', '{"b": "x', '{"b": [1, 2', '{"a": }', '{"b": 1} x',
+                     '{a: 1}', '{"b": 1 "a": 2}', '', b'{"a": "\xff"}'):
+            with self.assertRaises(ValueError, msg=text):
+                decode(text, ('a',))
+
+    def test_same_as_json(self):
+        rnd = random.Random(7)
+        queries = ['status == "failed" AND `user.age` >= 18', 'tags CONTAINS "a"',
+                   'NOT `user.name` LIKE "u1*"', '`payload.values` CONTAINS 3 OR user']
+
+        def value(depth):
+            kind = rnd.randrange(8 if depth < 3 else 4)
+            if kind == 0:
+                return rnd.choice([None, True, False, 1.5, -3, 10 ** 20])
+            if kind == 1:
+                return rnd.randrange(40)
+            if kind in (2, 3):
+                return rnd.choice(['failed', 'ok', 'a', 'u12', '[{"}', u'А\\"'])
+            if kind in (4, 5):
+                return [value(depth + 1) for _ in range(rnd.randrange(4))]
+            keys = ['status', 'user', 'age', 'name', 'tags', 'payload', 'values', 'x']
+            return dict((rnd.choice(keys), value(depth + 1)) for _ in range(rnd.randrange(5)))
+
+        for _ in range(500):
+            record = value(0)
+            if rnd.random() < 0.5:
+                record = {'status': value(2), 'user': value(1), 'payload': value(1)}
+            text = json.dumps(record, ensure_ascii=rnd.random() < 0.5,
+                              indent=rnd.choice([None, 1]))
+            for query in queries:
+                compiled = dq.compile(query)
+                partial = PartialDecoder.from_compiled(compiled).decode(text)
+                self.assertEqual(match(compiled, partial), match(compiled, record), (query, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from dictquery import keywords
+from dictquery.keywords import KeywordMatcher
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def check(self, matcher_keywords, texts):
+        matchers = [keywords._Automaton(matcher_keywords), KeywordMatcher(matcher_keywords)]
+        for text in texts:
+            expected = set(keyword for keyword in matcher_keywords if keyword in text)
+            for matcher in matchers:
+                self.assertEqual(matcher.find(text), expected, text)
+
+    def test_find(self):
+        self.check(['he', 'she', 'his', 'hers', 'ключ', 'e'],
+                   ['ushers', 'his', '', 'h', 'ключи', 'sh e'])
+        self.check([], ['abc'])
+        with self.assertRaises(ValueError):
+            KeywordMatcher(['a', ''])
+
+    def test_random(self):
+        rnd = random.Random(5)
+        words = [''.join(rnd.choice('abc') for _ in range(rnd.randrange(1, 6))) for _ in range(50)]
+        texts = [''.join(rnd.choice('abcd') for _ in range(rnd.randrange(30))) for _ in range(200)]
+        self.check(words, texts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import operator
+import re
+import unittest
+
+from dictquery.analysis import estimate, rank
+from dictquery.optimizer import prepare, reorder, rewrite, satisfiable, is_member
+from dictquery.parsers import (
+    DataQueryParser, AndExpression, OrExpression, NotExpression, BooleanExpression,
+    KeyConditionsExpression, UNPREPARED)
+from dictquery.visitors import DataQueryVisitor
+
+
+class TestPrepare(unittest.TestCase):
+    def setUp(self):
+        self.parser = DataQueryParser()
+
+    def test_keys(self):
+        ast = self.parser.parse('`user.name` == "x"')
+        self.assertEqual(prepare(ast).left.keys, ('user', 'name'))
+        self.assertEqual(prepare(ast, key_separator='/').left.keys, ('user.name',))
+        self.assertEqual(prepare(ast, use_nested_keys=False).left.keys, ('user.name',))
+
+    def test_literals(self):
+        ast = prepare(self.parser.parse('age > 12 AND name == "Bob" AND flag == TRUE'),
+                      case_sensitive=False)
+        self.assertEqual(ast.left.left.right.prepared, 12.0)
+        self.assertEqual(ast.left.right.right.prepared, 'bob')
+        self.assertIs(ast.right.right.prepared, True)
+
+    def test_regexp(self):
+        ast = prepare(self.parser.parse(r'name MATCH /\w+/'), case_sensitive=False)
+        self.assertEqual(ast.right.prepared.pattern, r'\w+')
+        self.assertTrue(ast.right.prepared.flags & re.IGNORECASE)
+
+    def test_array(self):
+        ast = prepare(self.parser.parse('age IN [12, "x", NONE]'))
+        self.assertEqual(ast.right.prepared, [12.0, 'x', None])
+        self.assertEqual(ast.right.prepared.members, frozenset([12.0, 'x', None]))
+        ast = prepare(self.parser.parse('name IN ["Bob", "x"]'), case_sensitive=False)
+        self.assertEqual(ast.right.prepared.members, frozenset(['bob', 'x']))
+        ast = prepare(self.parser.parse('age IN [12, NOW]'))
+        self.assertIs(ast.right.prepared, UNPREPARED)
+        self.assertEqual(ast.right.value[0].prepared, 12.0)
+
+    def test_source_ast_not_modified(self):
+        ast = self.parser.parse('`a.b` IN [1, 2] AND NOT c == 3')
+        prepared = prepare(ast)
+        self.assertIsNot(prepared, ast)
+        self.assertIsNone(ast.left.left.keys)
+        self.assertIs(ast.left.right.prepared, UNPREPARED)
+        self.assertIs(ast.right.value.right.prepared, UNPREPARED)
+        self.assertEqual(prepared.right.value.right.prepared, 3.0)
+
+    def test_visitor_uses_prepared(self):
+        ast = prepare(self.parser.parse('`a/b` >= 2'), key_separator='/')
+        dqv = DataQueryVisitor(ast)
+        self.assertTrue(dqv.evaluate({'a': {'b': 3}}))
+        self.assertFalse(dqv.evaluate({'a': {'b': 1}}))
+
+    def test_like(self):
+        ast = prepare(self.parser.parse('name LIKE "Ra*nd"'))
+        self.assertTrue(ast.regexp.match('Raymond'))
+        self.assertFalse(ast.regexp.match('raymond'))
+        self.assertIsNone(self.parser.parse('name LIKE "Ra*nd"').regexp)
+        ast = prepare(self.parser.parse('name LIKE "Ra*nd"'), case_sensitive=False)
+        self.assertTrue(ast.regexp.match('RAYMOND'))
+        self.assertEqual(ast.right.prepared, 'ra*nd')
+
+    def test_empty(self):
+        self.assertIsNone(prepare(None))
+
+
+
+def show(expr):
+    """Query of ast with keys and operations of comparisons"""
+    if isinstance(expr, (AndExpression, OrExpression)):
+        return '({} {} {})'.format(
+            show(expr.left), 'AND' if isinstance(expr, AndExpression) else 'OR', show(expr.right))
+    if isinstance(expr, NotExpression):
+        return 'NOT ' + show(expr.value)
+    if not hasattr(expr, 'left'):
+        return '{} {}'.format(expr.value, type(expr).__name__[:-len('Expression')])
+    return '{} {}'.format(expr.left.value, type(expr).__name__[:-len('Expression')])
+
+
+class TestReorder(unittest.TestCase):
+    def setUp(self):
+        self.parser = DataQueryParser()
+
+    def reordered(self, query):
+        return show(reorder(prepare(self.parser.parse(query))))
+
+    def test_reorder(self):
+        self.assertEqual(self.reordered('name MATCH /x/ AND `a.b.c` > 1 AND e == 1'),
+                         '((e Equal AND a.b.c GT) AND name Match)')
+        self.assertEqual(self.reordered('a == 1 OR b != 2'), '(b NotEqual OR a Equal)')
+        self.assertEqual(self.reordered('NOT (x LIKE "a*" OR y == 2) AND z IN [1, 2]'),
+                         '(z In AND NOT (y Equal OR x Like))')
+        # equal ranks keep order
+        self.assertEqual(self.reordered('b == 1 AND a == 1'), '(b Equal AND a Equal)')
+        self.assertIsNone(reorder(None))
+
+    def test_estimate(self):
+        ast = prepare(self.parser.parse('a == 1 AND `b.c` < 2'))
+        cost, rate = estimate(ast)
+        self.assertAlmostEqual(cost, 2 + 0.1 * 3)
+        self.assertAlmostEqual(rate, 0.1 * 0.5)
+        self.assertEqual(estimate(prepare(self.parser.parse('TRUE'))), (0, 1.0))
+        # compact arrays of literals
+        self.assertEqual(estimate(prepare(self.parser.parse('a IN [1, 2]'))), (2, 0.2))
+        self.assertEqual(estimate(prepare(self.parser.parse('a IN []')))[1], 0.0)
+        self.assertEqual(rank(1, 1.0, True), float('inf'))
+        self.assertEqual(rank(2, 0.5, False), 4)
+
+
+class TestRewrite(unittest.TestCase):
+    def setUp(self):
+        self.parser = DataQueryParser()
+
+    def rewritten(self, query, **options):
+        return rewrite(prepare(self.parser.parse(query)), **options)
+
+    def test_members(self):
+        ast = self.rewritten('a == 1 OR b == 2 OR 2 == a OR a IN ["x", 3] OR a > 5')
+        self.assertEqual(show(ast), '((a In OR b Equal) OR a GT)')
+        self.assertEqual(ast.left.left.right.prepared, [1.0, 2.0, 'x', 3.0])
+        self.assertEqual(ast.left.left.right.prepared.members, frozenset([1.0, 2.0, 'x', 3.0]))
+        ast = self.rewritten('NOT a == 1 AND NOT a == 2 AND b')
+        self.assertEqual(ast.left.value.right.prepared, [1.0, 2.0])
+        self.assertEqual(show(self.rewritten('a == 1 OR a IN [b]')), '(a Equal OR a In)')
+        self.assertEqual(show(self.rewritten('a == 1 OR (a == 2 AND b) OR a == 3')),
+                         '(a In OR (a Equal AND b Key))')
+
+    def test_conditions(self):
+        ast = self.rewritten('age > 10 AND name == "x" AND age <= 20 AND 30 > age')
+        self.assertIsInstance(ast.left, KeyConditionsExpression)
+        self.assertEqual(ast.left.key.keys, ('age',))
+        self.assertEqual(ast.left.conditions, ((operator.gt, 10.0), (operator.le, 20.0), (operator.lt, 30.0)))
+        self.assertTrue(ast.left.satisfiable)
+        self.assertEqual(show(ast), '(((age GT AND age LTE) AND 30 GT) AND name Equal)')
+        self.assertFalse(self.rewritten('x == 1 AND x == 2').satisfiable)
+        self.assertFalse(self.rewritten('x IN [1, 2] AND x > 2').satisfiable)
+
+    def test_satisfiable(self):
+        self.assertFalse(satisfiable([(operator.gt, 5.0), (operator.lt, 3.0)]))
+        self.assertFalse(satisfiable([(operator.gt, 5.0), (operator.le, 5.0)]))
+        self.assertTrue(satisfiable([(operator.ge, 5.0), (operator.le, 5.0)]))
+        self.assertFalse(satisfiable([(operator.ge, 5.0), (operator.le, 5.0), (operator.ne, 5.0)]))
+        self.assertTrue(satisfiable([(operator.eq, 1.0), (operator.eq, True)]))
+        self.assertTrue(satisfiable([(is_member, [1.0, 'x']), (operator.eq, 'x')]))
+        # strings and numbers can't be compared
+        self.assertTrue(satisfiable([(operator.gt, 'x'), (operator.lt, 3.0)]))
+
+    def test_duplicates(self):
+        self.assertEqual(show(self.rewritten('a == 1 AND (b > 2 AND a == 1) AND a == 1.0')),
+                         '(a Equal AND b GT)')
+        ast = self.rewritten('(a == 1 OR b < 1) OR (a == 1 OR b < 1)')
+        self.assertEqual(show(ast), '(a Equal OR b LT)')
+
+    def test_constants(self):
+        for query, value in [('a == 1 AND NOT a == 1', False), ('a OR NOT a', True),
+                             ('FALSE AND a', False), ('a == 1 OR TRUE', True), ('NOT TRUE', False)]:
+            ast = self.rewritten(query)
+            self.assertIsInstance(ast, BooleanExpression, query)
+            self.assertIs(ast.prepared, value, query)
+        self.assertEqual(show(self.rewritten('a == 1 AND TRUE')), 'a Equal')
+        self.assertIsNone(rewrite(None))
+
+    def test_raise_keyerror(self):
+        # operands which may raise missing key aren't skipped
+        self.assertEqual(show(self.rewritten('a > 1 AND FALSE AND b', raise_keyerror=True)),
+                         '(a GT AND FALSE Boolean)')
+        self.assertEqual(show(self.rewritten('a AND NOT a', raise_keyerror=True)), '(a Key AND NOT a Key)')
+        # only adjacent operands are merged
+        ast = self.rewritten('a == 1 OR b == 1 OR a == 2 OR a == 3', raise_keyerror=True)
+        self.assertEqual(show(ast), '((a Equal OR b Equal) OR a In)')
+        ast = self.rewritten('a > 1 AND b AND a < 2', raise_keyerror=True)
+        self.assertNotIsInstance(ast.left, KeyConditionsExpression)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import pickle
+import unittest
+
+from dictquery.compiler import BACKENDS
+from dictquery.exceptions import DQKeyError
+from dictquery.parallel import parallel_filter
+from dictquery.parsers import DataQueryParser, UNPREPARED
+import dictquery as dq
+
+
+QUERY = ('(age >= 18 AND `name.first` LIKE "A*") OR NOT tags CONTAINS "x" '
+         'OR `friends.age` IN [1, 2, 3] OR email MATCH /@example/ OR created < NOW '
+         'OR eyeColor IN ["blue", NONE, 1]')
+
+
+class TestPickle(unittest.TestCase):
+    def test_ast(self):
+        ast = DataQueryParser().parse(QUERY)
+        copied = pickle.loads(pickle.dumps(ast))
+        self.assertIsNot(copied, ast)
+        self.assertEqual(pickle.dumps(copied), pickle.dumps(ast))
+        self.assertEqual(copied.left.left.left.right.right.items, ('1', '2', '3'))
+
+    def test_prepared_values_not_pickled(self):
+        compiled = dq.compile('name LIKE "A*" AND age IN [1, 2]')
+        copied = pickle.loads(pickle.dumps(compiled.prepared_ast))
+        self.assertIsNone(copied.left.regexp)
+        self.assertIs(copied.right.right.prepared, UNPREPARED)
+
+    def test_compiled_query(self):
+        data = {'age': 20, 'name': {'first': 'Alice'}, 'tags': ['x']}
+        for backend in BACKENDS:
+            compiled = dq.compile(QUERY, case_sensitive=False, backend=backend)
+            copied = pickle.loads(pickle.dumps(compiled))
+            self.assertEqual(copied.backend, backend)
+            self.assertFalse(copied.case_sensitive)
+            self.assertTrue(copied.match(data))
+            self.assertFalse(copied.match({'tags': ['x']}))
+
+
+class TestParallelFilter(unittest.TestCase):
+    def test_order(self):
+        data = [{'age': i % 50, 'id': i} for i in range(2000)]
+        expected = [item for item in data if item['age'] >= 18]
+        for backend in ('closure', 'codegen'):
+            result = list(dq.filter(data, 'age >= 18', backend=backend, workers=2, chunksize=7))
+            self.assertEqual(result, expected)
+        compiled = dq.compile('age >= 18')
+        self.assertEqual(list(compiled.filter(iter(data), workers=2, chunksize=100)), expected)
+        self.assertEqual(list(compiled.filter([], workers=2)), [])
+
+    def test_max_pending(self):
+        consumed = []
+
+        def records():
+            for i in range(100):
+                consumed.append(i)
+                yield {'age': i}
+
+        result = parallel_filter(dq.compile('age >= 0'), records(), 1, chunksize=10, max_pending=2)
+        self.assertEqual(next(result), {'age': 0})
+        # first chunk is yielded when the second one is submitted
+        self.assertEqual(len(consumed), 20)
+        result.close()
+
+    def test_errors(self):
+        with self.assertRaises(DQKeyError):
+            list(dq.filter([{'age': 1}, {}], 'age', raise_keyerror=True, workers=2, chunksize=1))
+        with self.assertRaises(ValueError):
+            list(dq.filter([{}], 'age', workers=1, chunksize=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
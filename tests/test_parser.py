@@ -8,7 +8,8 @@ from dictquery.parsers import (
     RegexpExpression, EqualExpression, NotEqualExpression, LTExpression,
     LTEExpression, GTExpression, GTEExpression, LikeExpression,
     MatchExpression, ContainsExpression, InExpression, OrExpression,
-    AndExpression, NotExpression,)
+    AndExpression, NotExpression, CompactArrayExpression,)
+from dictquery.tokenizer import gen_tokens
 
 
 class TestVisitorParser(unittest.TestCase):
@@ -81,6 +82,37 @@ class TestVisitorParser(unittest.TestCase):
         self.assertEqual(result.value[2].value, 'hello')
         self.assertEqual(result.value[3].value, 'world')
 
+    def test_parse_compact_array(self):
+        parser = DataQueryParser()
+        result = parser.parse('[34, -1.5e3 ,\n 11]')
+        self.assertIsInstance(result, CompactArrayExpression)
+        self.assertIs(result.item_class, NumberExpression)
+        self.assertEqual(result.items, ('34', '-1.5e3', '11'))
+        self.assertIsInstance(result.value[1], NumberExpression)
+        self.assertEqual(result.value[1].value, '-1.5e3')
+
+        result = parser.parse("x IN [\"hello\", 'wo\"rld']")
+        self.assertIsInstance(result.right, CompactArrayExpression)
+        self.assertIs(result.right.item_class, StringExpression)
+        self.assertEqual(result.right.items, ('hello', 'wo"rld'))
+
+        result = parser.parse('[[1, 2], ["a"], []]')
+        self.assertNotIsInstance(result, CompactArrayExpression)
+        self.assertEqual(result.value[0].items, ('1', '2'))
+        self.assertEqual(result.value[1].items, ('a',))
+        self.assertEqual(result.value[2].value, [])
+
+    def test_compact_array_same_tokens(self):
+        # not homogeneous arrays and strings with escapes are tokenized item by item
+        for query in ('[1, "a"]', r'["a\"b", "c"]', '[1, x]', '[01]', '[1 2]'):
+            tokens = list(gen_tokens(query))
+            self.assertEqual(tokens[0].type, 'LBRACKET', query)
+        for query in ('[1 2]', '[1.]', '[01]'):
+            with self.assertRaises(DQSyntaxError):
+                DataQueryParser().parse(query)
+        with self.assertRaises(DQSyntaxError):
+            DataQueryParser().parse('(x) [1]')
+
     def test_parse_equal(self):
         parser = DataQueryParser()
         result = parser.parse('35 == 13')
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import unittest
+
+from dictquery.analysis import MAX_CLAUSES
+from dictquery.prefilter import Prefilter, PrefilterVisitor
+import dictquery as dq
+
+
+def condition(query, **options):
+    compiled = dq.compile(query, **options)
+    clauses = PrefilterVisitor(compiled.case_sensitive).condition(compiled.prepared_ast)
+    return set(tuple(sorted(clause)) for clause in clauses)
+
+
+QUERIES = [
+    'status == "failed"',
+    '"failed" == status AND `user.age` >= 18',
+    'status != "failed"',
+    'NOT status == "failed"',
+    'status == "failed" OR code == "E1"',
+    'status IN ["failed", "error"]',
+    'status IN ["failed", 1]',
+    'tags CONTAINS "red"',
+    '["a", "b"] CONTAINS status',
+    'name LIKE "Al*ce?"',
+    'name LIKE "[AB]ob*x"',
+    'name MATCH /^A/',
+    '`user.name` == "Анна"',
+    'status == "a\\"b"',
+    'tags CONTAINS ""',
+    'status == `user.name`',
+    '(status == "failed" AND code) OR (status == "ok" AND NOT code)',
+    'user',
+    'age > 10',
+]
+
+VALUES = ['failed', 'error', 'ok', 'red', 'Alice', 'Alcex', 'Bob1x', 'Анна', 'a"b', 'FAILED',
+          'E1', '', 1, 18, 30, None, True, ['red', 'blue'], ['failed'], {'red': 1}]
+
+
+def make_record(rnd):
+    record = {}
+    for key in ('status', 'code', 'name', 'tags', 'age', 'user'):
+        if rnd.random() < 0.7:
+            record[key] = rnd.choice(VALUES)
+    if rnd.random() < 0.5:
+        record['user'] = {'name': rnd.choice(VALUES), 'age': rnd.choice(VALUES)}
+    if rnd.random() < 0.2:
+        record = [record, {'status': rnd.choice(VALUES)}]
+    return record
+
+
+class TestPrefilterVisitor(unittest.TestCase):
+    def test_conditions(self):
+        self.assertEqual(condition('status == "failed"'), {(b'"failed"',), (b'"status"',)})
+        self.assertEqual(condition('`user.age` >= 18'), {(b'"user"',), (b'"age"',)})
+        self.assertEqual(condition('`user.age` >= 18', use_nested_keys=False), {(b'"user.age"',)})
+        self.assertEqual(condition('status IN ["a", "b"]'),
+                         {(b'"status"',), (b'"a"', b'"b"')})
+        self.assertEqual(condition('tags CONTAINS "red"'), {(b'"tags"',), (b'red',)})
+        self.assertEqual(condition('name LIKE "Al*ce?"'), {(b'"name"',), (b'Al',), (b'ce',)})
+        self.assertEqual(condition('name LIKE "x*[AB]ob"'), {(b'"name"',), (b'x',)})
+        self.assertEqual(condition('a == "x" OR b'),
+                         {(b'"a"', b'"b"'), (b'"b"', b'"x"')})
+
+    def test_no_conditions(self):
+        self.assertEqual(condition('NOT status == "failed"'), set())
+        self.assertEqual(condition('status == "failed" OR NOT code'), set())
+        self.assertEqual(condition('status == "failed"', case_sensitive=False), {(b'"status"',)})
+        self.assertEqual(condition('status IN ["failed", 1]'), {(b'"status"',)})
+        self.assertEqual(condition('12 > 1'), set())
+        self.assertEqual(condition(''), set())
+        query = ' OR '.join('(a{0} AND b{0} AND c{0})'.format(i) for i in range(MAX_CLAUSES))
+        self.assertEqual(condition(query), set())
+
+    def test_from_compiled(self):
+        self.assertIsNone(Prefilter.from_compiled(dq.compile('NOT a')))
+        self.assertIsNone(Prefilter.from_compiled(dq.compile('a', raise_keyerror=True)))
+        prefilter = Prefilter.from_compiled(dq.compile('status == "failed"'))
+        self.assertTrue(prefilter.check(b'{"status": "failed"}'))
+        self.assertFalse(prefilter.check(b'{"status": "ok"}'))
+        self.assertFalse(prefilter.check(b'{"state": "failed"}'))
+        # escaped text may be anything
+        self.assertTrue(prefilter.check(b'{"st\\u0061tus": "failed"}'))
+
+
+class TestPrefilterSoundness(unittest.TestCase):
+    def test_matching_lines_pass(self):
+        rnd = random.Random(1)
+        records = [make_record(rnd) for _ in range(1000)]
+        for options in ({}, {'case_sensitive': False}, {'use_nested_keys': False}):
+            for query in QUERIES:
+                compiled = dq.compile(query, **options)
+                prefilter = Prefilter.from_compiled(compiled)
+                if prefilter is None:
+                    continue
+                rejected = 0
+                for record in records:
+                    for ensure_ascii in (True, False):
+                        line = json.dumps(record, ensure_ascii=ensure_ascii).encode('utf-8')
+                        try:
+                            matched = compiled.match(record)
+                        except Exception:
+                            matched = None
+                        if not prefilter.check(line):
+                            rejected += 1
+                            self.assertFalse(matched, '{!r} {} {!r}'.format(query, options, line))
+                self.assertGreater(rejected, 0, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
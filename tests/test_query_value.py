@@ -1,7 +1,19 @@
 # -*- coding: utf-8 -*-
 import unittest
-from dictquery.datavalue import query_value
+from collections import OrderedDict, namedtuple
+
+from dictquery.datavalue import (
+    query_value, iter_query_value, LazyValues, DataQueryItem, compile_like,
+    item_factory, values_getter, MappingItem, InstanceItem, IterableItem,
+    LiteralArray)
 from dictquery.exceptions import DQKeyError
+import dictquery as dq
+
+
+class Exploding(object):
+    """Fails test if evaluation touches it"""
+    def __getattr__(self, name):
+        raise AssertionError('value must not be resolved')
 
 
 class TestQueryValue(unittest.TestCase):
@@ -73,5 +85,140 @@ class TestQueryValue(unittest.TestCase):
             query_value({'users': [{'fullname': {'lastname': 'cyberlis'}},]},
                            'users.fullname.firstname', raise_keyerror=True)
 
+    def test_precomputed_keys(self):
+        data = {'users': [{'name': {'first': 'cyberlis'}}, {'name': {'first': 'rina'}}]}
+        self.assertEqual(
+            query_value(data, 'users.name.first', keys=('users', 'name', 'first')),
+            ['cyberlis', 'rina'])
+        self.assertEqual(
+            query_value({'a.b': 1}, 'a.b', keys=('a.b',)),
+            [1])
+        with self.assertRaises(DQKeyError):
+            query_value(data, 'users.age', raise_keyerror=True, keys=('users', 'age'))
+
+    def test_value_types(self):
+        Point = namedtuple('Point', ['x', 'y'])
+
+        class Slotted(object):
+            __slots__ = ('x',)
+
+            def __init__(self, x):
+                self.x = x
+
+        data = {
+            'ordered': OrderedDict([('x', 1)]),
+            'points': (Point(1, 2), Point(3, 4)),
+            'slotted': [Slotted(5), OrderedDict([('x', 6)]), 'x', b'x', [{'x': 7}]],
+            'text': 'x',
+        }
+        self.assertEqual(query_value(data, 'ordered.x'), [1])
+        self.assertEqual(query_value(data, 'points.x'), [1, 3])
+        self.assertEqual(query_value(data, 'slotted.x'), [5, 6])
+        self.assertEqual(query_value(data, 'text.x'), [])
+        self.assertEqual(query_value(Point(1, 2), 'y'), [2])
+
+
+    def test_iter_query_value(self):
+        data = {'users': [{'age': 1}, Exploding()]}
+        values = iter_query_value(data, 'users.age')
+        self.assertEqual(next(values), 1)
+        with self.assertRaises(DQKeyError):
+            list(iter_query_value({}, 'users.age', raise_keyerror=True))
+        self.assertEqual(list(iter_query_value({'a': {'b': 2}}, 'a/b', key_separator='/')), [2])
+
+    def test_lazy_values(self):
+        values = LazyValues({'users': [{'age': 1}, {'age': 2}]}, 'users.age')
+        self.assertEqual(list(values), [1, 2])
+        self.assertEqual(list(values), [1, 2])
+        with self.assertRaises(DQKeyError):
+            list(LazyValues({}, 'age', raise_keyerror=True))
+
+
+class TestShortCircuit(unittest.TestCase):
+    def test_stops_at_first_match(self):
+        data = {'friends': [{'age': 40}, Exploding()]}
+        for backend in ('visitor', 'closure', 'codegen'):
+            self.assertTrue(dq.compile('`friends.age` > 12', backend=backend).match(data))
+            self.assertTrue(dq.compile('`friends.age` IN [1, 40]', backend=backend).match(data))
+            self.assertTrue(dq.compile('`friends.age`', backend=backend).match(data))
+            self.assertTrue(dq.compile('`friends.age` == `friends.age`',
+                                       backend=backend).match(data))
+        self.assertTrue(dq.match(data, '12 < `friends.age`'))
+
+    def test_generator_values(self):
+        item = DataQueryItem('age', (age for age in [1, 40, 3]))
+        self.assertTrue(item > 12)
+        self.assertEqual(item.values, [3])
+        self.assertFalse(DataQueryItem('age', iter([])) == 1)
+        self.assertFalse(DataQueryItem('age', iter([0, None])))
+        self.assertTrue(DataQueryItem('age', iter([0, 2])))
+        self.assertTrue(DataQueryItem('age', LazyValues({'a': [{'b': 1}, {'b': 2}]}, 'a.b'),
+                                      strategy=all) > 0)
+
+
+class TestItemFactory(unittest.TestCase):
+    def test_item_factory(self):
+        self.assertIsInstance(item_factory({}), MappingItem)
+        self.assertIsInstance(item_factory(OrderedDict()), MappingItem)
+        self.assertIsInstance(item_factory([]), IterableItem)
+        self.assertIsInstance(item_factory('abc'), IterableItem)
+        self.assertIsInstance(item_factory(TestItemFactory), InstanceItem)
+        self.assertIsNone(item_factory(12))
+        self.assertIsNone(item_factory(None))
+
+    def test_getter_is_cached_by_type(self):
+        class Custom(object):
+            pass
+        self.assertIs(values_getter(Custom()), values_getter(Custom()))
+        self.assertIsNone(values_getter(1.5))
+
+
+class TestDataQueryItem(unittest.TestCase):
+    def test_like(self):
+        item = DataQueryItem('name', ['Raymond', 'Mavis'])
+        self.assertTrue(item.like('Ray*'))
+        self.assertTrue(item.like(compile_like('Ray*')))
+        self.assertFalse(item.like(compile_like('ray*')))
+        item = DataQueryItem('name', ['Raymond', 'Mavis'], case_sensitive=False)
+        self.assertTrue(item.like(compile_like('RAY*', case_sensitive=False)))
+        self.assertFalse(item.like(compile_like('RAY*')))
+
+
+class TestLiteralArray(unittest.TestCase):
+    def test_contains(self):
+        items = LiteralArray([12.0, 'x', None, True])
+        self.assertEqual(items, [12.0, 'x', None, True])
+        self.assertEqual(items.members, frozenset([12.0, 'x', None, True]))
+        self.assertIn(12, items)
+        self.assertIn(1, items)
+        self.assertIn(None, items)
+        self.assertNotIn('X', items)
+        self.assertNotIn(12.5, items)
+        self.assertNotIn(2 ** 53 + 1, LiteralArray([float(2 ** 53)]))
+
+    def test_unhashable_values(self):
+        items = LiteralArray([1.0, 'x'])
+        self.assertNotIn([1.0], items)
+        self.assertNotIn({'x': 1}, items)
+        self.assertIn(DataQueryItem('age', [5, 1]), items)
+
+    def test_is_hashable(self):
+        self.assertTrue(LiteralArray.is_hashable([1.0, 'x', None, False]))
+        self.assertFalse(LiteralArray.is_hashable([1.0, [2.0]]))
+
+    def test_in_query(self):
+        items = ', '.join(str(i) for i in range(100))
+        for backend in ('visitor', 'closure', 'codegen'):
+            compiled = dq.compile('age IN [{}]'.format(items), backend=backend)
+            self.assertTrue(compiled.match({'age': 42}), backend)
+            self.assertTrue(compiled.match({'age': 42.0}), backend)
+            self.assertFalse(compiled.match({'age': 42.5}), backend)
+            self.assertFalse(compiled.match({'age': [1]}), backend)
+            self.assertTrue(compiled.match([{'age': 100}, {'age': 1}]), backend)
+            compiled = dq.compile(
+                'name IN ["Bob", "Alice"]', case_sensitive=False, backend=backend)
+            self.assertTrue(compiled.match({'name': 'ALICE'}), backend)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,165 @@
+import random
+import unittest
+
+from dictquery.analysis import predicates
+from dictquery.exceptions import DQKeyError
+import dictquery as dq
+
+
+class TestPredicates(unittest.TestCase):
+    def condition(self, query, **options):
+        clauses, exact = predicates(dq.compile(query, **options).prepared_ast)
+        return set(frozenset((p.keys, p.op.__name__, p.value) for p in clause)
+                   for clause in clauses), exact
+
+    def test_predicates(self):
+        self.assertEqual(self.condition('a == 1 AND 5 < `b.c`'),
+                         ({frozenset([(('a',), 'eq', 1)]), frozenset([(('b', 'c'), 'gt', 5)])}, True))
+        self.assertEqual(self.condition('a IN ["x", "y"] OR b <= "q"'),
+                         ({frozenset([(('a',), 'eq', 'x'), (('a',), 'eq', 'y'), (('b',), 'le', 'q')])},
+                          True))
+        self.assertEqual(self.condition('["X"] CONTAINS a', case_sensitive=False),
+                         ({frozenset([(('a',), 'eq', 'x')])}, True))
+        self.assertEqual(self.condition('a == 1 AND b LIKE "x*"'),
+                         ({frozenset([(('a',), 'eq', 1)]), frozenset([(('b',), 'contains_text', 'x')])},
+                          False))
+        self.assertEqual(self.condition('a LIKE "*err*" OR a CONTAINS "warn"'),
+                         ({frozenset([(('a',), 'contains_text', 'err'), (('a',), 'contains', 'warn')])},
+                          True))
+        self.assertEqual(self.condition('a LIKE "?b*cde*[x]yz"'),
+                         ({frozenset([(('a',), 'contains_text', 'cde')])}, False))
+        self.assertEqual(self.condition(r'a MATCH /^error: \d+/'),
+                         ({frozenset([(('a',), 'contains_text', 'error: ')])}, False))
+        self.assertEqual(self.condition('b MATCH /ab*c/'),
+                         ({frozenset([(('b',), 'contains_text', 'a')])}, False))
+        self.assertEqual(self.condition('a IN []'), ({frozenset()}, True))
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.condition('a LIKE "*x*" AND b MATCH /x/', case_sensitive=False),
+                         (set(), False))
+        self.assertEqual(self.condition('a CONTAINS "X"', case_sensitive=False),
+                         ({frozenset([(('a',), 'contains', 'x')])}, True))
+
+    def test_no_predicates(self):
+        for query in ('a == 1 OR NOT b', 'a != 1', 'a == b', 'a IN "abc"', 'a IN [b]',
+                      'a > NOW', 'a == [1]', 'a CONTAINS 1', 'a CONTAINS ""', 'a LIKE "*"',
+                      'a MATCH /a|b/', 'a MATCH /a?/', 'a MATCH /(?i)ab/', ''):
+            self.assertEqual(self.condition(query), (set(), False), query)
+
+
+class TestQuerySet(unittest.TestCase):
+    def test_match(self):
+        query_set = dq.compile_many({
+            'adults': 'age >= 18',
+            'red': 'color IN ["red", "crimson"]',
+            'red_adults': 'color == "red" AND age >= 18',
+            'names': '`user.name` LIKE "A*"',
+            'not_red': 'NOT color == "red"',
+            'never': 'color IN []',
+        })
+        self.assertEqual(len(query_set), 6)
+        self.assertEqual(query_set.match({'age': 20, 'color': 'red'}),
+                         ['adults', 'red', 'red_adults'])
+        self.assertEqual(query_set.match({'age': 12, 'color': 'blue', 'user': {'name': 'Al'}}),
+                         ['names', 'not_red'])
+        self.assertEqual(query_set.match({'age': 30, 'color': ['red']}), ['adults', 'not_red'])
+        query_set.remove('not_red')
+        query_set.add('adults', 'age > 40')
+        self.assertEqual(query_set.match({'age': 20, 'color': 'crimson'}), ['red'])
+        self.assertNotIn('not_red', query_set)
+        with self.assertRaises(KeyError):
+            query_set.remove('not_red')
+
+    def test_text(self):
+        query_set = dq.compile_many([
+            'message CONTAINS "error"', 'message LIKE "*err*"', 'message LIKE "db *"',
+            r'message MATCH /db\s+error/', 'tags CONTAINS "db"', 'tags LIKE "*db*"',
+            'message CONTAINS "rror" AND level > 3'])
+        self.assertEqual(query_set.match({'message': 'db error', 'level': 1}), [0, 1, 2, 3])
+        self.assertEqual(query_set.match({'message': 'an error', 'level': 5}), [0, 1, 6])
+        self.assertEqual(query_set.match({'tags': ['db', 'x']}), [4])
+        self.assertEqual(query_set.match({'tags': {'db': 1}, 'message': ['error']}), [0, 4])
+        self.assertEqual(query_set.match({'tags': 'mydb'}), [4, 5])
+        query_set.remove(0)
+        query_set.add(7, 'message CONTAINS "an"')
+        self.assertEqual(query_set.match({'message': 'an error', 'level': 5}), [1, 6, 7])
+
+    def test_options(self):
+        query_set = dq.compile_many(['name == "ALICE"', 'name < "b"'], case_sensitive=False)
+        self.assertEqual(query_set.match({'name': 'alice'}), [0, 1])
+        query_set.add(2, dq.compile('name == "alice"'))
+        query_set.add(3, dq.compile('missing', raise_keyerror=True))
+        self.assertEqual(query_set.match({'name': 'alice', 'missing': 1}), [0, 1, 2, 3])
+        with self.assertRaises(DQKeyError):
+            query_set.match({'name': 'Alice'})
+
+    def test_same_as_match(self):
+        rnd = random.Random(3)
+        keys = ['a', 'b', '`c.d`']
+        values = ['1', '2', '2.5', '"x"', '"y"', 'true', 'null']
+        # range comparisons of other types raise errors
+        ranges = {'a': ['1', '2', '2.5'], 'b': ['"x"', '"xy"', '"y"']}
+
+        def atom():
+            key, value = rnd.choice(keys), rnd.choice(values)
+            kind = rnd.randrange(6)
+            if kind == 0:
+                return '{} IN [{}, {}]'.format(key, value, rnd.choice(values))
+            if kind == 1:
+                key = rnd.choice(sorted(ranges))
+                return '{} {} {}'.format(key, rnd.choice(['<', '<=', '>', '>=']), rnd.choice(ranges[key]))
+            if kind == 2:
+                return '{} {} a'.format(rnd.choice(ranges['a']), rnd.choice(['<', '>=']))
+            if kind == 3:
+                return 'NOT {} == {}'.format(key, value)
+            if kind == 4:
+                text = rnd.choice(['x', 'xy', 'y', 'd', 'zz'])
+                if rnd.random() < 0.4:
+                    return 'b CONTAINS "{}"'.format(text)
+                return rnd.choice(['b LIKE "*{0}*"', 'b LIKE "?{0}*"', 'b LIKE "{0}"']).format(text)
+            return '{} == {}'.format(key, value)
+
+        def query(depth=0):
+            if depth > 2 or rnd.random() < 0.4:
+                return atom()
+            return '({} {} {})'.format(query(depth + 1), rnd.choice(['AND', 'OR']), query(depth + 1))
+
+        record_values = [0, 1, 2, 2.5, 3, True, False, None, 'x', 'y', 'z', 'xyz', float('nan'),
+                         [1], ['x', 'y'], {'d': 1}, {'xy': 1, 'x': 2}]
+
+        def record():
+            data = {}
+            if rnd.random() < 0.8:
+                data['a'] = rnd.choice([0, 1, 2, 2.5, 3, True, False, float('nan')])
+            if rnd.random() < 0.8:
+                data['b'] = rnd.choice(['x', 'xy', 'xz', 'y', 'z', '', 'axyzz', 'zz'])
+            data['c'] = rnd.choice([{'d': rnd.choice(record_values)},
+                                    [{'d': rnd.choice(record_values)}, {'d': rnd.choice(record_values)}]])
+            return data
+
+        queries = [query() for _ in range(300)]
+        query_set = dq.compile_many(queries)
+        compiled = [dq.compile(q) for q in queries]
+        checked = 0
+        for _ in range(300):
+            data = record()
+            try:
+                result = query_set.match(data)
+            except TypeError:
+                continue
+            expected = []
+            for i, c in enumerate(compiled):
+                try:
+                    if c.match(data):
+                        expected.append(i)
+                except TypeError:
+                    # errors of not evaluated queries aren't raised
+                    if i in result:
+                        expected.append(i)
+            self.assertEqual(result, expected, data)
+            checked += 1
+        self.assertGreater(checked, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
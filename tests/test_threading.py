@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import unittest
+
+from dictquery.compiler import BACKENDS
+import dictquery as dq
+
+
+QUERY = ('(age >= 18 AND `name.first` LIKE "A*") OR tags CONTAINS "x" '
+         'OR `friends.age` IN [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]')
+
+
+def make_records(count):
+    return [{
+        'age': i % 40,
+        'name': {'first': 'A{}'.format(i) if i % 3 else 'B{}'.format(i)},
+        'tags': ['x'] if i % 17 == 0 else [],
+        'friends': [{'age': i % 50}, {'age': 100}],
+    } for i in range(count)]
+
+
+class Reentrant(object):
+    """Evaluates the same compiled query while its value is being resolved"""
+    def __init__(self, compiled, inner, value):
+        self.compiled = compiled
+        self.inner = inner
+        self._value = value
+
+    @property
+    def value(self):
+        assert not self.compiled.match(self.inner)
+        return self._value
+
+
+class TestThreadSafety(unittest.TestCase):
+    threads = 16
+
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def test_shared_compiled_query(self):
+        records = make_records(500)
+        for backend in BACKENDS:
+            compiled = dq.compile(QUERY, backend=backend)
+            expected = [compiled.match(record) for record in records]
+            self.assertTrue(any(expected) and not all(expected))
+            barrier = threading.Barrier(self.threads)
+            errors = []
+
+            def worker(offset):
+                barrier.wait()
+                try:
+                    for _ in range(3):
+                        # threads walk records in different order
+                        for i in range(len(records)):
+                            index = (i + offset * 31) % len(records)
+                            if compiled.match(records[index]) != expected[index]:
+                                errors.append((backend, index))
+                except Exception as e:
+                    errors.append((backend, e))
+
+            workers = [threading.Thread(target=worker, args=(n,))
+                       for n in range(self.threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            self.assertEqual(errors, [])
+
+    def test_reentrant(self):
+        for backend in BACKENDS:
+            compiled = dq.compile('`item.value` == 1 AND other == 2', backend=backend)
+            self.assertTrue(compiled.match(
+                {'item': Reentrant(compiled, {}, 1), 'other': 2}), backend)
+            self.assertFalse(compiled.match(
+                {'item': Reentrant(compiled, {}, 2), 'other': 2}), backend)
+
+
+if __name__ == '__main__':
+    unittest.main()
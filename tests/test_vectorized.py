@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+import random
+import unittest
+
+from dictquery.compiler import BACKENDS
+from dictquery.exceptions import DQException, DQKeyError
+import dictquery as dq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+VALUES = [0, 1, 12, 18, 27, -3.5, 18.0, float('nan'), True, False, 2 ** 60, 2 ** 53 + 1,
+          '', 'green', 'Green', 'blue', '18', None, [1, 18], {'x': 1},
+          datetime(2015, 3, 29)]
+
+QUERIES = [
+    'age',
+    'NOT age',
+    'age == 18',
+    'age != 18',
+    '18 <= age',
+    'age < 12 OR age > 18',
+    'age == TRUE',
+    'age == NONE',
+    'age != NONE',
+    'eyeColor == "green"',
+    'eyeColor != "green"',
+    'eyeColor > "blue"',
+    'eyeColor IN ["green", "blue", 18, NONE]',
+    '["green", 12, TRUE] CONTAINS eyeColor',
+    '`name.first` == "green" AND NOT age',
+    '(age >= 12 AND eyeColor == "blue") OR `name.first`',
+    'age >= 18 AND eyeColor LIKE "g*"',
+    'age == eyeColor',
+    'TRUE',
+]
+
+
+def make_records(count, seed=42):
+    rnd = random.Random(seed)
+
+    def value(record, key):
+        choice = rnd.random()
+        if choice < 0.2:
+            return
+        record[key] = rnd.choice(VALUES)
+
+    records = []
+    for _ in range(count):
+        record = {}
+        value(record, 'age')
+        value(record, 'eyeColor')
+        name = rnd.choice([{}, {'first': rnd.choice(VALUES)}, 'x', None, [{'first': 'green'}]])
+        record['name'] = name
+        records.append(record)
+    records.extend([[{'age': 18}], 'record', None, {'name': {'first': ['blue']}}])
+    return records
+
+
+def scalar_mask(compiled, records):
+    try:
+        return [compiled.match(record) for record in records]
+    except Exception as e:
+        return type(e)
+
+
+def vector_mask(compiled, records):
+    try:
+        return compiled.mask(records).tolist()
+    except Exception as e:
+        return type(e)
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestMask(unittest.TestCase):
+    def assert_same_masks(self, queries, records, **options):
+        for query in queries:
+            for backend in BACKENDS:
+                compiled = dq.compile(query, backend=backend, **options)
+                self.assertEqual(vector_mask(compiled, records), scalar_mask(compiled, records),
+                                 '{!r} {} {}'.format(query, backend, options))
+
+    def test_same_as_scalar(self):
+        # records of not comparable types raise the same errors as scalar evaluation
+        records = make_records(300)
+        for options in ({}, {'case_sensitive': False}):
+            self.assert_same_masks(QUERIES, records, **options)
+
+    def test_same_as_scalar_comparable(self):
+        records = [record for record in make_records(3000)
+                   if isinstance(record, dict) and
+                   not isinstance(record.get('age'), (str, type(None), datetime, list, dict)) and
+                   not isinstance(record.get('eyeColor'), (int, float, type(None), datetime, list, dict))]
+        self.assertGreater(len(records), 100)
+        for options in ({}, {'case_sensitive': False}, {'use_nested_keys': False}):
+            self.assert_same_masks(QUERIES, records, **options)
+
+    def test_mask(self):
+        compiled = dq.compile('age >= 18 AND eyeColor IN ["blue", "green"]')
+        result = compiled.mask(iter([
+            {'age': 20, 'eyeColor': 'blue'}, {'age': 12, 'eyeColor': 'blue'},
+            {'eyeColor': 'green'}, [{'age': 40, 'eyeColor': 'green'}]]))
+        self.assertEqual(result.dtype, np.bool_)
+        self.assertEqual(result.tolist(), [True, False, False, True])
+        self.assertEqual(compiled.mask([]).tolist(), [])
+        self.assertEqual(dq.compile('').mask([{}]).tolist(), [False])
+
+    def test_vectorized(self):
+        self.assertIsNotNone(dq.compile('age >= 18 AND NOT `a.b` IN [1, 2]').vectorized)
+        self.assertIsNone(dq.compile('age >= 18 AND name LIKE "a*"').vectorized)
+
+    def test_raise_keyerror(self):
+        compiled = dq.compile('age > 1 OR name', raise_keyerror=True)
+        self.assertEqual(compiled.mask([{'age': 2}, {'age': 0, 'name': 'x'}]).tolist(), [True, True])
+        with self.assertRaises(DQKeyError):
+            compiled.mask([{'age': 2}, {'age': 0}])
+
+
+COLUMN_QUERIES = [
+    'age >= 18',
+    'age == 18 OR age == 2',
+    'NOT score',
+    'score < 0.5 AND flag',
+    'eyeColor == "green" OR eyeColor IN ["blue", "x"]',
+    '`name.first` > "b"',
+    '`name.first` LIKE "a*"',
+    'missing == 1 OR age != 3',
+    'big == 9007199254740993',
+]
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestWhere(unittest.TestCase):
+    def make_columns(self, size=200):
+        rnd = random.Random(7)
+        return {
+            'age': np.array([rnd.randrange(40) for _ in range(size)]),
+            'score': np.array([rnd.choice([0.0, 0.25, 0.75, float('nan')]) for _ in range(size)]),
+            'flag': np.array([rnd.random() < 0.5 for _ in range(size)]),
+            'eyeColor': np.array([rnd.choice(['green', 'Blue', 'blue', '']) for _ in range(size)]),
+            'name.first': [rnd.choice(['alice', 'Bob', 'carl']) for _ in range(size)],
+            'big': np.array([2 ** 53 + rnd.randrange(3) for _ in range(size)], dtype=np.int64),
+        }
+
+    def test_same_as_rows(self):
+        columns = self.make_columns()
+        for query in COLUMN_QUERIES:
+            for options in ({}, {'case_sensitive': False}):
+                rows = [dict((name, values[i].item() if hasattr(values[i], 'item') else values[i])
+                             for name, values in columns.items()) for i in range(200)]
+                flat = dq.compile(query, use_nested_keys=False, **options)
+                expected = [i for i, row in enumerate(rows) if flat.match(row)]
+                for backend in BACKENDS:
+                    result = dq.where(columns, query, backend=backend, **options)
+                    self.assertEqual(result.tolist(), expected, '{!r} {}'.format(query, options))
+
+    def test_structured_array(self):
+        data = np.array([(1, 'a', 0.5), (20, 'B', 1.5), (30, 'c', np.nan)],
+                        dtype=[('age', 'i4'), ('name', 'U5'), ('score', 'f8')])
+        self.assertEqual(dq.where(data, 'age > 10 AND score > 1').tolist(), [1])
+        self.assertEqual(dq.where(data, 'name == "b"', case_sensitive=False).tolist(), [1])
+        self.assertEqual(dq.where(data, 'name MATCH /[ac]/').tolist(), [0, 2])
+
+    def test_dict_of_lists(self):
+        columns = {'age': [1, 20, None, [30]], 'user.name': ['a', 'b', 'c', 'd']}
+        compiled = dq.compile('age == 20 OR `user.name` == "c"')
+        self.assertEqual(compiled.where(columns).tolist(), [1, 2])
+        with self.assertRaises(TypeError):
+            compiled = dq.compile('age > 10').where(columns)
+
+    def test_errors(self):
+        with self.assertRaises(DQException):
+            dq.where({'a': [1, 2], 'b': [1]}, 'a')
+        with self.assertRaises(DQException):
+            dq.where(np.array([1, 2]), 'a')
+        with self.assertRaises(DQKeyError):
+            dq.where({'a': [1, 2]}, 'b == 1', raise_keyerror=True)
+        self.assertEqual(dq.where({'a': [1, 2]}, 'b != 1').tolist(), [])
+        self.assertEqual(dq.where({}, 'a').tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()